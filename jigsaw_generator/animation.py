@@ -0,0 +1,361 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module animation.
+
+Draws the jigsaw over every frame of an animated image (GIF, WebP, ...).
+
+The frames are decoded one at a time by `QImageReader`, the jigsaw is drawn
+ once on a transparent overlay (see `jigsaw_painter.jigsaw_overlay`) composed over
+ each frame, and every frame is handed to the writers before the next one is
+ decoded, so the memory used does not grow with the length of the animation.
+ Qt does not encode animations, so the frames are written as a sequence of
+ images or piped, as raw RGBA, to an external encoder.
+
+Contains the class AnimationTask, that writes the frames on a `QThreadPool`.
+
+Example:
+```
+cd jigsaw_generator
+python animation.py input.gif frames/frame.png --grid 10x10
+python animation.py input.gif --grid 10x10 \\
+    --pipe "ffmpeg -y -f rawvideo -pix_fmt rgba -s {width}x{height} -r {fps} -i - output.mp4"
+```
+"""
+import argparse
+import os
+import shlex
+import subprocess
+import time
+
+from jigsaw_generator_info import Core, Gui
+
+from jigsaw_painter import jigsaw_overlay
+from output_writer import write_image
+from render_profile import FINAL, PROFILES
+
+QObject, QRunnable, Signal = Core.QObject, Core.QRunnable, Core.Signal
+Qt = Core.Qt
+QImage, QImageReader, QPainter, QColor = Gui.QImage, Gui.QImageReader, Gui.QPainter, Gui.QColor
+
+# Delay, in milliseconds, of the frames whose image does not give one
+DEFAULT_DELAY = 100
+
+
+def is_animated(image_path):
+    """
+    Return whether the image on the given path has more than one frame.
+
+    Parameters
+    ----------
+    image_path: str
+    """
+    reader = QImageReader(image_path)
+    return reader.supportsAnimation() and reader.imageCount() != 1
+
+
+def read_frames(image_path):
+    """
+    Yield each frame of an image, as a tuple `(frame, delay)`, decoding one at a time.
+
+    `delay` is the time, in milliseconds, that the frame is shown.
+
+    Parameters
+    ----------
+    image_path: str
+    """
+    reader = QImageReader(image_path)
+    while True:
+        frame = reader.read()
+        if frame.isNull():
+            return
+        # The delay of the frame just read, until the next one
+        delay = reader.nextImageDelay()
+        yield frame, delay if delay > 0 else DEFAULT_DELAY
+
+
+def frame_path(path, index):
+    """
+    Return the path of the frame `index` of a sequence written on `path`.
+
+    Parameters
+    ----------
+    path: str
+        e.g. "frames/frame.png", whose frames are "frames/frame_0000.png", ...
+    index: int
+    """
+    stem, extension = os.path.splitext(path)
+    return "{}_{:04d}{}".format(stem, index, extension)
+
+
+def overlay_frame(frame, overlay, profile=FINAL):
+    """
+    Return the frame, scaled by `profile.scale`, with the overlay composed over it.
+
+    Parameters
+    ----------
+    frame: QImage
+    overlay: QImage
+        See `jigsaw_painter.jigsaw_overlay`.
+    profile: RenderProfile
+    """
+    if frame.size() != overlay.size():
+        frame = frame.scaled(
+            overlay.width(), overlay.height(), Qt.IgnoreAspectRatio,
+            Qt.SmoothTransformation if profile.smooth_transform else Qt.FastTransformation
+        )
+    image = frame.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(image)
+    painter.drawImage(0, 0, overlay)
+    painter.end()
+    return image
+
+
+class SequenceWriter:
+    """
+    Write each frame on its own file, see `frame_path`.
+
+    Attributes
+    ----------
+    path: str
+
+    options: OutputOptions
+    """
+
+    def __init__(self, path, options=None):
+        self.path = path
+        self.options = options
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def write(self, image, index, delay):
+        """
+        Write a frame.
+
+        Parameters
+        ----------
+        self: SequenceWriter
+            Instance of this class.
+        image: QImage
+        index: int
+        delay: int
+            Milliseconds that the frame is shown.
+        """
+        write_image(image, frame_path(self.path, index), self.options)
+
+    def close(self):
+        """
+        Finish the sequence.
+
+        Parameters
+        ----------
+        self: SequenceWriter
+            Instance of this class.
+        """
+
+
+class PipeWriter:
+    """
+    Write the frames, as raw RGBA, on the standard input of a command.
+
+    The command starts on the first frame, once "{width}", "{height}" and "{fps}"
+     on it can be replaced by the size of the frames and the rate given by the
+     delay of the first frame.
+
+    Attributes
+    ----------
+    command: str
+
+    process: subprocess.Popen
+    """
+
+    def __init__(self, command):
+        self.command = command
+        self.process = None
+
+    def write(self, image, index, delay):
+        """
+        Write a frame.
+
+        Parameters
+        ----------
+        self: PipeWriter
+            Instance of this class.
+        image: QImage
+        index: int
+        delay: int
+            Milliseconds that the frame is shown.
+        """
+        if self.process is None:
+            command = self.command.format(width=image.width(), height=image.height(),
+                                          fps="{:g}".format(1000.0/delay))
+            self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE)
+        frame = image.convertToFormat(QImage.Format_RGBA8888)
+        try:
+            self.process.stdin.write(bytes(frame.constBits())[:4*frame.width()*frame.height()])
+        except BrokenPipeError:
+            raise IOError("The command {} stopped reading the frames".format(self.command))
+
+    def close(self):
+        """
+        Close the standard input of the command and wait for it.
+
+        Raises `IOError` if the command fails.
+
+        Parameters
+        ----------
+        self: PipeWriter
+            Instance of this class.
+        """
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self.process.wait() != 0:
+            raise IOError("The command {} failed with the code {}".format(
+                self.command, self.process.returncode
+            ))
+
+
+def write_animation(image_path, tab_paths, pen_color, writers, profile=FINAL, size=None):
+    """
+    Draw the jigsaw over every frame of an image and hand them to the writers.
+
+    Return the number of frames.
+
+    Parameters
+    ----------
+    image_path: str
+    tab_paths: TabPaths
+        Paths of the masculine borders, on the coordinates of the frames.
+    pen_color: QColor
+    writers: List[SequenceWriter or PipeWriter]
+    profile: RenderProfile
+    size: QSize
+        Size of the frames, read from the image if `None`.
+    """
+    size = size or QImageReader(image_path).size()
+    overlay = jigsaw_overlay(size.width(), size.height(), tab_paths, pen_color, profile)
+
+    count = 0
+    try:
+        for index, (frame, delay) in enumerate(read_frames(image_path)):
+            image = overlay_frame(frame, overlay, profile)
+            for writer in writers:
+                writer.write(image, index, delay)
+            count += 1
+    finally:
+        for writer in writers:
+            writer.close()
+    return count
+
+
+class AnimationSignals(QObject):
+    """
+    Signals emitted by `AnimationTask`.
+
+    `finished` carries the list of paths of the sequences, `failed` the message of the error.
+    """
+
+    finished = Signal(object)
+    failed = Signal(str)
+
+
+class AnimationTask(QRunnable):
+    """
+    Call `write_animation` on a `QThreadPool`, writing a sequence of frames for each path.
+
+    Attributes
+    ----------
+    image_path: str
+
+    paths: List[str]
+
+    tab_paths: TabPaths
+
+    pen_color: QColor
+
+    options: OutputOptions
+
+    profile: RenderProfile
+
+    signals: AnimationSignals
+    """
+
+    def __init__(self, image_path, paths, tab_paths, pen_color, options=None, profile=FINAL):
+        super(AnimationTask, self).__init__()
+        self.image_path = image_path
+        self.paths = list(paths)
+        self.tab_paths = tab_paths
+        self.pen_color = QColor(pen_color)
+        self.options = options
+        self.profile = profile
+        self.signals = AnimationSignals()
+
+    def run(self):
+        try:
+            write_animation(self.image_path, self.tab_paths, self.pen_color,
+                            [SequenceWriter(path, self.options) for path in self.paths], self.profile)
+        except Exception as error:
+            # Any error of the encoders must reach `failed`, so the task is released
+            self.signals.failed.emit(str(error) or repr(error))
+            return
+        self.signals.finished.emit(self.paths)
+
+
+if __name__ == "__main__":
+    import resource
+
+    from cli_utils import parse_size
+    from jigsaw_generator_core import JigsawGeneratorCore
+    from jigsaw_generator_geometry import generate_tab_paths
+
+    parser = argparse.ArgumentParser(description="Draw a jigsaw over every frame of an animated image.")
+    parser.add_argument("image", help="path of the animated image")
+    parser.add_argument("output", nargs="?", default=None,
+                        help="path of the frames, e.g. frames/frame.png for frames/frame_0000.png, ...")
+    parser.add_argument("--grid", type=parse_size, default=(10, 10), help="number of pieces, e.g. 40x30")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--color", default="white")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="Final")
+    parser.add_argument("--pipe", default=None, help="command that receives the frames as raw RGBA")
+    arguments = parser.parse_args()
+
+    size = QImageReader(arguments.image).size()
+    core = JigsawGeneratorCore(list(arguments.grid), arguments.seed)
+    paths = generate_tab_paths(core, float(size.width())/arguments.grid[0],
+                               float(size.height())/arguments.grid[1],
+                               arguments.patterns.split(","), arguments.smooth_factor)
+    writers = list()
+    if arguments.output:
+        writers.append(SequenceWriter(arguments.output))
+    if arguments.pipe:
+        writers.append(PipeWriter(arguments.pipe))
+
+    begin = time.perf_counter()
+    frames = write_animation(arguments.image, paths, QColor(arguments.color), writers,
+                             PROFILES[arguments.profile], size)
+    print("{} frames of {}x{} in {:.3f} s, peak memory {} MB".format(
+        frames, size.width(), size.height(), time.perf_counter() - begin,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss//1024
+    ))
@@ -0,0 +1,289 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Generates many variants of a jigsaw over the same image.
+
+The image is decoded once and shared, read-only, by the threads that draw the
+ variants. The geometry is shared too: the variants with the same grid, seed,
+ patterns and smooth factor reuse the same `TabPaths`, computed once on the size
+ of the image and scaled to the size of each output.
+
+Example:
+```
+cd jigsaw_generator
+python batch_variants.py image.png output --grid 10x10 --grid 20x15 --seeds 4 --size 1024x768
+```
+"""
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+from jigsaw_generator_info import Core, Gui
+
+from image_loader import read_image
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+from jigsaw_painter import render_jigsaw
+from render_profile import FINAL, PROFILES
+
+Qt = Core.Qt
+QColor = Gui.QColor
+
+
+class Variant:
+    """
+    Parameters of one jigsaw of a batch.
+
+    Attributes
+    ----------
+    grid: Tuple[int, int]
+        Number of columns and rows.
+
+    seed: int
+
+    patterns: List[str]
+
+    smooth_factor: float
+
+    pen_color: QColor
+
+    output_path: str
+        Path of the image written, `None` to only draw it.
+
+    size: Tuple[int, int]
+        Size of the image drawn, the size of the base image if `None`.
+    """
+
+    def __init__(self, grid, seed, patterns, smooth_factor=.1, pen_color=None, output_path=None, size=None):
+        self.grid = (int(grid[0]), int(grid[1]))
+        self.seed = seed
+        self.patterns = list(patterns)
+        self.smooth_factor = smooth_factor
+        self.pen_color = QColor(255, 255, 255) if pen_color is None else QColor(pen_color)
+        self.output_path = output_path
+        self.size = None if size is None else (int(size[0]), int(size[1]))
+
+    def geometry_key(self):
+        """
+        Return the key of the `TabPaths` of this variant.
+
+        Parameters
+        ----------
+        self: Variant
+            Instance of this class.
+        """
+        return self.grid, self.seed, tuple(self.patterns), self.smooth_factor
+
+
+class VariantGeometry:
+    """
+    Cache of the geometry shared by the variants of a batch.
+
+    The methods can be called from many threads: each `TabPaths` is computed by
+     the first thread that needs it while the others wait for it. It is computed
+     on the size of the image, and scaled to the size of each variant, so the
+     outputs of every size show the same cut.
+
+    Attributes
+    ----------
+    width: int
+        Width of the image.
+
+    height: int
+        Height of the image.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self._tab_paths = dict()
+        self._lock = threading.Lock()
+        self._pending = dict()
+
+    def cell_size(self, grid):
+        """
+        Return the width and height of the cells of a grid.
+
+        Parameters
+        ----------
+        self: VariantGeometry
+            Instance of this class.
+        grid: Tuple[int, int]
+        """
+        return float(self.width)/grid[0], float(self.height)/grid[1]
+
+    def tab_paths(self, variant):
+        """
+        Return the `TabPaths` of a variant, on its size.
+
+        Parameters
+        ----------
+        self: VariantGeometry
+            Instance of this class.
+        variant: Variant
+        """
+        tab_paths = self.reference_paths(variant)
+        if variant.size is None or variant.size == (self.width, self.height):
+            return tab_paths
+        return tab_paths.transformed(
+            numpy.diag([float(variant.size[0])/self.width, float(variant.size[1])/self.height]), (0., 0.)
+        )
+
+    def reference_paths(self, variant):
+        """
+        Return the `TabPaths` of a variant on the size of the image, computing it only once for each key.
+
+        Parameters
+        ----------
+        self: VariantGeometry
+            Instance of this class.
+        variant: Variant
+        """
+        key = variant.geometry_key()
+        with self._lock:
+            if key in self._tab_paths:
+                return self._tab_paths[key]
+            event = self._pending.get(key)
+            owner = event is None
+            if owner:
+                event = self._pending[key] = threading.Event()
+
+        if not owner:
+            event.wait()
+            # Computed again by this thread if it failed on the other one
+            return self.reference_paths(variant)
+
+        try:
+            cell_width, cell_height = self.cell_size(variant.grid)
+            tab_paths = generate_tab_paths(
+                JigsawGeneratorCore(list(variant.grid), variant.seed), cell_width, cell_height,
+                variant.patterns, variant.smooth_factor
+            )
+            with self._lock:
+                self._tab_paths[key] = tab_paths
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+        return tab_paths
+
+
+def generate_variants(image_path, variants, backend="Qt", workers=None, profile=FINAL):
+    """
+    Draw (and save) every variant over the image and return their timings.
+
+    The result is a list with one dictionary for each variant, in the order of
+     `variants`, with the times in seconds of the stages "geometry", "render",
+     "save" and "total".
+
+    Parameters
+    ----------
+    image_path: str
+        Path of the image, decoded only once, and scaled once for each size of
+         the variants.
+    variants: List[Variant]
+    backend: str
+        "Qt" or "NumPy".
+    workers: int
+        Number of threads, see `concurrent.futures.ThreadPoolExecutor`.
+    profile: RenderProfile
+    """
+    base_image = read_image(image_path)
+    if base_image.isNull():
+        raise IOError("It was not possible to load the file {}".format(image_path))
+    geometry = VariantGeometry(base_image.width(), base_image.height())
+    bases = {(base_image.width(), base_image.height()): base_image}
+    lock = threading.Lock()
+
+    def scaled_base(size):
+        with lock:
+            if size not in bases:
+                bases[size] = base_image.scaled(size[0], size[1], Qt.IgnoreAspectRatio,
+                                                Qt.SmoothTransformation)
+            return bases[size]
+
+    def process(variant):
+        begin = time.perf_counter()
+        tab_paths = geometry.tab_paths(variant)
+        geometry_end = time.perf_counter()
+        base = base_image if variant.size is None else scaled_base(variant.size)
+        image = render_jigsaw(base, tab_paths, variant.pen_color, backend, profile)
+        render_end = time.perf_counter()
+        if variant.output_path is not None and not image.save(variant.output_path):
+            raise IOError("It was not possible to save the file {}".format(variant.output_path))
+        end = time.perf_counter()
+        return {
+            "geometry": geometry_end - begin, "render": render_end - geometry_end,
+            "save": end - render_end, "total": end - begin,
+        }
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(process, variants))
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+
+    parser = argparse.ArgumentParser(description="Generate many jigsaws over the same image.")
+    parser.add_argument("image", help="path of the base image")
+    parser.add_argument("output", help="directory of the images written")
+    parser.add_argument("--grid", type=parse_size, action="append",
+                        help="number of pieces, e.g. 40x30, can be repeated")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--seeds", type=int, default=1, help="number of seeds of each grid")
+    parser.add_argument("--patterns", action="append",
+                        help="comma separated list of patterns, can be repeated")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--size", type=parse_size, action="append",
+                        help="size of the outputs, e.g. 1024x768, can be repeated; the size of the image by default")
+    parser.add_argument("--color", default="white")
+    parser.add_argument("--format", default="png")
+    parser.add_argument("--backend", choices=["Qt", "NumPy"], default="Qt")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="Final")
+    parser.add_argument("--workers", type=int, default=None)
+    arguments = parser.parse_args()
+
+    os.makedirs(arguments.output, exist_ok=True)
+    name = os.path.splitext(os.path.basename(arguments.image))[0]
+    batch = list()
+    for grid in arguments.grid or [(10, 10)]:
+        for pattern_index, patterns in enumerate(arguments.patterns or ["Square Rounded,Triangle Rounded"]):
+            for seed in range(arguments.seed, arguments.seed + arguments.seeds):
+                for size in arguments.size or [None]:
+                    suffix = "" if size is None else "_{}x{}".format(*size)
+                    path = os.path.join(arguments.output, "{}_{}x{}_{}_{}{}.{}".format(
+                        name, grid[0], grid[1], pattern_index, seed, suffix, arguments.format
+                    ))
+                    batch.append(Variant(grid, seed, patterns.split(","), arguments.smooth_factor,
+                                         QColor(arguments.color), path, size))
+
+    begin = time.perf_counter()
+    timings = generate_variants(arguments.image, batch, arguments.backend, arguments.workers,
+                                PROFILES[arguments.profile])
+    elapsed = time.perf_counter() - begin
+
+    for variant, timing in zip(batch, timings):
+        print("{:<40} geometry {geometry:8.4f} s  render {render:8.4f} s  "
+              "save {save:8.4f} s  total {total:8.4f} s".format(
+                  os.path.basename(variant.output_path), **timing))
+    print("{} puzzles in {:.3f} s, {:.2f} puzzles per second".format(
+        len(batch), elapsed, len(batch)/elapsed))
@@ -0,0 +1,138 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Script that measures the time spent by each stage of the generation of a jigsaw.
+
+Example:
+```
+cd jigsaw_generator
+python benchmark.py --size 4000x3000 --grid 80x60
+```
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from jigsaw_generator_info import Gui
+
+from cli_utils import parse_size
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+from jigsaw_painter import render_jigsaw
+from output_writer import write_svg
+from render_profile import FINAL, PROFILES
+
+QImage, QColor = Gui.QImage, Gui.QColor
+
+PATTERNS = ["Triangle", "Triangle Rounded", "Square", "Square Rounded"]
+
+
+def best_time(function, repeat):
+    """
+    Return the shortest time, in seconds, of `repeat` calls of `function`.
+
+    Parameters
+    ----------
+    function: Callable[[], Any]
+    repeat: int
+    """
+    times = list()
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - begin)
+    return min(times)
+
+
+def render(width, height, tab_paths, backend, profile=FINAL):
+    """
+    Draw the jigsaw over a new black `QImage` with `jigsaw_painter.render_jigsaw`.
+
+    Parameters
+    ----------
+    width: int
+    height: int
+    tab_paths: TabPaths
+    backend: str
+        "Qt" or "NumPy".
+    profile: RenderProfile
+    """
+    image = QImage(width, height, QImage.Format_RGBA8888)
+    image.fill(QColor(0, 0, 0))
+    return render_jigsaw(image, tab_paths, QColor(255, 255, 255), backend, profile)
+
+
+def run(width, height, x, y, repeat, patterns=PATTERNS):
+    """
+    Print the time of each stage, with each render profile, for a jigsaw of the given size.
+
+    Parameters
+    ----------
+    width: int
+    height: int
+    x: int
+        Number of columns of the jigsaw.
+    y: int
+        Number of rows of the jigsaw.
+    repeat: int
+    patterns: List[str]
+    """
+    core = JigsawGeneratorCore([x, y])
+    core.generate_random(0)
+    cell_width, cell_height = float(width)/x, float(height)/y
+    tab_paths = generate_tab_paths(core, cell_width, cell_height, patterns, .1)
+    svg_path = os.path.join(tempfile.mkdtemp(), "benchmark.svg")
+
+    results = [("geometry", best_time(
+        lambda: generate_tab_paths(core, cell_width, cell_height, patterns, .1), repeat
+    ))]
+    for name, profile in sorted(PROFILES.items()):
+        results.extend([
+            ("raster Qt " + name, best_time(
+                lambda: render(width, height, tab_paths, "Qt", profile), repeat
+            )),
+            ("raster NumPy " + name, best_time(
+                lambda: render(width, height, tab_paths, "NumPy", profile), repeat
+            )),
+            ("SVG " + name, best_time(
+                lambda: write_svg(svg_path, width, height, tab_paths, QColor(255, 255, 255), profile),
+                repeat
+            )),
+        ])
+
+    print("{}x{} pixels, {}x{} pieces, {} borders, {} segments".format(
+        width, height, x, y, len(tab_paths), len(tab_paths.kind)
+    ))
+    for name, seconds in results:
+        print("{:<20} {:10.4f} s".format(name, seconds))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default=(4000, 3000),
+                        help="size of the image in pixels, e.g. 4000x3000")
+    parser.add_argument("--grid", type=parse_size, default=(80, 60),
+                        help="number of pieces, e.g. 80x60")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--patterns", default=",".join(PATTERNS), help="comma separated list of patterns")
+    arguments = parser.parse_args()
+
+    run(arguments.size[0], arguments.size[1], arguments.grid[0], arguments.grid[1], arguments.repeat,
+        arguments.patterns.split(","))
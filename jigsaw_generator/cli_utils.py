@@ -0,0 +1,35 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Auxiliar module with the parsers of the arguments shared by the command line scripts.
+
+It does not import Qt, so the scripts that do not render can use it.
+"""
+
+
+def parse_size(text):
+    """
+    Return the tuple of integers of a text in the format "WxH".
+
+    Parameters
+    ----------
+    text: str
+    """
+    width, height = text.lower().split("x")
+    return int(width), int(height)
@@ -0,0 +1,198 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Auxiliar module that implements a counter-based random number generator.
+
+Every random value is a pure function of `(seed, edge, revision, draw)`, so the
+ design of one border of the jigsaw does not depend on the order in which the
+ other borders were generated. The scalar functions and the vectorized ones
+ (suffix `_array`) return exactly the same values.
+"""
+import numpy
+
+MASK64 = 0xFFFFFFFFFFFFFFFF
+GOLDEN = 0x9E3779B97F4A7C15
+MIX1 = 0xBF58476D1CE4E5B9
+MIX2 = 0x94D049BB133111EB
+
+
+def mix64(z):
+    """
+    Return the splitmix64 finalizer of the 64 bits integer `z`.
+
+    Parameters
+    ----------
+    z: int
+    """
+    z = (z + GOLDEN) & MASK64
+    z = ((z ^ (z >> 30)) * MIX1) & MASK64
+    z = ((z ^ (z >> 27)) * MIX2) & MASK64
+    return z ^ (z >> 31)
+
+
+def counter_hash(seed, edge, revision, draw):
+    """
+    Return a 64 bits hash of the counter `(seed, edge, revision, draw)`.
+
+    Parameters
+    ----------
+    seed: int
+        Seed of the whole jigsaw.
+
+    edge: int
+        Index of the border, see `JigsawGeneratorCore.edge_index`.
+
+    revision: int
+        How many times the border was re-generated.
+
+    draw: int
+        Index of the random value drawn for this border.
+    """
+    z = mix64(seed & MASK64)
+    for value in (edge, revision, draw):
+        z = mix64(z ^ (value & MASK64))
+    return z
+
+
+def counter_uniform(seed, edge, revision, draw):
+    """
+    Return a float in the interval [0, 1) computed from the given counter.
+
+    Parameters
+    ----------
+    seed: int
+    edge: int
+    revision: int
+    draw: int
+    """
+    return (counter_hash(seed, edge, revision, draw) >> 11) * 2.0**-53
+
+
+def mix64_array(z):
+    """
+    Vectorized version of `mix64`.
+
+    Parameters
+    ----------
+    z: numpy.ndarray
+        Array of type `numpy.uint64`.
+    """
+    z = z + numpy.uint64(GOLDEN)
+    z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(MIX1)
+    z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(MIX2)
+    return z ^ (z >> numpy.uint64(31))
+
+
+def counter_hash_array(seed, edges, revisions, draw):
+    """
+    Vectorized version of `counter_hash`.
+
+    Parameters
+    ----------
+    seed: int
+    edges: numpy.ndarray
+        Indices of the borders.
+    revisions: numpy.ndarray or int
+        Revision of each border.
+    draw: numpy.ndarray or int
+        Index of the random value drawn for each border.
+    """
+    edges = numpy.asarray(edges, dtype=numpy.int64).astype(numpy.uint64)
+    z = mix64_array(numpy.full(edges.shape, seed & MASK64, dtype=numpy.uint64))
+    for value in (edges, revisions, draw):
+        value = numpy.asarray(value, dtype=numpy.int64).astype(numpy.uint64)
+        z = mix64_array(z ^ value)
+    return z
+
+
+def counter_uniform_array(seed, edges, revisions, draw):
+    """
+    Vectorized version of `counter_uniform`.
+
+    Parameters
+    ----------
+    seed: int
+    edges: numpy.ndarray
+    revisions: numpy.ndarray or int
+    draw: numpy.ndarray or int
+    """
+    z = counter_hash_array(seed, edges, revisions, draw)
+    return (z >> numpy.uint64(11)).astype(numpy.float64) * 2.0**-53
+
+
+class EdgeRandom:
+    """
+    Random generator dedicated to one border of the jigsaw.
+
+    It exposes the same methods of the module `random` that are used to design
+     a border (`random`, `uniform` and `choice`), but each value comes from
+     `counter_uniform` with an increasing `draw` index.
+
+    Attributes
+    ----------
+    seed: int
+    edge: int
+    revision: int
+    draw: int
+        Index of the next value drawn.
+    """
+
+    def __init__(self, seed, edge, revision=0, draw=1):
+        self.seed = seed
+        self.edge = edge
+        self.revision = revision
+        self.draw = draw
+
+    def random(self):
+        """
+        Return the next float in the interval [0, 1).
+
+        Parameters
+        ----------
+        self: EdgeRandom
+            Instance of this class.
+        """
+        value = counter_uniform(self.seed, self.edge, self.revision, self.draw)
+        self.draw += 1
+        return value
+
+    def uniform(self, a, b):
+        """
+        Return the next float in the interval [a, b).
+
+        Parameters
+        ----------
+        self: EdgeRandom
+            Instance of this class.
+        a: float
+        b: float
+        """
+        return a + (b - a)*self.random()
+
+    def choice(self, seq):
+        """
+        Return the next random element of the non-empty sequence `seq`.
+
+        Parameters
+        ----------
+        self: EdgeRandom
+            Instance of this class.
+        seq: Sequence
+        """
+        return seq[min(int(self.random()*len(seq)), len(seq) - 1)]
@@ -0,0 +1,465 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module cut_stats.
+
+Measures the cut of a jigsaw from its `TabPaths`: the total length of the cut,
+ the area and the perimeter of each piece, its smallest feature (the clearance
+ between two borders) and, on request, the smallest radius of its curves.
+
+Every segment is measured on its Bézier control points, without flattening: the
+ areas come from the shoelace formula extended to curves (Green's theorem), that
+ Gauss-Legendre quadrature gives exactly, and the lengths of the curves from the
+ same quadrature. The radii are sampled on every curve, which costs as much as
+ the rest, so they are only measured with `radius=True`. The work is done by
+ NumPy over all the segments at once.
+
+The clearance is the smallest distance between two borders away from the corners
+ where they meet, with the rule of `tab_validator.validate_tab_paths`: it is the
+ thinnest strip of a piece that the cutter has to leave. Only the segments whose
+ boxes are near each other are sampled, the nearest first, until no other pair of
+ boxes can be closer.
+
+Example:
+```
+cd jigsaw_generator
+python cut_stats.py --size 4000x3000 --grid 80x60 --stats json --radius
+```
+"""
+import argparse
+import json
+import math
+import time
+
+import numpy
+
+from grid_index import GridIndex
+from jigsaw_generator_geometry import FRAME_NORMAL, LINE
+from tab_validator import segment_distances
+
+
+def bernstein(t):
+    """
+    Return the values, the first and the second derivatives of the cubic Bernstein polynomials on `t`.
+
+    Each array has shape `(4, len(t))`, so that the control points of the
+     segments, as an array of shape `(S, 4)` for each coordinate, times one of
+     them gives the curves on `t`.
+
+    Parameters
+    ----------
+    t: numpy.ndarray
+    """
+    u = 1.0 - t
+    value = numpy.array([u*u*u, 3.0*u*u*t, 3.0*u*t*t, t*t*t])
+    first = 3.0*numpy.array([-u*u, u*u - 2.0*u*t, 2.0*u*t - t*t, t*t])
+    second = 6.0*numpy.array([u, t - 2.0*u, u - 2.0*t, t])
+    return value, first, second
+
+
+# Nodes and weights of the Gauss-Legendre quadrature on [0, 1], within a
+# millionth of the length of the tabs
+QUADRATURE_NODES, QUADRATURE_WEIGHTS = numpy.polynomial.legendre.leggauss(8)
+QUADRATURE_NODES = (QUADRATURE_NODES + 1.0)/2.0
+QUADRATURE_WEIGHTS = QUADRATURE_WEIGHTS/2.0
+QUADRATURE_VALUE, QUADRATURE_FIRST, _ = bernstein(QUADRATURE_NODES)
+
+# Signed area of a segment, `(1/2)*integral(x*dy - y*dx)`, as `x @ AREA_FORM @ y`;
+# the quadrature gives its integrals exactly (polynomials of degree 5)
+AREA_FORM = (QUADRATURE_VALUE*QUADRATURE_WEIGHTS) @ QUADRATURE_FIRST.T
+AREA_FORM = 0.5*(AREA_FORM - AREA_FORM.T)
+
+# Parameters where the radius of curvature is sampled, the ends included
+RADIUS_SAMPLES = numpy.linspace(0.0, 1.0, 9)
+_, RADIUS_FIRST, RADIUS_SECOND = bernstein(RADIUS_SAMPLES)
+
+# Parameters where the segments are sampled to measure the clearance, the ends included
+CLEARANCE_SAMPLES = numpy.linspace(0.0, 1.0, 9)
+CLEARANCE_VALUE, _, _ = bernstein(CLEARANCE_SAMPLES)
+
+# Segments measured at once, to bound the memory of the samples
+CHUNK_SEGMENTS = 1 << 20
+
+# Consecutive segments of a path indexed together by `min_clearance`: most of the
+# pairs of single segments would be neighbours on the same path
+GROUP_SEGMENTS = 4
+
+# Segments searched at once by `min_clearance`, to bound the memory of their pairs
+BAND_SEGMENTS = 1 << 18
+
+# Pairs of groups of segments compared at once by `min_clearance`
+CHUNK_PAIRS = 1 << 10
+
+
+class CutStats:
+    """
+    Measures of the cut of a jigsaw, see `cut_stats`.
+
+    Attributes
+    ----------
+    frame_length: float
+        Perimeter of the jigsaw.
+
+    path_length: numpy.ndarray
+        Length of each path of the `TabPaths`.
+
+    piece_area: numpy.ndarray
+        Array of shape `(x, y)` with the area of each piece.
+
+    piece_perimeter: numpy.ndarray
+        Array of shape `(x, y)` with the perimeter of each piece.
+
+    min_clearance: float
+        Smallest distance between two borders, see `min_clearance`; `inf` if none
+         is closer than the distance searched, `None` if it was not measured.
+
+    min_radius: float
+        Smallest radius of curvature of the curves, sampled on `RADIUS_SAMPLES`;
+         `inf` if the paths have only lines, `None` if it was not measured.
+    """
+
+    def __init__(self, frame_length, path_length, piece_area, piece_perimeter, min_clearance, min_radius):
+        self.frame_length = frame_length
+        self.path_length = path_length
+        self.piece_area = piece_area
+        self.piece_perimeter = piece_perimeter
+        self.min_clearance = min_clearance
+        self.min_radius = min_radius
+
+    @property
+    def cut_length(self):
+        """
+        Total length of the cut: the frame and every path, each one cut once.
+
+        Parameters
+        ----------
+        self: CutStats
+            Instance of this class.
+        """
+        return self.frame_length + float(self.path_length.sum())
+
+    def summary(self):
+        """
+        Return a dictionary with the totals and the extremes, that can be written as JSON.
+
+        "min_clearance" and "min_radius" are only present if they were measured,
+         `None` when nothing was found under the distance searched.
+
+        Parameters
+        ----------
+        self: CutStats
+            Instance of this class.
+        """
+        def extremes(values):
+            return {"min": float(values.min()), "max": float(values.max()), "mean": float(values.mean())}
+
+        summary = {
+            "pieces": int(self.piece_area.size),
+            "borders": int(len(self.path_length)),
+            "cut_length": self.cut_length,
+            "frame_length": self.frame_length,
+            "piece_area": extremes(self.piece_area),
+            "piece_perimeter": extremes(self.piece_perimeter),
+        }
+        for name in ("min_clearance", "min_radius"):
+            value = getattr(self, name)
+            if value is not None:
+                summary[name] = value if numpy.isfinite(value) else None
+        return summary
+
+
+def segment_measures(starts, control, kind, radius=True):
+    """
+    Return the length, the signed area and the smallest radius of curvature of each segment.
+
+    The signed area is `(1/2)*integral(x*dy - y*dx)` along the segment, so the
+     sum over a closed path is the area that it encloses. The radii are `None`
+     unless `radius` is set.
+
+    Parameters
+    ----------
+    starts: numpy.ndarray
+        Array of shape `(S, 2)` with the first point of each segment.
+    control: numpy.ndarray
+        Array of shape `(S, 3, 2)`, see `TabPaths.control`.
+    kind: numpy.ndarray
+        Type of each segment.
+    radius: bool
+        Whether the radii are measured.
+    """
+    x = numpy.empty((len(kind), 4))
+    y = numpy.empty((len(kind), 4))
+    x[:, 0], y[:, 0] = starts[:, 0], starts[:, 1]
+    x[:, 1:], y[:, 1:] = control[..., 0], control[..., 1]
+
+    # Only the curves need the quadrature, most of the segments are lines
+    is_line = kind == LINE
+    length = numpy.hypot(x[:, 3] - x[:, 0], y[:, 3] - y[:, 0])
+    curve_x, curve_y = x[~is_line], y[~is_line]
+    dx, dy = curve_x @ QUADRATURE_FIRST, curve_y @ QUADRATURE_FIRST
+    length[~is_line] = numpy.sqrt(dx*dx + dy*dy) @ QUADRATURE_WEIGHTS
+
+    area = numpy.einsum("si,si->s", x @ AREA_FORM, y)
+    if not radius:
+        return length, area, None
+
+    # The radius is the inverse of the largest curvature, whose square is
+    # cross(B', B'')^2/|B'|^6, without roots on every sample; where a control
+    # point is on its end the speed vanishes without a corner, so the samples
+    # where it is negligible to the length are skipped
+    x, y = curve_x, curve_y
+    dx, dy = x @ RADIUS_FIRST, y @ RADIUS_FIRST
+    bend = dx*(y @ RADIUS_SECOND) - dy*(x @ RADIUS_SECOND)
+    speed = dx*dx + dy*dy
+    stopped = speed <= (1e-6*length[~is_line, None])**2
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        curvature = numpy.where(stopped, 0.0, bend*bend/(speed*speed*speed))
+        curvature = curvature.max(axis=1)
+        radii = numpy.full(len(kind), numpy.inf)
+        radii[~is_line] = 1.0/numpy.sqrt(curvature)
+    return length, area, radii
+
+
+def min_clearance(tab_paths, cell_width, cell_height, max_clearance=.25, corner_radius=.1):
+    """
+    Return the smallest distance between two paths, away from the corners where they meet.
+
+    As in `tab_validator.validate_tab_paths`, the segments near a corner shared by
+     both paths are not compared, since the borders always meet there. The curves
+     are sampled on `CLEARANCE_SAMPLES`. Returns `inf` if no two paths are closer
+     than `max_clearance`.
+
+    The segments are searched on horizontal bands of about `BAND_SEGMENTS`
+     segments.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+        Paths of the masculine borders.
+    cell_width: float
+    cell_height: float
+        Size of each cell.
+    max_clearance: float
+        Largest distance searched, relative to the size of the cell.
+    corner_radius: float
+        Radius around the corners, relative to the size of the cell.
+    """
+    if len(tab_paths.kind) == 0:
+        return numpy.inf
+
+    scale = min(cell_width, cell_height)
+    limit, radius = max_clearance*scale, corner_radius*scale
+
+    owner = tab_paths.segment_owner()
+    starts = tab_paths.segment_starts()
+    low = numpy.minimum(starts, tab_paths.control.min(axis=1))
+    high = numpy.maximum(starts, tab_paths.control.max(axis=1))
+
+    def gap(low_a, high_a, low_b, high_b):
+        # Distance between boxes, those of the control points contain the segments
+        return numpy.hypot(*numpy.maximum(numpy.maximum(low_a - high_b, low_b - high_a), 0.0).T)
+
+    # The corner of the cell near each segment, or -1
+    start, end = tab_paths.start[owner], tab_paths.end()[owner]
+    near_start = gap(low, high, start, start) < radius
+    near_end = gap(low, high, end, end) < radius
+    node = numpy.where(near_start[:, None], start, end)
+    node = numpy.round(node/numpy.array([cell_width, cell_height])).astype(numpy.int64)
+    node = numpy.where(near_start | near_end, node[:, 0]*(1 << 32) + node[:, 1], -1)
+    del start, end, near_start, near_end
+
+    # Groups of `GROUP_SEGMENTS` consecutive segments of the same path
+    position = numpy.arange(len(owner)) - tab_paths.offsets[:-1][owner]
+    first = numpy.flatnonzero(numpy.concatenate([[True], (owner[1:] != owner[:-1])
+                                                 | (position[1:] % GROUP_SEGMENTS == 0)]))
+    size = numpy.diff(numpy.concatenate([first, [len(owner)]]))
+    group_low = numpy.minimum.reduceat(low, first)
+    group_high = numpy.maximum.reduceat(high, first)
+
+    def sample(segments):
+        points = numpy.concatenate([starts[segments][:, None], tab_paths.control[segments]], axis=1)
+        return numpy.einsum("scd,ck->skd", points, CLEARANCE_VALUE)
+
+    def search(groups, best):
+        boxes = numpy.concatenate([group_low[groups] - limit/2.0, group_high[groups] + limit/2.0], axis=1)
+        extent = numpy.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        bucket = max(float(numpy.median(extent)), 1e-9)
+
+        pairs = groups[GridIndex(boxes, bucket, bucket).pairs()]
+        g, h = pairs[:, 0], pairs[:, 1]
+        g, h = g[owner[first[g]] != owner[first[h]]], h[owner[first[g]] != owner[first[h]]]
+        bound = gap(group_low[g], group_high[g], group_low[h], group_high[h])
+        order = numpy.argsort(bound, kind="stable")
+        g, h, bound = g[order], h[order], bound[order]
+
+        # The nearest groups first, until no other pair can be closer
+        count = len(CLEARANCE_SAMPLES) - 1
+        for begin in range(0, len(g), CHUNK_PAIRS):
+            if bound[begin] >= best:
+                break
+            chunk = slice(begin, begin + CHUNK_PAIRS)
+            # Every segment of the first group against every segment of the second one
+            pairs = size[g[chunk]]*size[h[chunk]]
+            local = numpy.arange(pairs.sum()) - numpy.repeat(numpy.cumsum(pairs) - pairs, pairs)
+            columns = numpy.repeat(size[h[chunk]], pairs)
+            i = numpy.repeat(first[g[chunk]], pairs) + local//columns
+            j = numpy.repeat(first[h[chunk]], pairs) + local % columns
+            keep = (((node[i] < 0) | (node[i] != node[j]))
+                    & (gap(low[i], high[i], low[j], high[j]) < best))
+            i, j = i[keep], j[keep]
+            if len(i) == 0:
+                continue
+
+            # Every piece of the first curve against every piece of the second one
+            curve_i, curve_j = sample(i), sample(j)
+            a0 = numpy.repeat(curve_i[:, :-1], count, axis=1).reshape((-1, 2))
+            a1 = numpy.repeat(curve_i[:, 1:], count, axis=1).reshape((-1, 2))
+            b0 = numpy.tile(curve_j[:, :-1], (1, count, 1)).reshape((-1, 2))
+            b1 = numpy.tile(curve_j[:, 1:], (1, count, 1)).reshape((-1, 2))
+            best = min(best, float(segment_distances(a0, a1, b0, b1).min()))
+        return best
+
+    # A pair closer than `limit` shares at least one band, where both of its
+    # boxes, grown by half of the limit, overlap
+    bands = int(math.ceil(len(owner)/float(BAND_SEGMENTS)))
+    edges = numpy.linspace(low[:, 1].min(), high[:, 1].max(), bands + 1)
+    best = limit
+    for band in range(bands):
+        groups = numpy.flatnonzero((group_high[:, 1] + limit/2.0 >= edges[band])
+                                   & (group_low[:, 1] - limit/2.0 <= edges[band + 1]))
+        best = search(groups, best)
+    return best if best < limit else numpy.inf
+
+
+def cut_stats(tab_paths, shape, width, height, radius=False, clearance=True):
+    """
+    Return the `CutStats` of a jigsaw.
+
+    A border without a path is straight. Each path adds the area between it and
+     the straight border to its masculine cell and takes it from the neighbour,
+     while its length replaces the straight border on the perimeter of both.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+        Paths of the masculine borders.
+    shape: Tuple[int, int]
+        Number of columns and rows.
+    width: float
+    height: float
+        Size of the jigsaw.
+    radius: bool
+        Whether `CutStats.min_radius` is measured, it doubles the time.
+    clearance: bool
+        Whether `CutStats.min_clearance` is measured, see `min_clearance`; the
+         search of the near segments takes most of the time.
+    """
+    x, y = int(shape[0]), int(shape[1])
+    cell_width, cell_height = float(width)/x, float(height)/y
+    n = len(tab_paths)
+
+    owner = tab_paths.segment_owner()
+    starts = tab_paths.segment_starts()
+    path_length, path_area = numpy.zeros(n), numpy.zeros(n)
+    min_radius = numpy.inf if radius else None
+    for begin in range(0, len(tab_paths.kind), CHUNK_SEGMENTS):
+        chunk = slice(begin, begin + CHUNK_SEGMENTS)
+        length, area, radii = segment_measures(starts[chunk], tab_paths.control[chunk], tab_paths.kind[chunk],
+                                               radius)
+        path_length += numpy.bincount(owner[chunk], length, minlength=n)
+        path_area += numpy.bincount(owner[chunk], area, minlength=n)
+        if radius and len(radii):
+            min_radius = min(min_radius, float(radii.min()))
+
+    # The path closed by the line from its end back to its start; the area on
+    # the side of the normal of the masculine cell is positive when the path
+    # turns against the border
+    end = tab_paths.end()
+    path_area += 0.5*(end[:, 0]*tab_paths.start[:, 1] - end[:, 1]*tab_paths.start[:, 0])
+    chord = end - tab_paths.start
+    chord_length = numpy.hypot(chord[:, 0], chord[:, 1])
+    normal = FRAME_NORMAL[tab_paths.where.astype(numpy.int64)]
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        side = numpy.where(chord_length > 0,
+                           (chord[:, 0]*normal[:, 1] - chord[:, 1]*normal[:, 0])/chord_length, 0.0)
+    outward = -path_area*side
+
+    masculine = tab_paths.cell[:, 0]*y + tab_paths.cell[:, 1]
+    neighbour = tab_paths.cell + normal.astype(numpy.int64)
+    feminine = neighbour[:, 0]*y + neighbour[:, 1]
+    extra = path_length - chord_length
+
+    area = numpy.full(x*y, cell_width*cell_height)
+    area += numpy.bincount(masculine, outward, minlength=x*y) - numpy.bincount(feminine, outward, minlength=x*y)
+    perimeter = numpy.full(x*y, 2.0*(cell_width + cell_height))
+    perimeter += numpy.bincount(masculine, extra, minlength=x*y) + numpy.bincount(feminine, extra, minlength=x*y)
+
+    return CutStats(2.0*(width + height), path_length, area.reshape((x, y)), perimeter.reshape((x, y)),
+                    min_clearance(tab_paths, cell_width, cell_height) if clearance else None, min_radius)
+
+
+def print_stats(stats, output_format="text"):
+    """
+    Print `CutStats.summary`, as JSON or as lines of text.
+
+    Parameters
+    ----------
+    stats: CutStats
+    output_format: str
+        "json" or "text".
+    """
+    summary = stats.summary()
+    if output_format == "json":
+        print(json.dumps(summary, indent=2, sort_keys=True))
+        return
+    for name, value in summary.items():
+        if isinstance(value, dict):
+            value = ", ".join("{} {:.3f}".format(key, number) for key, number in value.items())
+        print("{:<16} {}".format(name, value))
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+    from jigsaw_generator_core import JigsawGeneratorCore
+    from jigsaw_generator_geometry import generate_tab_paths
+
+    parser = argparse.ArgumentParser(description="Measure the cut of a jigsaw.")
+    parser.add_argument("--size", type=parse_size, default=(4000, 3000), help="e.g. 4000x3000")
+    parser.add_argument("--grid", type=parse_size, default=(80, 60), help="number of pieces, e.g. 80x60")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--stats", choices=["text", "json"], default="text")
+    parser.add_argument("--radius", action="store_true", help="also measure the smallest radius of the curves")
+    parser.add_argument("--no-clearance", dest="clearance", action="store_false",
+                        help="do not measure the smallest clearance between the borders")
+    arguments = parser.parse_args()
+
+    core = JigsawGeneratorCore(list(arguments.grid), arguments.seed)
+    width, height = arguments.size
+    paths = generate_tab_paths(core, float(width)/arguments.grid[0], float(height)/arguments.grid[1],
+                               arguments.patterns.split(","), arguments.smooth_factor)
+    begin = time.perf_counter()
+    result = cut_stats(paths, arguments.grid, width, height, arguments.radius, arguments.clearance)
+    elapsed = time.perf_counter() - begin
+
+    print_stats(result, arguments.stats)
+    if arguments.stats == "text":
+        print("{:<16} {:.4f} s".format("time", elapsed))
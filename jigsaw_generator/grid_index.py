@@ -0,0 +1,148 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Auxiliar module that implements a spatial index of rectangles over a regular grid of buckets.
+"""
+import numpy
+
+
+class GridIndex:
+    """
+    Spatial index of axis aligned boxes.
+
+    Each box is registered on every bucket of a regular grid that it touches, so
+     only the boxes that share a bucket need to be compared. With buckets of about
+     the size of the boxes, building and querying the index take linear time.
+
+    Attributes
+    ----------
+    boxes: numpy.ndarray
+        Array of shape `(N, 4)` with `[x0, y0, x1, y1]` of each box.
+
+    bucket_size: Tuple[float, float]
+        Width and height of each bucket.
+
+    origin: Tuple[float, float]
+        Position of the corner of the bucket `(0, 0)`.
+
+    columns: int
+        Number of columns of buckets.
+
+    keys: numpy.ndarray
+        Sorted keys of the buckets of each entry.
+
+    items: numpy.ndarray
+        Index of the box of each entry, on the order of `keys`.
+    """
+
+    def __init__(self, boxes, bucket_width, bucket_height):
+        self.boxes = numpy.asarray(boxes, dtype=numpy.float64).reshape((-1, 4))
+        self.bucket_size = (float(bucket_width), float(bucket_height))
+
+        if len(self.boxes):
+            self.origin = (self.boxes[:, 0].min(), self.boxes[:, 1].min())
+            self.columns = int((self.boxes[:, 2].max() - self.origin[0])//bucket_width) + 1
+        else:
+            self.origin = (0., 0.)
+            self.columns = 1
+
+        x0, y0, x1, y1 = self._bucket_range(self.boxes)
+        width = x1 - x0 + 1
+        counts = width*(y1 - y0 + 1)
+
+        items = numpy.repeat(numpy.arange(len(self.boxes)), counts)
+        local = numpy.arange(len(items)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        dy, dx = numpy.divmod(local, numpy.repeat(width, counts))
+        keys = (numpy.repeat(y0, counts) + dy)*self.columns + numpy.repeat(x0, counts) + dx
+
+        order = numpy.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.items = items[order]
+
+    def _bucket_range(self, boxes):
+        bw, bh = self.bucket_size
+        x0 = numpy.floor((boxes[:, 0] - self.origin[0])/bw).astype(numpy.int64)
+        y0 = numpy.floor((boxes[:, 1] - self.origin[1])/bh).astype(numpy.int64)
+        x1 = numpy.floor((boxes[:, 2] - self.origin[0])/bw).astype(numpy.int64)
+        y1 = numpy.floor((boxes[:, 3] - self.origin[1])/bh).astype(numpy.int64)
+        return (numpy.clip(x0, 0, self.columns - 1), numpy.maximum(y0, 0),
+                numpy.clip(x1, 0, self.columns - 1), numpy.maximum(y1, 0))
+
+    def query(self, box):
+        """
+        Return the sorted indices of the boxes that intersect `box`.
+
+        Parameters
+        ----------
+        self: GridIndex
+            Instance of this class.
+        box: Tuple[float, float, float, float]
+            `[x0, y0, x1, y1]` of the region.
+        """
+        box = numpy.asarray(box, dtype=numpy.float64).reshape((1, 4))
+        x0, y0, x1, y1 = (value[0] for value in self._bucket_range(box))
+
+        found = list()
+        for row in range(y0, y1 + 1):
+            first = numpy.searchsorted(self.keys, row*self.columns + x0, side="left")
+            last = numpy.searchsorted(self.keys, row*self.columns + x1, side="right")
+            found.append(self.items[first:last])
+
+        found = numpy.unique(numpy.concatenate(found)) if found else numpy.zeros(0, dtype=numpy.int64)
+        boxes = self.boxes[found]
+        inside = ((boxes[:, 0] <= box[0, 2]) & (boxes[:, 2] >= box[0, 0])
+                  & (boxes[:, 1] <= box[0, 3]) & (boxes[:, 3] >= box[0, 1]))
+        return found[inside]
+
+    def pairs(self):
+        """
+        Return an array of shape `(M, 2)` with all the pairs `i < j` of boxes that intersect.
+
+        Parameters
+        ----------
+        self: GridIndex
+            Instance of this class.
+        """
+        if len(self.keys) == 0:
+            return numpy.zeros((0, 2), dtype=numpy.int64)
+
+        position = numpy.arange(len(self.keys))
+        group_start = numpy.concatenate([[True], self.keys[1:] != self.keys[:-1]])
+        group_end = numpy.concatenate([numpy.flatnonzero(group_start)[1:], [len(self.keys)]])
+        end = group_end[numpy.cumsum(group_start) - 1]
+
+        partners = end - position - 1
+        first = numpy.repeat(position, partners)
+        second = first + 1 + numpy.arange(len(first)) - numpy.repeat(
+            numpy.cumsum(partners) - partners, partners
+        )
+
+        a, b = self.items[first], self.items[second]
+        a, b = numpy.minimum(a, b), numpy.maximum(a, b)
+        keep = a != b
+        # The pairs that share several buckets, removed by sorting: faster than
+        # `numpy.unique` on the millions of pairs of the large jigsaws
+        key = numpy.sort(a[keep]*len(self.boxes) + b[keep])
+        key = key[numpy.concatenate([[True], key[1:] != key[:-1]])] if len(key) else key
+        a, b = numpy.divmod(key, len(self.boxes))
+
+        boxes_a, boxes_b = self.boxes[a], self.boxes[b]
+        inside = ((boxes_a[:, 0] <= boxes_b[:, 2]) & (boxes_a[:, 2] >= boxes_b[:, 0])
+                  & (boxes_a[:, 1] <= boxes_b[:, 3]) & (boxes_a[:, 3] >= boxes_b[:, 1]))
+        return numpy.stack([a[inside], b[inside]], axis=1)
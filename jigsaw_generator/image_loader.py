@@ -0,0 +1,309 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module image_loader.
+
+Decodes images with `QImageReader`, only at the resolution and on the region that
+ are needed. Formats like JPEG decode a scaled or clipped image directly, the
+ others are decoded and then scaled or clipped by Qt.
+
+SVG images are rendered by `QSvgRenderer` at the requested size, tile by tile,
+ and kept on `SVG_CACHE`, so the preview, the final render and the tiles of the
+ view do not rasterize the same size of the same file twice.
+
+Contains the class ImageLoadTask, that decodes an image on a `QThreadPool`.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from jigsaw_generator_info import Core, Gui, Svg
+
+QObject, QRunnable, Signal = Core.QObject, Core.QRunnable, Core.Signal
+Qt, QRect, QRectF, QSize = Core.Qt, Core.QRect, Core.QRectF, Core.QSize
+QImage, QImageReader, QImageIOHandler, QPainter = (
+    Gui.QImage, Gui.QImageReader, Gui.QImageIOHandler, Gui.QPainter
+)
+QSvgRenderer = Svg.QSvgRenderer
+
+# Largest side, in pixels, of the image decoded for the preview
+PREVIEW_SIZE = 2048
+
+# Extensions of the images rendered by `render_svg`
+VECTOR_EXTENSIONS = (".svg", ".svgz")
+
+
+class RasterCache:
+    """
+    Thread safe cache of `QImage`, that discards the least recently used ones.
+
+    Attributes
+    ----------
+    max_bytes: int
+        Limit of the sum of the sizes of the images kept.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the image of `key`, or `None` if it is not cached.
+
+        Parameters
+        ----------
+        self: RasterCache
+            Instance of this class.
+        key: Hashable
+        """
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        """
+        Keep `image` as the image of `key`.
+
+        Parameters
+        ----------
+        self: RasterCache
+            Instance of this class.
+        key: Hashable
+        image: QImage
+        """
+        size = image.sizeInBytes()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.sizeInBytes()
+            self._images[key] = image
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, discarded = self._images.popitem(last=False)
+                self._bytes -= discarded.sizeInBytes()
+
+    def clear(self):
+        """
+        Discard all the images.
+
+        Parameters
+        ----------
+        self: RasterCache
+            Instance of this class.
+        """
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+
+SVG_CACHE = RasterCache(512*1024*1024)
+
+
+def is_vector(image_path):
+    """
+    Return `True` if the image on the given path is rendered by `render_svg`.
+
+    Parameters
+    ----------
+    image_path: str
+    """
+    return os.path.splitext(image_path)[1].lower() in VECTOR_EXTENSIONS
+
+
+def render_svg(image_path, size=None, region=None):
+    """
+    Render a SVG image with `QSvgRenderer`.
+
+    The document is painted in a single pass on an image of the size of the
+     result; to bound the memory of a large target, render it by regions. The
+     result is not cached, see `read_image`.
+
+    Parameters
+    ----------
+    image_path: str
+
+    size: Tuple[int, int]
+        Size of the result, the size of the region (or of the image) if `None`.
+
+    region: Tuple[int, int, int, int]
+        Rectangle `(x, y, width, height)` rendered, on the pixels of the default
+         size of the image, the whole image if `None`.
+    """
+    renderer = QSvgRenderer(image_path)
+    if not renderer.isValid():
+        raise IOError("It was not possible to load the file {}".format(image_path))
+
+    default = renderer.defaultSize()
+    view = renderer.viewBoxF()
+    x, y, width, height = region or (0, 0, default.width(), default.height())
+    scale_x, scale_y = view.width()/max(default.width(), 1), view.height()/max(default.height(), 1)
+    renderer.setViewBox(QRectF(view.x() + x*scale_x, view.y() + y*scale_y,
+                               width*scale_x, height*scale_y))
+
+    width, height = size or (width, height)
+    image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+    if image.isNull():
+        raise IOError("It was not possible to allocate an image of {}x{} for the file {}".format(
+            width, height, image_path
+        ))
+    image.fill(Qt.transparent)
+
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+    renderer.render(painter, QRectF(0, 0, width, height))
+    painter.end()
+    return image
+
+
+def image_size(image_path):
+    """
+    Return the `QSize` of the image on the given path, reading only its header.
+
+    The size is invalid if the format does not tell it without decoding.
+
+    Parameters
+    ----------
+    image_path: str
+    """
+    if is_vector(image_path):
+        renderer = QSvgRenderer(image_path)
+        return renderer.defaultSize() if renderer.isValid() else QSize()
+    return QImageReader(image_path).size()
+
+
+def fit_size(size, max_size):
+    """
+    Return `size` scaled down, keeping its aspect ratio, to fit a square of side `max_size`.
+
+    Parameters
+    ----------
+    size: QSize
+
+    max_size: int
+    """
+    if size.width() <= max_size and size.height() <= max_size:
+        return QSize(size)
+    return size.scaled(max_size, max_size, Qt.KeepAspectRatio)
+
+
+def supports_region(image_path):
+    """
+    Return `True` if the format of the image decodes a region without decoding the whole image.
+
+    Parameters
+    ----------
+    image_path: str
+    """
+    return is_vector(image_path) or QImageReader(image_path).supportsOption(QImageIOHandler.ClipRect)
+
+
+def read_image(image_path, size=None, region=None):
+    """
+    Decode the image on the given path.
+
+    The SVG images are rendered by `render_svg` and cached on `SVG_CACHE` for
+     each file, size and region.
+
+    Parameters
+    ----------
+    image_path: str
+
+    size: Tuple[int, int]
+        Size of the result, the region (or the image) is scaled to it.
+
+    region: Tuple[int, int, int, int]
+        Rectangle `(x, y, width, height)` of the image that is decoded, the whole
+         image if `None`.
+    """
+    if is_vector(image_path):
+        key = (os.path.abspath(image_path), os.path.getmtime(image_path),
+               tuple(size) if size else None, tuple(region) if region else None)
+        image = SVG_CACHE.get(key)
+        if image is None:
+            image = render_svg(image_path, size, region)
+            SVG_CACHE.put(key, image)
+        return image
+
+    reader = QImageReader(image_path)
+    if region is not None:
+        reader.setClipRect(QRect(*region))
+    if size is not None:
+        reader.setScaledSize(QSize(*size))
+
+    image = reader.read()
+    if image.isNull():
+        raise IOError("It was not possible to load the file {}: {}".format(
+            image_path, reader.errorString()
+        ))
+    return image
+
+
+class ImageLoadSignals(QObject):
+    """
+    Signals emitted by `ImageLoadTask`.
+
+    `finished` carries the generation of the task and the `QImage`, `failed` the
+     generation and the message of the error.
+    """
+
+    finished = Signal(int, object)
+    failed = Signal(int, str)
+
+
+class ImageLoadTask(QRunnable):
+    """
+    Decode an image, see `read_image`, on a `QThreadPool`.
+
+    Attributes
+    ----------
+    generation: int
+        Identifier of the request of this image.
+
+    image_path: str
+
+    size: Tuple[int, int]
+
+    region: Tuple[int, int, int, int]
+
+    signals: ImageLoadSignals
+    """
+
+    def __init__(self, generation, image_path, size=None, region=None):
+        super(ImageLoadTask, self).__init__()
+        self.generation = generation
+        self.image_path = image_path
+        self.size = size
+        self.region = region
+        self.signals = ImageLoadSignals()
+
+    def run(self):
+        try:
+            image = read_image(self.image_path, self.size, self.region)
+        except IOError as error:
+            self.signals.failed.emit(self.generation, str(error))
+            return
+        self.signals.finished.emit(self.generation, image)
@@ -22,28 +22,40 @@ Module jigsaw_generator.
 Contains the class JigsawGenerator.
 """
 import os
-import random
 from jigsaw_generator_info import Widgets, Core, Gui, Svg, PYSIDE_VERSION
 
 from ui_jigsaw_generator_main_window import Ui_JigsawGenerator
 from jigsaw_generator_core import JigsawGeneratorCore
-from smoothed_path import smoothed_path
+from jigsaw_generator_geometry import TabPaths, border_tab_paths, generate_tab_paths
+from jigsaw_painter import tab_painter_path
+from local_reroll import piece_edges, render_dirty, reroll_edges
+from animation import AnimationTask, is_animated
+from image_loader import PREVIEW_SIZE, ImageLoadTask, fit_size, image_size, is_vector
+from output_writer import VECTOR_FORMATS, OutputOptions, WriteOutputsTask, output_format, write_vector
+from piece_index import PieceIndex
+from preview_task import PreviewTask
+from render_profile import get_profile
+from tab_validator import validate_and_reroll
 
 QMainWindow, QFileDialog, QInputDialog = Widgets.QMainWindow, Widgets.QFileDialog, Widgets.QInputDialog
 QColorDialog, QApplication, QStyleFactory = Widgets.QColorDialog, Widgets.QApplication, Widgets.QStyleFactory
 QShortcut = Gui.QShortcut if int(PYSIDE_VERSION) >= 6 else Widgets.QShortcut
-QPixmap, QPainter, QPainterPath = Gui.QPixmap, Gui.QPainter, Gui.QPainterPath
+QImage, QPainter, QPainterPath = Gui.QImage, Gui.QPainter, Gui.QPainterPath
 QColor, QPalette, QKeySequence = Gui.QColor, Gui.QPalette, Gui.QKeySequence
 Qt, QPointF, QSize, QRect = Core.Qt, Core.QPointF, Core.QSize, Core.QRect
+QTimer, QThreadPool = Core.QTimer, Core.QThreadPool
 QSvgGenerator = Svg.QSvgGenerator
 # from PySide2.QtWidgets import QMainWindow, QFileDialog, QInputDialog
 # from PySide2.QtWidgets import QColorDialog, QApplication, QStyleFactory
 # from PySide2.QtWidgets import QShortcut
-# from PySide2.QtGui import QPixmap, QPainter, QPainterPath,  QColor, QPalette
+# from PySide2.QtGui import QImage, QPainter, QPainterPath,  QColor, QPalette
 # from PySide2.QtGui import QKeySequence
-# from PySide2.QtCore import Qt, QPointF, QSize, QRect
+# from PySide2.QtCore import Qt, QPointF, QSize, QRect, QTimer, QThreadPool
 # from PySide2.QtSvg import QSvgGenerator
 
+# Time without changes of the parameters before the preview is computed
+PREVIEW_DELAY_MS = 250
+
 
 class JigsawGenerator(QMainWindow):
     """
@@ -73,11 +85,48 @@ class JigsawGenerator(QMainWindow):
     image_path: str
         Absolute path to the image where the jigsaw will be built upon.
 
+    image_size: QSize
+        Size of the image located on `image_path`.
+
+    base_image: QImage
+        The image loaded from `image_path`, scaled down to fit `PREVIEW_SIZE`. It
+         is decoded on the global `QThreadPool`.
+
+    tab_paths: TabPaths
+        Paths of the masculine borders of the jigsaw drawn over the image.
+
+    piece_index: PieceIndex
+        Description of the pieces of the jigsaw drawn over the image.
+
     cell_width: float
         Float variable that indicates the width of each cell of the jigsaw on the image.
 
     cell_height: float
         Float variable that indicates the height of each cell of the jigsaw on the image.
+
+    validate_tabs: bool
+        Whether the borders that overlap each other are re-rolled before drawing.
+
+    output_options: OutputOptions
+        Options of the encoders of the saved images.
+
+    preview_timer: QTimer
+        Single shot timer that starts the live preview, restarted on each change
+         of the parameters.
+
+    preview_generation: int
+        Incremented on each change of the parameters, the previews of older
+         generations are cancelled.
+
+    full_image: QImage
+        The image of `image_path` at full resolution, null until a
+         `WriteOutputsTask` decodes it.
+
+    rendered_image: QImage
+        The last image rendered by a `WriteOutputsTask`, updated in place by the re-rolls.
+
+    rendered_key: tuple
+        Parameters of `rendered_image`, see `render_key`.
     """
 
     @staticmethod
@@ -110,7 +159,7 @@ class JigsawGenerator(QMainWindow):
 
     @staticmethod
     def paint_masculine_border(
-        cell_coordinates, where, cell_width, cell_height, patterns, painter, smooth_factor
+        cell_coordinates, where, cell_width, cell_height, patterns, painter, smooth_factor, rng
     ):
         """
         Draw the masculine border of one cell.
@@ -130,293 +179,34 @@ class JigsawGenerator(QMainWindow):
             Indicates the height of each cell.
 
         patterns: List[str]
-            The patterns considered to paint the border.
-            Supported "Triangle" and "Square"
+            The patterns considered to paint the border, see `patterns.PATTERNS`.
 
         painter: QPainter
             The QPainter element used to paint the borders
 
         smooth_factor: float
+
+        rng: EdgeRandom
+            Source of the random values of this border, obtained with
+             `JigsawGeneratorCore.edge_random`.
         """
 
-        pattern = random.choice(patterns)
-
-        if "Triangle" in pattern:
-            #          C  ---*
-            #               / \
-            #              /   \
-            #             /     \
-            # ___________/       \___________
-            # |          |       |          |
-            # A          B       D          E
-
-            A, B, C, D, E = None, None, None, None, None
-
-            # parameters necessary to make the borders different between
-            #  each other
-            b0, b1 = .3, .45
-            c0, c1 = .4, .6
-            c2, c3 = .15, .25
-            d0, d1 = .55, .7
-            x0, x1 = -.05, .05
-
-            if where == JigsawGeneratorCore.WhichBorder.DOWN:
-                y = (cell_coordinates[1] + 1)*cell_height
-                x_begin = cell_coordinates[0]*cell_width
-                A = QPointF(x_begin, y)
-                B = QPointF(x_begin + cell_width*random.uniform(b0, b1),
-                            y + cell_height*random.uniform(x0, x1))
-                C = QPointF(x_begin + cell_width*random.uniform(c0, c1),
-                            y + cell_height*random.uniform(c2, c3))
-                D = QPointF(x_begin + cell_width*random.uniform(d0, d1),
-                            y + cell_height*random.uniform(x0, x1))
-                E = QPointF(x_begin + cell_width, y)
-
-            elif where == JigsawGeneratorCore.WhichBorder.UP:
-                y = cell_coordinates[1]*cell_height
-                x_begin = cell_coordinates[0]*cell_width
-                A = QPointF(x_begin, y)
-                B = QPointF(x_begin + cell_width*random.uniform(b0, b1),
-                            y + cell_height*random.uniform(x0, x1))
-                C = QPointF(x_begin + cell_width*random.uniform(c0, c1),
-                            y - cell_height*random.uniform(c2, c3))
-                D = QPointF(x_begin + cell_width*random.uniform(d0, d1),
-                            y + cell_height*random.uniform(x0, x1))
-                E = QPointF(x_begin + cell_width, y)
-
-            elif where == JigsawGeneratorCore.WhichBorder.LEFT:
-                x = cell_coordinates[0]*cell_width
-                y_begin = cell_coordinates[1]*cell_height
-                A = QPointF(x, y_begin)
-                B = QPointF(x + cell_width*random.uniform(x0, x1),
-                            y_begin + cell_height*random.uniform(b0, b1))
-                C = QPointF(x - cell_width*random.uniform(c2, c3),
-                            y_begin + cell_height*random.uniform(c0, c1))
-                D = QPointF(x + cell_width*random.uniform(x0, x1),
-                            y_begin + cell_height*random.uniform(d0, d1))
-                E = QPointF(x, y_begin + cell_height)
-
-            elif where == JigsawGeneratorCore.WhichBorder.RIGHT:
-                x = (cell_coordinates[0] + 1)*cell_width
-                y_begin = cell_coordinates[1]*cell_height
-                A = QPointF(x, y_begin)
-                B = QPointF(x + cell_width*random.uniform(x0, x1),
-                            y_begin + cell_height*random.uniform(b0, b1))
-                C = QPointF(x + cell_width*random.uniform(c2, c3),
-                            y_begin + cell_height*random.uniform(c0, c1))
-                D = QPointF(x + cell_width*random.uniform(x0, x1),
-                            y_begin + cell_height*random.uniform(d0, d1))
-                E = QPointF(x, y_begin + cell_height)
-
-            path = QPainterPath(A)
-
-            if "Rounded" in pattern:
-                smoothed_path(smooth_factor, [A, B, C, D, E], path)
-            else:
-                path.lineTo(B)
-                path.lineTo(C)
-                path.lineTo(D)
-                path.lineTo(E)
-
-            painter.drawPath(path)
-
-        elif "Square" in pattern:
-            #         C * ________ * D
-            #            |       |
-            #            |       |
-            #            |       |
-            # ___________|       |___________
-            # |          |       |          |
-            # A          B       E          F
-
-            A, B, C, D, E, F = None, None, None, None, None, None
-
-            # parameters necessary to make the borders different between
-            #  each other
-            b0, b1 = .30, .40
-            c0, c1 = .25, .35
-            c2, c3 = .15, .25
-            d0, d1 = .65, .75
-            d2, d3 = c2, c3
-            e0, e1 = .60, .70
-            x0, x1 = -.05, .05
-
-            if where == JigsawGeneratorCore.WhichBorder.DOWN:
-                y = (cell_coordinates[1] + 1)*cell_height
-                x_begin = cell_coordinates[0]*cell_width
-                A = QPointF(x_begin, y)
-                B = QPointF(x_begin + cell_width*random.uniform(b0, b1),
-                            y + cell_height*random.uniform(x0, x1))
-                C = QPointF(x_begin + cell_width*random.uniform(c0, c1),
-                            y + cell_height*random.uniform(c2, c3))
-                D = QPointF(x_begin + cell_width*random.uniform(d0, d1),
-                            y + cell_height*random.uniform(d2, d3))
-                E = QPointF(x_begin + cell_width*random.uniform(e0, e1),
-                            y + cell_height*random.uniform(x0, x1))
-                F = QPointF(x_begin + cell_width, y)
-
-            elif where == JigsawGeneratorCore.WhichBorder.UP:
-                y = cell_coordinates[1]*cell_height
-                x_begin = cell_coordinates[0]*cell_width
-                A = QPointF(x_begin, y)
-                B = QPointF(x_begin + cell_width*random.uniform(b0, b1),
-                            y + cell_height*random.uniform(x0, x1))
-                C = QPointF(x_begin + cell_width*random.uniform(c0, c1),
-                            y - cell_height*random.uniform(c2, c3))
-                D = QPointF(x_begin + cell_width*random.uniform(d0, d1),
-                            y - cell_height*random.uniform(d2, d3))
-                E = QPointF(x_begin + cell_width*random.uniform(e0, e1),
-                            y + cell_height*random.uniform(x0, x1))
-                F = QPointF(x_begin + cell_width, y)
-
-            elif where == JigsawGeneratorCore.WhichBorder.LEFT:
-                x = cell_coordinates[0]*cell_width
-                y_begin = cell_coordinates[1]*cell_height
-                A = QPointF(x, y_begin)
-                B = QPointF(x + cell_width*random.uniform(x0, x1),
-                            y_begin + cell_height*random.uniform(b0, b1))
-                C = QPointF(x - cell_width*random.uniform(c2, c3),
-                            y_begin + cell_height*random.uniform(c0, c1))
-                D = QPointF(x - cell_width*random.uniform(d2, d3),
-                            y_begin + cell_height*random.uniform(d0, d1))
-                E = QPointF(x + cell_width*random.uniform(x0, x1),
-                            y_begin + cell_height*random.uniform(e0, e1))
-                F = QPointF(x, y_begin + cell_height)
-
-            elif where == JigsawGeneratorCore.WhichBorder.RIGHT:
-                x = (cell_coordinates[0] + 1)*cell_width
-                y_begin = cell_coordinates[1]*cell_height
-                A = QPointF(x, y_begin)
-                B = QPointF(x + cell_width*random.uniform(x0, x1),
-                            y_begin + cell_height*random.uniform(b0, b1))
-                C = QPointF(x + cell_width*random.uniform(c2, c3),
-                            y_begin + cell_height*random.uniform(c0, c1))
-                D = QPointF(x + cell_width*random.uniform(d2, d3),
-                            y_begin + cell_height*random.uniform(d0, d1))
-                E = QPointF(x + cell_width*random.uniform(x0, x1),
-                            y_begin + cell_height*random.uniform(e0, e1))
-                F = QPointF(x, y_begin + cell_height)
-
-            path = QPainterPath(A)
-
-            if "Rounded" in pattern:
-                smoothed_path(smooth_factor, [A, B, C, D, E, F], path)
-            else:
-                path.lineTo(B)
-                path.lineTo(C)
-                path.lineTo(D)
-                path.lineTo(E)
-                path.lineTo(F)
-
-            painter.drawPath(path)
-
-        # elif "Circle" in pattern:
-        #     A, B, C, D, E, F = None, None, None, None, None, None
-        #
-        #     # parameters necessary to make the borders different between
-        #     #  each other
-        #     b0, b1 = .3, .45
-        #     c0, c1 = .15, .25
-        #     e0, e1 = .55, .7
-        #     x0, x1 = -.05, .05
-        #     r0, r1 = (e1 - b0)/2, .5/2
-        #
-        #     if where == JigsawGeneratorCore.WhichBorder.DOWN:
-        #         y = (cell_coordinates[1] + 1)*cell_height
-        #         x_begin = cell_coordinates[0]*cell_width
-        #         A = QPointF(x_begin, y)
-        #         B = QPointF(x_begin + cell_width*random.uniform(b0, b1),
-        #                     y + cell_height*random.uniform(x0, x1))
-        #         C = QPointF(x_begin + cell_width*random.uniform(b0, b1),
-        #                     y + cell_height*random.uniform(c0, c1))
-        #         D = QPointF(x_begin + cell_width*random.uniform(e0, e1),
-        #                     y + cell_height*random.uniform(c0, c1))
-        #         E = QPointF(x_begin + cell_width*random.uniform(e0, e1),
-        #                     y + cell_height*random.uniform(x0, x1))
-        #         F = QPointF(x_begin + cell_width, y)
-        #
-        #     elif where == JigsawGeneratorCore.WhichBorder.UP:
-        #         y = cell_coordinates[1]*cell_height
-        #         x_begin = cell_coordinates[0]*cell_width
-        #         A = QPointF(x_begin, y)
-        #         B = QPointF(x_begin + cell_width*random.uniform(b0, b1),
-        #                     y + cell_height*random.uniform(x0, x1))
-        #         C = QPointF(x_begin + cell_width*random.uniform(b0, b1),
-        #                     y - cell_height*random.uniform(c0, c1))
-        #         D = QPointF(x_begin + cell_width*random.uniform(e0, e1),
-        #                     y - cell_height*random.uniform(c0, c1))
-        #         E = QPointF(x_begin + cell_width*random.uniform(e0, e1),
-        #                     y + cell_height*random.uniform(x0, x1))
-        #         F = QPointF(x_begin + cell_width, y)
-        #
-        #     elif where == JigsawGeneratorCore.WhichBorder.LEFT:
-        #         x = cell_coordinates[0]*cell_width
-        #         y_begin = cell_coordinates[1]*cell_height
-        #         A = QPointF(x, y_begin)
-        #         B = QPointF(x + cell_width*random.uniform(x0, x1),
-        #                     y_begin + cell_height*random.uniform(b0, b1))
-        #         C = QPointF(x - cell_width*random.uniform(c0, c1),
-        #                     y_begin + cell_height*random.uniform(b0, b1))
-        #         D = QPointF(x - cell_width*random.uniform(c0, c1),
-        #                     y_begin + cell_height*random.uniform(e0, e1))
-        #         E = QPointF(x + cell_width*random.uniform(x0, x1),
-        #                     y_begin + cell_height*random.uniform(e0, e1))
-        #         F = QPointF(x, y_begin + cell_height)
-        #
-        #     elif where == JigsawGeneratorCore.WhichBorder.RIGHT:
-        #         x = (cell_coordinates[0] + 1)*cell_width
-        #         y_begin = cell_coordinates[1]*cell_height
-        #         A = QPointF(x, y_begin)
-        #         B = QPointF(x + cell_width*random.uniform(x0, x1),
-        #                     y_begin + cell_height*random.uniform(b0, b1))
-        #         C = QPointF(x + cell_width*random.uniform(c0, c1),
-        #                     y_begin + cell_height*random.uniform(b0, b1))
-        #         D = QPointF(x + cell_width*random.uniform(c0, c1),
-        #                     y_begin + cell_height*random.uniform(e0, e1))
-        #         E = QPointF(x + cell_width*random.uniform(x0, x1),
-        #                     y_begin + cell_height*random.uniform(e0, e1))
-        #         F = QPointF(x, y_begin + cell_height)
-        #
-        #     path = QPainterPath(A)
-        #     path.lineTo(B)
-        #     path.lineTo(C)
-        #     # Connect point `C` with point `D` with an arc that has radius between
-        #     #  `r0` and `r1`
-        #     center = QPointF((C + D)/2)
-        #     radiusX = random.uniform(r0, r1)*cell_width
-        #     radiusY = random.uniform(r0, r1)*cell_height
-        #     rec = QRectF(center.x() - radiusX, center.y() - radiusY, 2*radiusX, 2*radiusY)
-        #
-        #     path.arcTo(rec, 60, 240)
-        #
-        #     path.lineTo(E)
-        #     path.lineTo(F)
-        #     painter.drawPath(path)
+        tab_paths = border_tab_paths(
+            cell_coordinates, where, cell_width, cell_height, patterns, smooth_factor, rng
+        )
+        painter.drawPath(tab_painter_path(tab_paths, 0))
 
         return painter
 
-    def draw_on_pixmap(self):
+    def selected_patterns(self):
         """
-        Draw the jigsaw on the pixmap located on `image_path`.
-
-        The pixmap which the jigsaw will be drawn upon uses a QPen of the color
-         `pen_color`, with number of rows `x` and number of lines `y`. The output
-          is saved on the label `ui.labelImage` when the process is finished.
+        Return the list of the border patterns selected on the GUI.
 
         Parameters
         ----------
         self: JigsawGenerator
             Instance of the own class.
         """
-        self.load_image(self.image_path)
-        pixmap = self.ui.labelImage.pixmap()
-        painter = QPainter(pixmap)
-        painter.setPen(self.pen_color)
-        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
-        painter.setRenderHint(QPainter.Antialiasing, True)
-
-        JigsawGenerator.draw_borders(pixmap.width() - 1, pixmap.height() - 1, painter)
-
         patterns = list()
 
         if self.ui.checkBoxTriangleBorders.isChecked():
@@ -427,49 +217,231 @@ class JigsawGenerator(QMainWindow):
             patterns.append("Square")
         if self.ui.checkBoxSquaredRounded.isChecked():
             patterns.append("Square Rounded")
+        if self.ui.checkBoxCircle.isChecked():
+            patterns.append("Circle")
+        if self.ui.checkBoxKnob.isChecked():
+            patterns.append("Knob")
+
+        return patterns
+
+    def generate_tab_paths(self, cell_width, cell_height, core=None):
+        """
+        Compute the paths of the masculine borders for the given cell size.
+
+        When `validate_tabs` is set, the borders that overlap or are too close to
+         each other are re-rolled (see `tab_validator.validate_and_reroll`).
+         Returns `None` if no pattern is selected.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+
+        cell_width: float
+            Indicates the width of each cell.
+
+        cell_height: float
+            Indicates the height of each cell.
+
+        core: JigsawGeneratorCore
+            A `JigsawGeneratorCore.snapshot` of `core` whose re-rolls must not
+             change the jigsaw shown, `core` itself if `None`.
+        """
+        patterns = self.selected_patterns()
 
-        if not list:
+        if not patterns:
             print("Select at least one border pattern")
-            painter.end()
-            self.ui.labelImage.setPixmap(pixmap)
-            return
+            return None
 
         rounded_factor = self.ui.doubleSpinBoxSmoothFactor.value()
+        update_matrix = core is None
+        core = self.core if core is None else core
+
+        if not self.validate_tabs:
+            return generate_tab_paths(core, cell_width, cell_height, patterns, rounded_factor)
+
+        tab_paths, conflicts = validate_and_reroll(
+            core, cell_width, cell_height, patterns, rounded_factor, update_matrix=update_matrix
+        )
+        if len(conflicts):
+            self.ui.statusbar.showMessage(
+                "{} pairs of borders still overlap or are too close".format(len(conflicts))
+            )
+        return tab_paths
+
+    def draw_on_pixmap(self):
+        """
+        Draw the jigsaw over the image located on `image_path`.
+
+        The jigsaw, with number of rows `x` and number of lines `y`, is computed
+         and shown over the image on the view `ui.graphicsViewImage`, which only
+         paints the visible tiles at the current zoom. The full image is only
+         composed when it is saved, see `save_outputs`.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+        """
+        tab_paths = self.generate_tab_paths(self.cell_width, self.cell_height)
+        self.show_tab_paths(TabPaths.empty() if tab_paths is None else tab_paths)
+
+    def show_tab_paths(self, tab_paths):
+        """
+        Set `tab_paths`, build its `piece_index` and show them on `ui.graphicsViewImage`.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
 
-        for i in range(self.x):
-            for j in range(self.y):
-                cell = self.core.get_cell([i, j])
-
-                if cell.up == JigsawGeneratorCore.BorderType.MASCULINE:
-                    JigsawGenerator.paint_masculine_border(
-                        [i, j], JigsawGeneratorCore.WhichBorder.UP,
-                        self.cell_width, self.cell_height, patterns, painter, rounded_factor
-                    )
-                if cell.down == JigsawGeneratorCore.BorderType.MASCULINE:
-                    JigsawGenerator.paint_masculine_border(
-                        [i, j], JigsawGeneratorCore.WhichBorder.DOWN,
-                        self.cell_width, self.cell_height, patterns, painter, rounded_factor
-                    )
-                if cell.left == JigsawGeneratorCore.BorderType.MASCULINE:
-                    JigsawGenerator.paint_masculine_border(
-                        [i, j], JigsawGeneratorCore.WhichBorder.LEFT,
-                        self.cell_width, self.cell_height, patterns, painter, rounded_factor
-                    )
-                if cell.right == JigsawGeneratorCore.BorderType.MASCULINE:
-                    JigsawGenerator.paint_masculine_border(
-                        [i, j], JigsawGeneratorCore.WhichBorder.RIGHT,
-                        self.cell_width, self.cell_height, patterns, painter, rounded_factor
-                    )
-
-        painter.end()
-        self.ui.labelImage.setPixmap(pixmap)
+        tab_paths: TabPaths
+            Paths of the masculine borders of `core`.
+        """
+        self.tab_paths = tab_paths
+        self.piece_index = PieceIndex.build(self.core, tab_paths, self.cell_width, self.cell_height)
+
+        self.update_overlay()
+        self.ui.graphicsViewImage.set_piece_index(self.piece_index)
+
+    def selected_profile(self):
+        """
+        Return the `RenderProfile` selected on `ui.comboBoxRenderProfile`.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+        """
+        return get_profile(self.ui.comboBoxRenderProfile.currentText())
+
+    def update_overlay(self, *args):
+        """
+        Show `tab_paths` on `ui.graphicsViewImage` with the selected backend and profile.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+        """
+        self.ui.graphicsViewImage.set_overlay(
+            self.tab_paths, self.pen_color, self.ui.comboBoxRasterBackend.currentText(),
+            self.selected_profile()
+        )
+
+    def SLOT_piece_hovered(self, piece):
+        """
+        Function called when the mouse enters a piece on `ui.graphicsViewImage`.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+
+        piece: int
+            Identifier of the piece on `piece_index`, -1 outside the jigsaw.
+        """
+        if piece < 0:
+            self.ui.statusbar.clearMessage()
+            return
+
+        i, j = self.piece_index.cell[piece].tolist()
+        self.ui.statusbar.showMessage("Piece ({}, {})".format(i, j))
+
+    def SLOT_selection_changed(self, pieces):
+        """
+        Function called when the pieces selected on `ui.graphicsViewImage` change.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+
+        pieces: List[int]
+            Identifiers of the selected pieces.
+        """
+        self.ui.pushButtonRerollPieces.setEnabled(bool(pieces))
+
+    def SLOT_reroll_pieces(self):
+        """
+        Function called when `ui.pushButtonRerollPieces` is released.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+        """
+        self.reroll_pieces(self.ui.graphicsViewImage.selected_pieces())
+
+    def full_resolution_image(self):
+        """
+        Return the image of `image_path` at full resolution, or `None` if it was not decoded yet.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+        """
+        if self.base_image.size() == self.image_size:
+            return self.base_image
+        if self.full_image.size() == self.image_size:
+            return self.full_image
+        return None
+
+    def render_key(self):
+        """
+        Return the parameters that `rendered_image` depends on.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+        """
+        return (self.tab_paths, self.image_path, self.image_generation, self.pen_color.rgba(),
+                self.ui.comboBoxRasterBackend.currentText(), self.ui.comboBoxRenderProfile.currentText())
+
+    def reroll_pieces(self, pieces):
+        """
+        Give new borders to the given pieces, keeping all the others.
+
+        Only the tiles of `ui.graphicsViewImage` and the part of `rendered_image`
+         covered by the changed borders are rendered again.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the own class.
+
+        pieces: List[int]
+            Identifiers of the pieces on `piece_index`.
+        """
+        is_current = self.render_key() == self.rendered_key
+        edges = piece_edges(self.piece_index, pieces)
+        tab_paths, dirty = reroll_edges(
+            self.core, self.tab_paths, edges, self.cell_width, self.cell_height,
+            self.selected_patterns() or self.tab_paths.patterns,
+            self.ui.doubleSpinBoxSmoothFactor.value(), self.validate_tabs
+        )
+        if len(dirty) == 0:
+            return
+
+        self.tab_paths = tab_paths
+        self.piece_index.update_edges(tab_paths, edges)
+        self.ui.graphicsViewImage.update_region(tab_paths, dirty, self.piece_index)
+
+        if is_current and self.full_resolution_image() is not None:
+            render_dirty(self.rendered_image, self.full_resolution_image(), tab_paths, dirty,
+                         self.pen_color, self.ui.comboBoxRasterBackend.currentText(),
+                         self.selected_profile(), self.piece_index)
+            self.rendered_key = self.render_key()
 
     def draw_on_svg(self, width, height):
         """
-        Generate a SVG jigsaw of the given width and height.
+        Generate a SVG or DXF jigsaw of the given width and height.
 
         The SVG which the jigsaw will be drawn upon uses a QPen of the color
-         `pen_color`, with number of rows `x` and number of lines `y`.
+         `pen_color`, with number of rows `x` and number of lines `y`. The
+         format is given by the extension of the file chosen.
 
         Parameters
         ----------
@@ -483,85 +455,140 @@ class JigsawGenerator(QMainWindow):
             Hieght of the SVG.
         """
         filename, filters = QFileDialog.getSaveFileName(
-            parent=self, caption="Save Image", filter="SVG (*.svg)",
+            parent=self, caption="Save Image", filter="SVG (*.svg);;DXF (*.dxf)",
             selected_filter="output.svg"
         )
 
-        generator = QSvgGenerator()
-        generator.setFileName(filename)
-        generator.setSize(QSize(width, height))
-        generator.setViewBox(QRect(0, 0, width, height))
-
-        painter = QPainter(generator)
-        painter.setPen(self.pen_color)
-        painter.setRenderHint(QPainter.Antialiasing, True)
-
-        JigsawGenerator.draw_borders(width, height, painter)
-
-        patterns = list()
-
-        if self.ui.checkBoxTriangleBorders.isChecked():
-            patterns.append("Triangle")
-        if self.ui.checkBoxTriangleRounded.isChecked():
-            patterns.append("Triangle Rounded")
-        if self.ui.checkBoxSquaredBorders.isChecked():
-            patterns.append("Square")
-        if self.ui.checkBoxSquaredRounded.isChecked():
-            patterns.append("Square Rounded")
-
-        if not list:
-            print("Select at least one border pattern")
+        if not filename:
             return
 
-        rounded_factor = self.ui.doubleSpinBoxSmoothFactor.value()
+        # The borders are validated again at the size of the file, on a snapshot,
+        # so the re-rolls do not change the jigsaw shown nor the later re-rolls
+        tab_paths = self.generate_tab_paths(float(width)/self.x, float(height)/self.y,
+                                            self.core.snapshot())
 
-        cell_width = float(width)/self.x
-        cell_height = float(height)/self.y
-
-        for i in range(self.x):
-            for j in range(self.y):
-                cell = self.core.get_cell([i, j])
-
-                if cell.up == JigsawGeneratorCore.BorderType.MASCULINE:
-                    JigsawGenerator.paint_masculine_border(
-                        [i, j], JigsawGeneratorCore.WhichBorder.UP,
-                        cell_width, cell_height, patterns, painter, rounded_factor
-                    )
-                if cell.down == JigsawGeneratorCore.BorderType.MASCULINE:
-                    JigsawGenerator.paint_masculine_border(
-                        [i, j], JigsawGeneratorCore.WhichBorder.DOWN,
-                        cell_width, cell_height, patterns, painter, rounded_factor
-                    )
-                if cell.left == JigsawGeneratorCore.BorderType.MASCULINE:
-                    JigsawGenerator.paint_masculine_border(
-                        [i, j], JigsawGeneratorCore.WhichBorder.LEFT,
-                        cell_width, cell_height, patterns, painter, rounded_factor
-                    )
-                if cell.right == JigsawGeneratorCore.BorderType.MASCULINE:
-                    JigsawGenerator.paint_masculine_border(
-                        [i, j], JigsawGeneratorCore.WhichBorder.RIGHT,
-                        cell_width, cell_height, patterns, painter, rounded_factor
-                    )
-
-        painter.end()
+        if tab_paths is None:
+            tab_paths = TabPaths.empty()
+
+        try:
+            write_vector(filename, width, height, tab_paths, self.pen_color, self.selected_profile())
+        except IOError as error:
+            print(error)
 
     def SLOT_generate_image(self):
         """
         Function called when `ui.pushButtonGenerateImage` is released.
 
-        It generates the jigsaw and update the pixmap of `ui.labelImage`
+        It generates the jigsaw and update the view `ui.graphicsViewImage`
 
         Parameters
         ----------
         self: JigsawGenerator
             Instance of the class
         """
+        self.preview_generation += 1
         self.x = self.ui.spinBoxX.value()
         self.y = self.ui.spinBoxY.value()
         self.core.set_shape([self.x, self.y])
         self.core.generate_random()
+        self.preview_timer.stop()
+        self.cell_width = float(self.image_size.width())/self.x
+        self.cell_height = float(self.image_size.height())/self.y
         self.draw_on_pixmap()
 
+    def SLOT_schedule_preview(self, *args):
+        """
+        Function called when a parameter of the jigsaw changes on the GUI.
+
+        It cancels the preview being computed and (re)starts `preview_timer`, so the
+         preview is only computed when the parameters stop changing.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+        """
+        self.preview_generation += 1
+        self.preview_timer.start()
+
+    def start_preview(self):
+        """
+        Start the computation of the preview on the global `QThreadPool`.
+
+        When the grid shape changed, the task generates the new jigsaw itself, so
+         the GUI thread never loops over its cells; a change of pattern or smooth
+         factor keeps the borders of `core` and only recomputes their paths and
+         the drawing.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+        """
+        patterns = self.selected_patterns()
+        if not patterns:
+            print("Select at least one border pattern")
+            return
+
+        x, y = self.ui.spinBoxX.value(), self.ui.spinBoxY.value()
+        shape, core = None, self.core.snapshot()
+        if (x, y) != self.core.shape:
+            shape, core = (x, y), None
+
+        task = PreviewTask(
+            self.preview_generation, lambda generation: generation == self.preview_generation,
+            core, float(self.image_size.width())/x, float(self.image_size.height())/y, patterns,
+            self.ui.doubleSpinBoxSmoothFactor.value(), self.validate_tabs, shape
+        )
+        task.signals.finished.connect(self.SLOT_preview_finished)
+        self.preview_task = task
+        QThreadPool.globalInstance().start(task)
+
+    def SLOT_preview_finished(self, generation, result):
+        """
+        Function called when a `PreviewTask` finishes.
+
+        Shows the new borders, unless the parameters changed since the task started.
+         A jigsaw generated by the task, for a new grid shape, replaces `core`.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+
+        generation: int
+            Generation of the task.
+
+        result: Tuple[JigsawGeneratorCore, TabPaths, numpy.ndarray]
+            The jigsaw used by the task, the paths of the borders and the
+             remaining conflicts between them.
+        """
+        if generation != self.preview_generation:
+            return
+
+        core, tab_paths, conflicts = result
+        if core.shape != self.core.shape:
+            self.core = core
+            self.x, self.y = core.shape
+            self.cell_width = float(self.image_size.width())/self.x
+            self.cell_height = float(self.image_size.height())/self.y
+        elif core.seed != self.core.seed:
+            return
+        elif core.revisions != self.core.revisions:
+            # Only the borders re-rolled by the validation changed
+            changed = set(core.revisions) ^ set(self.core.revisions)
+            changed.update(edge for edge, revision in core.revisions.items()
+                           if self.core.revisions.get(edge) != revision)
+            self.core.revisions = core.revisions
+            self.core.update_edges(sorted(changed))
+
+        if conflicts is not None and len(conflicts):
+            self.ui.statusbar.showMessage(
+                "{} pairs of borders still overlap or are too close".format(len(conflicts))
+            )
+
+        self.show_tab_paths(tab_paths)
+
     def SLOT_generate_svg(self):
         """
         Function called when `ui.pushButtonGenerateSvg` is released.
@@ -576,11 +603,11 @@ class JigsawGenerator(QMainWindow):
         """
         width, ok = QInputDialog.getInt(
             self, "Width", "Set width:",
-            self.ui.labelImage.pixmap().width()
+            self.image_size.width()
         )
         height, ok = QInputDialog.getInt(
             self, "Hieght", "Set height:",
-            self.ui.labelImage.pixmap().height()
+            self.image_size.height()
         )
 
         self.draw_on_svg(width, height)
@@ -609,7 +636,7 @@ class JigsawGenerator(QMainWindow):
         """
         Function called when `ui.pushButtonSaveImage` is released.
 
-        Create a QFileDialog and try to save the generated pixmap
+        Create a QFileDialog and try to save the generated image
          on the selected file.
 
         Parameters
@@ -627,6 +654,25 @@ class JigsawGenerator(QMainWindow):
         if file_path:
             self.save_image(file_path)
 
+    def SLOT_output_options_changed(self):
+        """
+        Function called when the options of the encoders change.
+
+        Replaces `output_options` with the ones of `ui.spinBoxPngCompression`,
+         `ui.spinBoxJpegQuality` and `ui.checkBoxProgressiveJpeg`, the value -1 of
+         the spin boxes keeping the default of Qt.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+        """
+        # A new instance, so the tasks already running keep the options they started with
+        self.output_options = OutputOptions(
+            self.ui.spinBoxPngCompression.value(), self.ui.spinBoxJpegQuality.value(),
+            self.ui.checkBoxProgressiveJpeg.isChecked(), self.output_options.optimized
+        )
+
     def SLOT_select_pen_color_dialog(self):
         """
         Function called when ui.pushButtonPenColor is released.
@@ -651,7 +697,9 @@ class JigsawGenerator(QMainWindow):
         """
         Try to load the image on the given path.
 
-        Returns `True` if succeeded.
+        Only the header of the image is read here, the preview is decoded on the
+         global `QThreadPool` and shown by `SLOT_image_loaded`. Returns `True` if
+         succeeded.
 
         Parameters
         ----------
@@ -662,24 +710,74 @@ class JigsawGenerator(QMainWindow):
             Path to the file
         """
 
-        pixmap = QPixmap(image_path)
+        size = image_size(image_path)
 
-        if pixmap.isNull():
+        if not size.isValid() or size.isEmpty():
             print("It was not possible to load the file {}".format(image_path))
             return False
 
+        resized = size != self.image_size
         self.image_path = image_path
-        self.ui.labelImage.resize(pixmap.size())
-        self.ui.labelImage.setPixmap(pixmap)
-        self.cell_width = float(pixmap.width())/self.x
-        self.cell_height = float(pixmap.height())/self.y
+        self.image_size = size
+        self.cell_width = float(size.width())/self.x
+        self.cell_height = float(size.height())/self.y
+
+        self.image_generation += 1
+        self.full_image = QImage()
+        preview = fit_size(size, PREVIEW_SIZE)
+        task = ImageLoadTask(self.image_generation, image_path, (preview.width(), preview.height()))
+        task.signals.finished.connect(self.SLOT_image_loaded)
+        task.signals.failed.connect(self.SLOT_image_failed)
+        self.image_task = task
+        QThreadPool.globalInstance().start(task)
+
+        if resized:
+            self.SLOT_schedule_preview()
         return True
 
-    def save_image(self, image_path):
+    def SLOT_image_loaded(self, generation, image):
         """
-        Try to save the image on the given path.
+        Function called when an `ImageLoadTask` finishes.
 
-        Returns `True` if succeeded.
+        Shows the preview, unless another image was loaded since the task started.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+
+        generation: int
+            Generation of the task.
+
+        image: QImage
+            Preview of the image.
+        """
+        if generation != self.image_generation:
+            return
+
+        self.base_image = image
+        self.ui.graphicsViewImage.set_image(image, self.image_size, self.image_path)
+
+    def SLOT_image_failed(self, generation, message):
+        """
+        Function called when an `ImageLoadTask` fails.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+
+        generation: int
+            Generation of the task.
+
+        message: str
+        """
+        if generation == self.image_generation:
+            print(message)
+
+    def save_image(self, image_path):
+        """
+        Try to save the image on the given path, see `save_outputs`.
 
         Parameters
         ----------
@@ -689,9 +787,145 @@ class JigsawGenerator(QMainWindow):
         image_path: str
             Path to the file
         """
-        pixmap = self.ui.labelImage.pixmap()
+        return self.save_outputs([image_path])
+
+    def save_outputs(self, paths):
+        """
+        Render the image once and save it on all the given paths.
+
+        The outputs are encoded at once by a `WriteOutputsTask` on the global
+         `QThreadPool`, with the options `output_options`. Unless `rendered_image`
+         is current, the task also decodes the full resolution image and renders
+         the jigsaw over it with the backend selected on `ui.comboBoxRasterBackend`
+         and the profile selected on `ui.comboBoxRenderProfile`, and hands them
+         back to `SLOT_outputs_rendered`. The format of each one
+         is given by its extension, and the ".svg" and ".dxf" files get the vector
+         jigsaw. When the image is animated, each raster output is a sequence with
+         the jigsaw over every frame, see `save_animation`. Returns `True` if the
+         task started.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+
+        paths: List[str]
+            Paths to the files
+        """
+        if is_animated(self.image_path):
+            frames = [path for path in paths if output_format(path) not in VECTOR_FORMATS]
+            paths = [path for path in paths if output_format(path) in VECTOR_FORMATS]
+            if frames:
+                self.save_animation(frames)
+            if not paths:
+                return bool(frames)
+
+        key = self.render_key()
+        if key == self.rendered_key:
+            image, base = self.rendered_image, None
+        else:
+            image, base = None, self.full_resolution_image()
+            # A SVG is rendered again at the resolution of the output
+            if base is None or is_vector(self.image_path):
+                base = self.image_path
+
+        task = WriteOutputsTask(paths, image, self.tab_paths, self.pen_color, self.output_options,
+                                self.selected_profile(), base, self.ui.comboBoxRasterBackend.currentText())
+        task.signals.rendered.connect(lambda base, image: self.SLOT_outputs_rendered(key, base, image))
+        task.signals.finished.connect(self.SLOT_outputs_saved)
+        task.signals.failed.connect(self.SLOT_outputs_failed)
+        self.output_tasks.append(task)
+        task.signals.finished.connect(lambda paths: self.output_tasks.remove(task))
+        task.signals.failed.connect(lambda message: self.output_tasks.remove(task))
+
+        self.ui.statusbar.showMessage("Saving {}...".format(", ".join(paths)))
+        QThreadPool.globalInstance().start(task)
+        return True
+
+    def save_animation(self, paths):
+        """
+        Draw the jigsaw over every frame of the animated image and save the frames.
+
+        The frames are decoded, drawn and written one at a time by an
+         `AnimationTask` on the global `QThreadPool`, on the paths given by
+         `animation.frame_path`. Returns `True` if the task started.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+
+        paths: List[str]
+            Paths of the sequences, e.g. "frame.png" for "frame_0000.png", ...
+        """
+        task = AnimationTask(self.image_path, paths, self.tab_paths, self.pen_color,
+                             self.output_options, self.selected_profile())
+        task.signals.finished.connect(self.SLOT_outputs_saved)
+        task.signals.failed.connect(self.SLOT_outputs_failed)
+        self.output_tasks.append(task)
+        task.signals.finished.connect(lambda paths: self.output_tasks.remove(task))
+        task.signals.failed.connect(lambda message: self.output_tasks.remove(task))
+
+        self.ui.statusbar.showMessage("Saving the frames of {}...".format(", ".join(paths)))
+        QThreadPool.globalInstance().start(task)
+        return True
+
+    def SLOT_outputs_rendered(self, key, base, image):
+        """
+        Function called when a `WriteOutputsTask` renders the image.
+
+        Keeps the full resolution image and the rendered image, unless the
+         parameters changed since the task started.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+
+        key: tuple
+            `render_key` when the task started.
+
+        base: QImage
+            The full resolution image.
+
+        image: QImage
+            The rendered image.
+        """
+        if key != self.render_key():
+            return
+        if base.size() == self.image_size:
+            self.full_image = base
+        self.rendered_image = image
+        self.rendered_key = key
+
+    def SLOT_outputs_failed(self, message):
+        """
+        Function called when a `WriteOutputsTask` or an `AnimationTask` fails.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+
+        message: str
+            Message of the error.
+        """
+        print(message)
+        self.ui.statusbar.showMessage("It was not possible to save: {}".format(message), 5000)
 
-        return pixmap.save(image_path)
+    def SLOT_outputs_saved(self, paths):
+        """
+        Function called when a `WriteOutputsTask` or an `AnimationTask` finishes.
+
+        Parameters
+        ----------
+        self: JigsawGenerator
+            Instance of the class
+
+        paths: List[str]
+            Paths of the files saved.
+        """
+        self.ui.statusbar.showMessage("Saved {}".format(", ".join(paths)), 5000)
 
     def set_application_theme(self, theme_name):
         """
@@ -753,6 +987,31 @@ class JigsawGenerator(QMainWindow):
         self.ui.pushButtonSaveImage.released.connect(self.SLOT_save_image_dialog)
         self.ui.pushButtonGenerateSvg.released.connect(self.SLOT_generate_svg)
         self.ui.pushButtonPenColor.released.connect(self.SLOT_select_pen_color_dialog)
+        self.ui.graphicsViewImage.pieceHovered.connect(self.SLOT_piece_hovered)
+        self.ui.graphicsViewImage.selectionChanged.connect(self.SLOT_selection_changed)
+        self.ui.pushButtonRerollPieces.released.connect(self.SLOT_reroll_pieces)
+        self.ui.comboBoxRasterBackend.currentIndexChanged.connect(self.update_overlay)
+        self.ui.comboBoxRenderProfile.currentIndexChanged.connect(self.update_overlay)
+        self.ui.spinBoxPngCompression.valueChanged.connect(self.SLOT_output_options_changed)
+        self.ui.spinBoxJpegQuality.valueChanged.connect(self.SLOT_output_options_changed)
+        self.ui.checkBoxProgressiveJpeg.toggled.connect(self.SLOT_output_options_changed)
+
+        self.preview_generation = 0
+        self.preview_task = None
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY_MS)
+        self.preview_timer.timeout.connect(self.start_preview)
+
+        self.ui.spinBoxX.valueChanged.connect(self.SLOT_schedule_preview)
+        self.ui.spinBoxY.valueChanged.connect(self.SLOT_schedule_preview)
+        self.ui.checkBoxTriangleBorders.toggled.connect(self.SLOT_schedule_preview)
+        self.ui.checkBoxTriangleRounded.toggled.connect(self.SLOT_schedule_preview)
+        self.ui.checkBoxSquaredBorders.toggled.connect(self.SLOT_schedule_preview)
+        self.ui.checkBoxSquaredRounded.toggled.connect(self.SLOT_schedule_preview)
+        self.ui.checkBoxCircle.toggled.connect(self.SLOT_schedule_preview)
+        self.ui.checkBoxKnob.toggled.connect(self.SLOT_schedule_preview)
+        self.ui.doubleSpinBoxSmoothFactor.valueChanged.connect(self.SLOT_schedule_preview)
 
         shortcut_close = QShortcut(QKeySequence(Qt.CTRL + Qt.Key_Q), self)
         shortcut_close.activated.connect(self.close)
@@ -763,6 +1022,19 @@ class JigsawGenerator(QMainWindow):
 
         self.pen_color = QColor(Qt.white)
 
+        self.validate_tabs = True
+        self.output_options = OutputOptions()
+        self.SLOT_output_options_changed()
+        self.output_tasks = list()
+        self.tab_paths = TabPaths.empty()
+
+        self.image_generation = 0
+        self.image_task = None
+        self.image_size = QSize()
+        self.base_image = QImage()
+        self.full_image = QImage()
+        self.rendered_image = QImage()
+        self.rendered_key = None
         self.load_image(os.path.dirname(os.path.realpath(__file__)) + "/image_template.png")
 
         self.SLOT_generate_image()
@@ -21,10 +21,13 @@ Module jigsaw_generator_core.
 
 Contains the class JigsawGeneratorCore.
 """
+import copy
 from enum import Enum
 import numpy
 import random
 
+from counter_random import EdgeRandom, counter_uniform, counter_uniform_array
+
 
 class JigsawGeneratorCore:
     """
@@ -107,12 +110,11 @@ class JigsawGeneratorCore:
             self.right = JigsawGeneratorCore.BorderType.INVALID
 
 
-    def __init__(self, shape=None):
+    def __init__(self, shape=None, seed=0):
+        self.seed = seed
+        self.revisions = dict()
         if shape is not None:
-            self.matrix = numpy.ndarray(shape, dtype=numpy.object)
-            for i in range(self.matrix.shape[0]):
-                for j in range(self.matrix.shape[1]):
-                    self.matrix[i, j] = JigsawGeneratorCore.Piece()
+            self.set_shape(shape)
 
     def set_shape(self, shape):
         """
@@ -125,11 +127,257 @@ class JigsawGeneratorCore:
         shape: Tuple[int, int]
             Tuple that indicates the new shaoe of the matrix.
         """
-        self.matrix = numpy.ndarray(shape, dtype=numpy.object)
-        self.matrix.fill(JigsawGeneratorCore.Piece())
+        self.matrix = numpy.ndarray(shape, dtype=object)
         for i in range(self.matrix.shape[0]):
             for j in range(self.matrix.shape[1]):
                 self.matrix[i, j] = JigsawGeneratorCore.Piece()
+        self.revisions = dict()
+
+    @property
+    def shape(self):
+        """
+        Return the shape (number of columns, number of rows) of the jigsaw.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        """
+        return self.matrix.shape[0], self.matrix.shape[1]
+
+    def horizontal_edge_count(self):
+        """
+        Return the number of inner borders between a cell and the cell below it.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        """
+        x, y = self.shape
+        return x*max(y - 1, 0)
+
+    def edge_count(self):
+        """
+        Return the number of inner borders of the jigsaw.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        """
+        x, y = self.shape
+        return self.horizontal_edge_count() + max(x - 1, 0)*y
+
+    def edge_index(self, cell_coordinates, where):
+        """
+        Return the index of the border `where` of the given cell.
+
+        The inner borders are numbered independently of the order in which they
+         are generated: first the borders between the cell `[i, j]` and the cell
+         `[i, j + 1]` (index `i*(y - 1) + j`), then the borders between the cell
+         `[i, j]` and the cell `[i + 1, j]`. Both cells that share a border get
+         the same index. Returns `None` for the borders of the frame.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        cell_coordinates: List[int]
+            Coordinates [x, y] of the cell.
+        where: JigsawGeneratorCore.WhichBorder
+            Indicates which border of the cell.
+        """
+        x, y = self.shape
+        i, j = cell_coordinates[0], cell_coordinates[1]
+
+        if where == JigsawGeneratorCore.WhichBorder.UP:
+            j -= 1
+            where = JigsawGeneratorCore.WhichBorder.DOWN
+        elif where == JigsawGeneratorCore.WhichBorder.LEFT:
+            i -= 1
+            where = JigsawGeneratorCore.WhichBorder.RIGHT
+
+        if where == JigsawGeneratorCore.WhichBorder.DOWN:
+            if 0 <= i < x and 0 <= j < y - 1:
+                return i*(y - 1) + j
+            return None
+
+        if 0 <= i < x - 1 and 0 <= j < y:
+            return self.horizontal_edge_count() + i*y + j
+        return None
+
+    def edge_cell(self, edge_index):
+        """
+        Return the cell and which of its borders correspond to `edge_index`.
+
+        It is the inverse of `edge_index`, the returned border is always
+         `WhichBorder.DOWN` or `WhichBorder.RIGHT`.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        edge_index: int
+            Index of the border.
+        """
+        x, y = self.shape
+        horizontal = self.horizontal_edge_count()
+        if edge_index < horizontal:
+            i, j = divmod(edge_index, y - 1)
+            return [i, j], JigsawGeneratorCore.WhichBorder.DOWN
+        i, j = divmod(edge_index - horizontal, y)
+        return [i, j], JigsawGeneratorCore.WhichBorder.RIGHT
+
+    def edge_random(self, edge_index):
+        """
+        Return the `EdgeRandom` used to design the border `edge_index`.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        edge_index: int
+            Index of the border.
+        """
+        return EdgeRandom(self.seed, edge_index, self.revisions.get(edge_index, 0))
+
+    def border_type(self, cell_coordinates, where):
+        """
+        Return the `BorderType` of the border `where` of the given cell.
+
+        The type is a pure function of `seed` and of the index of the border, so
+         it can be computed for any cell without generating the whole jigsaw.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        cell_coordinates: List[int]
+            Coordinates [x, y] of the cell.
+        where: JigsawGeneratorCore.WhichBorder
+            Indicates which border of the cell.
+        """
+        edge_index = self.edge_index(cell_coordinates, where)
+        if edge_index is None:
+            return JigsawGeneratorCore.BorderType.NEUTRAL
+
+        revision = self.revisions.get(edge_index, 0)
+        border_type = JigsawGeneratorCore.BorderType.MASCULINE
+        if counter_uniform(self.seed, edge_index, revision, 0) >= .5:
+            border_type = JigsawGeneratorCore.BorderType.FEMININE
+
+        if where in (JigsawGeneratorCore.WhichBorder.UP, JigsawGeneratorCore.WhichBorder.LEFT):
+            return self.inverse_border_type(border_type)
+        return border_type
+
+    def edge_polarities(self):
+        """
+        Return the types of all the inner borders as two arrays.
+
+        The first array has shape `(x, y - 1)` and contains the value of the
+         `BorderType` of the border `DOWN` of each cell, the second has shape
+         `(x - 1, y)` and contains the value of the border `RIGHT` of each cell.
+         It gives the same result of `border_type`, but computed at once for
+         all the borders.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        """
+        x, y = self.shape
+        polarity = self.polarities(numpy.arange(self.edge_count(), dtype=numpy.int64))
+
+        horizontal = self.horizontal_edge_count()
+        return (polarity[:horizontal].reshape((x, max(y - 1, 0))),
+                polarity[horizontal:].reshape((max(x - 1, 0), y)))
+
+    def polarities(self, edges):
+        """
+        Return the value of the `BorderType` of the given borders, seen from their cells.
+
+        The cell of each border is the one given by `edge_cell`, so the value is
+         the type of its border `DOWN` or `RIGHT`.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        edges: numpy.ndarray
+            Indices of the borders.
+        """
+        edges = numpy.asarray(edges, dtype=numpy.int64)
+        return numpy.where(
+            counter_uniform_array(self.seed, edges, self.edge_revisions(edges), 0) < .5,
+            JigsawGeneratorCore.BorderType.MASCULINE.value,
+            JigsawGeneratorCore.BorderType.FEMININE.value
+        ).astype(numpy.int8)
+
+    def reroll_edges(self, edges):
+        """
+        Give a new revision to each of the given borders and update only their cells on `matrix`.
+
+        Both cells of each border are updated, the second one with
+         `inverse_border_type`, so the neighbors stay consistent.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        edges: numpy.ndarray
+            Indices of the borders.
+        """
+        edges = numpy.unique(numpy.asarray(edges, dtype=numpy.int64))
+        for edge_index in edges.tolist():
+            self.revisions[edge_index] = self.revisions.get(edge_index, 0) + 1
+        self.update_edges(edges)
+
+    def update_edges(self, edges):
+        """
+        Set the cells of the given borders on `matrix` from `polarities`, the others are not touched.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        edges: numpy.ndarray
+            Indices of the borders.
+        """
+        edges = numpy.unique(numpy.asarray(edges, dtype=numpy.int64))
+        for edge_index, value in zip(edges.tolist(), self.polarities(edges).tolist()):
+            (i, j), where = self.edge_cell(edge_index)
+            border_type = JigsawGeneratorCore.BorderType(value)
+            if where == JigsawGeneratorCore.WhichBorder.DOWN:
+                self.matrix[i, j].down = border_type
+                self.matrix[i, j + 1].up = self.inverse_border_type(border_type)
+            else:
+                self.matrix[i, j].right = border_type
+                self.matrix[i + 1, j].left = self.inverse_border_type(border_type)
+
+    def edge_revisions(self, edges):
+        """
+        Return the revision of each of the given borders, see `edge_random`.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        edges: numpy.ndarray
+            Indices of the borders.
+        """
+        edges = numpy.asarray(edges, dtype=numpy.int64)
+        revisions = numpy.zeros(edges.shape, dtype=numpy.int64)
+        if self.revisions and len(edges) < 1024:
+            # A few borders, as on the local re-rolls
+            revisions = numpy.array([self.revisions.get(edge_index, 0) for edge_index in edges.ravel().tolist()],
+                                    dtype=numpy.int64).reshape(edges.shape)
+        elif self.revisions and len(edges):
+            lookup = numpy.zeros(self.edge_count(), dtype=numpy.int64)
+            for edge_index, revision in self.revisions.items():
+                lookup[edge_index] = revision
+            revisions = lookup[edges]
+        return revisions
 
     def make_borders(self):
         """
@@ -148,12 +396,28 @@ class JigsawGeneratorCore:
             self.matrix[0, j].left = JigsawGeneratorCore.BorderType.NEUTRAL
             self.matrix[-1, j].right = JigsawGeneratorCore.BorderType.NEUTRAL
 
-    def generate_random(self):
+    def generate_random(self, seed=None):
         """
         Generate the jigsaw with random state.
 
         Initially ot call `make_borders()`, then it attributtes a random type for all
-         border of all pieces on the jigsaw.
+         border of all pieces on the jigsaw. The types come from `edge_polarities()`,
+         so the same `seed` always generates the same jigsaw.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        seed: int
+            Seed of the jigsaw, a new random seed is used if `None`.
+        """
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.revisions = dict()
+        self.update_matrix()
+
+    def update_matrix(self):
+        """
+        Set the borders of all pieces of `matrix` from `edge_polarities()`.
 
         Parameters
         ----------
@@ -162,32 +426,32 @@ class JigsawGeneratorCore:
         """
         self.make_borders()
 
-        for i in range(self.matrix.shape[0]):
-            for j in range(self.matrix.shape[1]):
-                if self.matrix[i, j].up == JigsawGeneratorCore.BorderType.INVALID:
-                    self.matrix[i, j].up = random.choice(
-                        [JigsawGeneratorCore.BorderType.MASCULINE, JigsawGeneratorCore.BorderType.FEMININE]
-                    )
-                    # Feminine or Masculine
-                    self.matrix[i, j - 1].down = self.inverse_border_type(self.matrix[i, j].up)
-
-                if self.matrix[i, j].down == JigsawGeneratorCore.BorderType.INVALID:
-                    self.matrix[i, j].down = random.choice(
-                        [JigsawGeneratorCore.BorderType.MASCULINE, JigsawGeneratorCore.BorderType.FEMININE]
-                    )
-                    self.matrix[i, j + 1].up = self.inverse_border_type(self.matrix[i, j].down)
-
-                if self.matrix[i, j].left == JigsawGeneratorCore.BorderType.INVALID:
-                    self.matrix[i, j].left = random.choice(
-                        [JigsawGeneratorCore.BorderType.MASCULINE, JigsawGeneratorCore.BorderType.FEMININE]
-                    )
-                    self.matrix[i - 1, j].right = self.inverse_border_type(self.matrix[i, j].left)
-
-                if self.matrix[i, j].right == JigsawGeneratorCore.BorderType.INVALID:
-                    self.matrix[i, j].right = random.choice(
-                        [JigsawGeneratorCore.BorderType.MASCULINE, JigsawGeneratorCore.BorderType.FEMININE]
-                    )
-                    self.matrix[i + 1, j].left = self.inverse_border_type(self.matrix[i, j].right)
+        BorderType = JigsawGeneratorCore.BorderType
+        horizontal, vertical = self.edge_polarities()
+
+        for (i, j), value in numpy.ndenumerate(horizontal):
+            self.matrix[i, j].down = BorderType(int(value))
+            self.matrix[i, j + 1].up = self.inverse_border_type(self.matrix[i, j].down)
+
+        for (i, j), value in numpy.ndenumerate(vertical):
+            self.matrix[i, j].right = BorderType(int(value))
+            self.matrix[i + 1, j].left = self.inverse_border_type(self.matrix[i, j].right)
+
+    def snapshot(self):
+        """
+        Return a copy of this jigsaw that can be used to compute borders on another thread.
+
+        The copy has its own `revisions`, but shares `matrix`, which must not be
+         modified through it.
+
+        Parameters
+        ----------
+        self: JigsawGeneratorCore
+            Instance of this class.
+        """
+        snapshot = copy.copy(self)
+        snapshot.revisions = dict(self.revisions)
+        return snapshot
 
     def get_cell(self, cell_coordinates):
         """
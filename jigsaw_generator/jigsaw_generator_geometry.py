@@ -0,0 +1,607 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module jigsaw_generator_geometry.
+
+Contains the geometry of the borders of the jigsaw, independent of Qt.
+
+The design of each masculine border is computed from its `EdgeRandom` and stored
+ on a `TabPaths`, a columnar structure that keeps the path of every border as a
+ chain of segments. It is the description shared by the painters, the exporters
+ and the analysis tools.
+"""
+import numpy
+
+from counter_random import counter_uniform_array
+from jigsaw_generator_core import JigsawGeneratorCore
+from patterns import CUBIC, LINE, QUAD, get_pattern
+
+# Maximum number of lines used to flatten one curve
+MAX_CURVE_STEPS = 256
+
+# Offset of the first point, in cells, the direction along the border and the
+#  direction to the outside of the cell, of each `JigsawGeneratorCore.WhichBorder`
+FRAME_ORIGIN = numpy.array([(0, 1), (0, 0), (0, 0), (1, 0)], dtype=numpy.int64)
+FRAME_ALONG = numpy.array([(1., 0.), (1., 0.), (0., 1.), (0., 1.)])
+FRAME_NORMAL = numpy.array([(0., 1.), (0., -1.), (-1., 0.), (1., 0.)])
+
+
+def masculine_cells(core, edges):
+    """
+    Return the masculine cell `(N, 2)` and its `WhichBorder` value `(N,)` of each border.
+
+    Parameters
+    ----------
+    core: JigsawGeneratorCore
+
+    edges: numpy.ndarray
+        Indices of the borders, see `JigsawGeneratorCore.edge_index`.
+    """
+    WhichBorder = JigsawGeneratorCore.WhichBorder
+    MASCULINE = JigsawGeneratorCore.BorderType.MASCULINE.value
+
+    x, y = core.shape
+    horizontal_count = core.horizontal_edge_count()
+    masculine = core.polarities(edges) == MASCULINE
+
+    # The border DOWN of (i, j) is the border UP of (i, j + 1) and the border
+    #  RIGHT of (i, j) is the border LEFT of (i + 1, j)
+    is_horizontal = edges < horizontal_count
+    index = numpy.where(is_horizontal, edges, edges - horizontal_count)
+    columns = numpy.where(is_horizontal, max(y - 1, 1), y)
+    cell = numpy.stack([index//columns, index % columns], axis=1)
+    cell += numpy.stack([~is_horizontal & ~masculine, is_horizontal & ~masculine], axis=1)
+
+    where = numpy.where(
+        is_horizontal,
+        numpy.where(masculine, WhichBorder.DOWN.value, WhichBorder.UP.value),
+        numpy.where(masculine, WhichBorder.RIGHT.value, WhichBorder.LEFT.value)
+    ).astype(numpy.int8)
+    return cell, where
+
+
+def edge_frames(cell, where, cell_width, cell_height):
+    """
+    Return the frames `(origin, along, normal, length, depth)` of a batch of borders.
+
+    `origin` is the first point of each border, `along` the unit vector that goes
+     from the first to the last point, `normal` the unit vector that points to the
+     outside of the cell, `length` the length of the border and `depth` the size
+     of the cell on the direction of `normal`. The point `(u, v)` of the frame is
+     `origin + u*along + v*normal`.
+
+    Parameters
+    ----------
+    cell: numpy.ndarray
+        Array of shape `(N, 2)` with the coordinates of the cells.
+
+    where: numpy.ndarray
+        Value of the `JigsawGeneratorCore.WhichBorder` of each border.
+
+    cell_width: float
+        Indicates the width of each cell.
+
+    cell_height: float
+        Indicates the height of each cell.
+    """
+    where = numpy.asarray(where, dtype=numpy.int64)
+    corner = cell + FRAME_ORIGIN[where]
+    origin = numpy.stack([corner[:, 0]*cell_width, corner[:, 1]*cell_height], axis=1)
+    vertical = FRAME_ALONG[where, 1] == 1.
+    length = numpy.where(vertical, cell_height, cell_width).astype(numpy.float64)
+    depth = numpy.where(vertical, cell_width, cell_height).astype(numpy.float64)
+    return origin, FRAME_ALONG[where], FRAME_NORMAL[where], length, depth
+
+
+def edge_uniforms(core, edges, revisions, draws):
+    """
+    Return the array `(N, draws)` of the random values used by the patterns.
+
+    They are the values of `core.edge_random(edge)` that follow the choice of the
+     pattern, so a border has the same design computed alone or on a batch.
+
+    Parameters
+    ----------
+    core: JigsawGeneratorCore
+    edges: numpy.ndarray
+    revisions: numpy.ndarray
+    draws: int
+    """
+    return counter_uniform_array(core.seed, edges[:, None], revisions[:, None],
+                                 numpy.arange(2, 2 + draws)[None, :])
+
+
+class TabPaths:
+    """
+    Columnar description of the paths of a set of masculine borders.
+
+    Each border `k` starts on `start[k]` and is made by the segments
+     `offsets[k]` to `offsets[k + 1]`. Every segment is stored as the control points
+     of the equivalent cubic Bézier curve (lines and quadratic curves are exactly
+     represented this way), while `kind` keeps the original type of the segment.
+
+    Attributes
+    ----------
+    edge: numpy.ndarray
+        Index of the border of each path, see `JigsawGeneratorCore.edge_index`.
+
+    cell: numpy.ndarray
+        Array of shape `(N, 2)` with the masculine cell of each path.
+
+    where: numpy.ndarray
+        Value of the `JigsawGeneratorCore.WhichBorder` of each path.
+
+    pattern: numpy.ndarray
+        Index on `patterns` of the pattern of each path.
+
+    patterns: List[str]
+        Names of the patterns.
+
+    start: numpy.ndarray
+        Array of shape `(N, 2)` with the first point of each path.
+
+    kind: numpy.ndarray
+        Type (`LINE`, `QUAD` or `CUBIC`) of each segment.
+
+    control: numpy.ndarray
+        Array of shape `(S, 3, 2)` with the cubic control points of each segment,
+         the last of them is the end point of the segment.
+
+    offsets: numpy.ndarray
+        Array of shape `(N + 1,)` with the first segment of each path.
+    """
+
+    def __init__(self, edge, cell, where, pattern, patterns, start, kind, control, offsets):
+        self.edge = edge
+        self.cell = cell
+        self.where = where
+        self.pattern = pattern
+        self.patterns = patterns
+        self.start = start
+        self.kind = kind
+        self.control = control
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.edge)
+
+    @staticmethod
+    def empty(patterns=()):
+        """
+        Return a `TabPaths` without any path.
+
+        Parameters
+        ----------
+        patterns: List[str]
+        """
+        return TabPaths(
+            numpy.zeros(0, dtype=numpy.int64), numpy.zeros((0, 2), dtype=numpy.int64),
+            numpy.zeros(0, dtype=numpy.int8), numpy.zeros(0, dtype=numpy.int16),
+            list(patterns), numpy.zeros((0, 2)), numpy.zeros(0, dtype=numpy.int8),
+            numpy.zeros((0, 3, 2)), numpy.zeros(1, dtype=numpy.int64)
+        )
+
+    def segment_count(self):
+        """
+        Return the number of segments of each path.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        """
+        return numpy.diff(self.offsets)
+
+    def segment_owner(self):
+        """
+        Return the index of the path of each segment.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        """
+        return numpy.repeat(numpy.arange(len(self)), self.segment_count())
+
+    def segment_starts(self):
+        """
+        Return an array of shape `(S, 2)` with the first point of each segment.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        """
+        starts = numpy.empty((len(self.kind), 2))
+        if len(self.kind) == 0:
+            return starts
+        starts[1:] = self.control[:-1, 2]
+        first = self.offsets[:-1][self.segment_count() > 0]
+        starts[first] = self.start[self.segment_count() > 0]
+        return starts
+
+    def end(self):
+        """
+        Return an array of shape `(N, 2)` with the last point of each path.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        """
+        end = self.start.copy()
+        has_segments = self.segment_count() > 0
+        end[has_segments] = self.control[self.offsets[1:][has_segments] - 1, 2]
+        return end
+
+    def commands(self, index):
+        """
+        Return the segments of the path `index` on their original form.
+
+        Each element is a tuple `(kind, points)`: `(LINE, [end])`,
+         `(QUAD, [control, end])` or `(CUBIC, [control1, control2, end])`.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        index: int
+            Index of the path.
+        """
+        commands = list()
+        previous = self.start[index]
+        for s in range(self.offsets[index], self.offsets[index + 1]):
+            c1, c2, end = self.control[s]
+            if self.kind[s] == LINE:
+                commands.append((LINE, [end]))
+            elif self.kind[s] == QUAD:
+                commands.append((QUAD, [(3.0*c1 - previous)/2.0, end]))
+            else:
+                commands.append((CUBIC, [c1, c2, end]))
+            previous = end
+        return commands
+
+    def select(self, indices):
+        """
+        Return a new `TabPaths` with only the given paths.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        indices: numpy.ndarray
+            Indices or boolean mask of the paths kept.
+        """
+        indices = numpy.arange(len(self))[indices]
+        counts = self.segment_count()[indices]
+        segments = numpy.repeat(self.offsets[indices], counts)
+        segments += numpy.arange(len(segments)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        return TabPaths(
+            self.edge[indices], self.cell[indices], self.where[indices],
+            self.pattern[indices], self.patterns, self.start[indices],
+            self.kind[segments], self.control[segments],
+            numpy.concatenate([[0], numpy.cumsum(counts)]).astype(numpy.int64)
+        )
+
+    @staticmethod
+    def concatenate(tab_paths):
+        """
+        Return a new `TabPaths` with all the paths of the given ones.
+
+        Parameters
+        ----------
+        tab_paths: List[TabPaths]
+        """
+        patterns = list()
+        for paths in tab_paths:
+            for name in paths.patterns:
+                if name not in patterns:
+                    patterns.append(name)
+
+        if not tab_paths:
+            return TabPaths.empty()
+
+        pattern = [numpy.array([patterns.index(name) for name in paths.patterns],
+                               dtype=numpy.int16)[paths.pattern] for paths in tab_paths]
+        counts = numpy.concatenate([paths.segment_count() for paths in tab_paths])
+        return TabPaths(
+            numpy.concatenate([paths.edge for paths in tab_paths]),
+            numpy.concatenate([paths.cell for paths in tab_paths]),
+            numpy.concatenate([paths.where for paths in tab_paths]),
+            numpy.concatenate(pattern), patterns,
+            numpy.concatenate([paths.start for paths in tab_paths]),
+            numpy.concatenate([paths.kind for paths in tab_paths]),
+            numpy.concatenate([paths.control for paths in tab_paths]),
+            numpy.concatenate([[0], numpy.cumsum(counts)]).astype(numpy.int64)
+        )
+
+    def replaced(self, positions, tab_paths):
+        """
+        Return a new `TabPaths` where the paths at the given positions are the ones of `tab_paths`.
+
+        The other paths keep their positions.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        positions: numpy.ndarray
+            Indices of the paths replaced.
+        tab_paths: TabPaths
+            The new paths, one for each position.
+        """
+        order = numpy.arange(len(self))
+        order[positions] = len(self) + numpy.arange(len(positions))
+        return TabPaths.concatenate([self, tab_paths]).select(order)
+
+    def transformed(self, matrix, offset):
+        """
+        Return a new `TabPaths` with every point `p` moved to `matrix @ p + offset`.
+
+        Bézier curves are invariant under affine maps, so only the points change.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        matrix: numpy.ndarray
+            Array of shape `(2, 2)`.
+        offset: Tuple[float, float]
+        """
+        matrix = numpy.asarray(matrix, dtype=float).T
+        offset = numpy.asarray(offset, dtype=float)
+        return TabPaths(
+            self.edge, self.cell, self.where, self.pattern, self.patterns,
+            self.start @ matrix + offset, self.kind, self.control @ matrix + offset, self.offsets
+        )
+
+    def bounding_boxes(self):
+        """
+        Return an array of shape `(N, 4)` with `[x0, y0, x1, y1]` of each path.
+
+        The box contains all the control points, so it contains the whole path.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        """
+        boxes = numpy.concatenate([self.start, self.start], axis=1)
+        if len(self.kind) == 0:
+            return boxes
+        owner = self.segment_owner()
+        points = self.control.reshape((-1, 2))
+        owner = numpy.repeat(owner, 3)
+        numpy.minimum.at(boxes[:, 0], owner, points[:, 0])
+        numpy.minimum.at(boxes[:, 1], owner, points[:, 1])
+        numpy.maximum.at(boxes[:, 2], owner, points[:, 0])
+        numpy.maximum.at(boxes[:, 3], owner, points[:, 1])
+        return boxes
+
+    def curve_steps(self, tolerance=.25, scale=1.0):
+        """
+        Return the number of lines needed to approximate each segment.
+
+        A cubic curve approximated by `n` lines deviates at most
+         `3*m/(4*n**2)` from the curve, where `m` is the largest second difference
+         of its control points, so `n` is the smallest value that keeps that error
+         below `tolerance`. Lines always need one step.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        tolerance: float
+            Maximum distance between the curves and the lines, in output pixels.
+        scale: float
+            Output pixels per unit of the coordinates of the paths.
+        """
+        p0 = self.segment_starts()
+        c1, c2, p3 = self.control[:, 0], self.control[:, 1], self.control[:, 2]
+        m = numpy.maximum(numpy.hypot(*(p0 - 2.0*c1 + c2).T), numpy.hypot(*(c1 - 2.0*c2 + p3).T))
+        steps = numpy.ceil(numpy.sqrt(3.0*m*scale/(4.0*tolerance)))
+        steps = numpy.clip(steps, 1, MAX_CURVE_STEPS).astype(numpy.int64)
+        steps[self.kind == LINE] = 1
+        return steps
+
+    def flatten(self, tolerance=.25, scale=1.0):
+        """
+        Return the paths as polylines `(vertices, offsets)`.
+
+        The vertices of the path `k` are `vertices[offsets[k]:offsets[k + 1]]`.
+         Lines are kept as they are, while each curve is approximated by as few
+         lines as needed to stay within `tolerance` (see `curve_steps`). Coarse
+         previews therefore get few points and large renders enough for smooth
+         curves.
+
+        Parameters
+        ----------
+        self: TabPaths
+            Instance of this class.
+        tolerance: float
+            Maximum distance between the curves and the lines, in output pixels.
+        scale: float
+            Output pixels per unit of the coordinates of the paths.
+        """
+        return self._flatten(self.curve_steps(tolerance, scale))
+
+    def _flatten(self, steps):
+        total = int(steps.sum())
+        segment = numpy.repeat(numpy.arange(len(steps)), steps)
+        t = (numpy.arange(total) - numpy.repeat(numpy.cumsum(steps) - steps, steps) + 1)
+        t = (t/numpy.repeat(steps, steps))[:, None]
+
+        p0 = self.segment_starts()[segment]
+        c1, c2, p3 = self.control[segment, 0], self.control[segment, 1], self.control[segment, 2]
+        u = 1.0 - t
+        points = u*u*u*p0 + 3.0*u*u*t*c1 + 3.0*u*t*t*c2 + t*t*t*p3
+
+        owner = self.segment_owner()[segment]
+        counts = numpy.bincount(owner, minlength=len(self)) + 1
+        offsets = numpy.concatenate([[0], numpy.cumsum(counts)]).astype(numpy.int64)
+
+        vertices = numpy.empty((offsets[-1], 2))
+        vertices[offsets[:-1]] = self.start
+        vertices[numpy.arange(total) + owner + 1] = points
+        return vertices, offsets
+
+
+def design_tab_paths(pattern, uniforms, edges, cell, where, cell_width, cell_height,
+                     smooth_factor, patterns=None):
+    """
+    Return the `TabPaths` of a batch of borders designed by the same pattern.
+
+    Parameters
+    ----------
+    pattern: Pattern
+
+    uniforms: numpy.ndarray
+        Array of shape `(N, pattern.draws)` with the random values of each border.
+
+    edges: numpy.ndarray
+        Indices of the borders.
+
+    cell: numpy.ndarray
+        Array of shape `(N, 2)` with the masculine cell of each border.
+
+    where: numpy.ndarray
+        Value of the `JigsawGeneratorCore.WhichBorder` of each border.
+
+    cell_width: float
+
+    cell_height: float
+
+    smooth_factor: float
+
+    patterns: List[str]
+        Names of the patterns of the result, `[pattern.name]` if `None`.
+    """
+    patterns = list(patterns or [pattern.name])
+    origin, along, normal, length, depth = edge_frames(cell, where, cell_width, cell_height)
+    pattern_id = patterns.index(pattern.name)
+
+    groups, positions = list(), list()
+    for rows, kinds, controls in pattern.generate(uniforms, length, depth, smooth_factor):
+        controls = (origin[rows, None, None, :]
+                    + controls[..., :1]*along[rows, None, None, :]
+                    + controls[..., 1:]*normal[rows, None, None, :])
+        groups.append(TabPaths(
+            edges[rows], cell[rows], where[rows], numpy.full(len(rows), pattern_id, dtype=numpy.int16),
+            patterns, origin[rows], numpy.tile(kinds, len(rows)), controls.reshape((-1, 3, 2)),
+            numpy.arange(len(rows) + 1, dtype=numpy.int64)*len(kinds)
+        ))
+        positions.append(rows)
+
+    order = numpy.argsort(numpy.concatenate(positions), kind="stable")
+    return TabPaths.concatenate(groups).select(order)
+
+
+def border_tab_paths(cell_coordinates, where, cell_width, cell_height, patterns, smooth_factor, rng):
+    """
+    Return the `TabPaths` of one masculine border, designed with the values of `rng`.
+
+    The pattern is `rng.choice(patterns)`, followed by the values of the pattern,
+     as `generate_tab_paths` does with `core.edge_random`. The index of the
+     border on the result is -1.
+
+    Parameters
+    ----------
+    cell_coordinates: List[int]
+        Coordinates [x, y] of the cell.
+
+    where: JigsawGeneratorCore.WhichBorder
+        Indicates which border of the cell.
+
+    cell_width: float
+
+    cell_height: float
+
+    patterns: List[str or Pattern]
+
+    smooth_factor: float
+
+    rng: EdgeRandom
+        Source of the random values, `random` and `choice` are used.
+    """
+    patterns = [get_pattern(pattern) for pattern in patterns]
+    pattern = rng.choice(patterns)
+    uniforms = numpy.array([[rng.random() for _ in range(pattern.draws)]])
+    return design_tab_paths(
+        pattern, uniforms, numpy.full(1, -1, dtype=numpy.int64),
+        numpy.array([cell_coordinates], dtype=numpy.int64),
+        numpy.array([where.value], dtype=numpy.int8), cell_width, cell_height, smooth_factor,
+        [p.name for p in patterns]
+    )
+
+
+def generate_tab_paths(core, cell_width, cell_height, patterns, smooth_factor, edges=None):
+    """
+    Compute the paths of the masculine borders of the jigsaw.
+
+    Each border is designed from `core.edge_random`, so the result does not depend
+     on which or on how many borders are computed at once. The borders are grouped
+     by pattern and each group is designed by a single call of `Pattern.generate`.
+
+    Parameters
+    ----------
+    core: JigsawGeneratorCore
+        The jigsaw.
+
+    cell_width: float
+        Indicates the width of each cell.
+
+    cell_height: float
+        Indicates the height of each cell.
+
+    patterns: List[str or Pattern]
+        The patterns considered to paint the borders, see `patterns.get_pattern`.
+
+    smooth_factor: float
+
+    edges: numpy.ndarray
+        Indices of the borders computed, all the inner borders if `None`.
+    """
+    patterns = [get_pattern(pattern) for pattern in patterns]
+    names = [pattern.name for pattern in patterns]
+
+    if edges is None:
+        edges = numpy.arange(core.edge_count(), dtype=numpy.int64)
+    edges = numpy.asarray(edges, dtype=numpy.int64)
+    if len(edges) == 0:
+        return TabPaths.empty(names)
+
+    cell, where = masculine_cells(core, edges)
+    revisions = core.edge_revisions(edges)
+
+    # Same choice of `EdgeRandom.choice`, with the first draw of each border
+    choice = (counter_uniform_array(core.seed, edges, revisions, 1)*len(patterns)).astype(numpy.int64)
+    choice = numpy.minimum(choice, len(patterns) - 1)
+
+    groups, positions = list(), list()
+    for index, pattern in enumerate(patterns):
+        batch = numpy.flatnonzero(choice == index)
+        if len(batch) == 0:
+            continue
+        uniforms = edge_uniforms(core, edges[batch], revisions[batch], pattern.draws)
+        groups.append(design_tab_paths(pattern, uniforms, edges[batch], cell[batch], where[batch],
+                                       cell_width, cell_height, smooth_factor, names))
+        positions.append(batch)
+
+    order = numpy.argsort(numpy.concatenate(positions), kind="stable")
+    return TabPaths.concatenate(groups).select(order)
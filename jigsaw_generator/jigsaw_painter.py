@@ -0,0 +1,190 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Auxiliar module that draws the paths of a `TabPaths` with `QPainter`.
+"""
+from jigsaw_generator_info import Core, Gui
+
+from jigsaw_generator_geometry import LINE, QUAD
+import numpy_raster
+from qimage_array import array_to_qimage, qimage_to_array
+from render_profile import FINAL
+
+Qt, QPointF = Core.Qt, Core.QPointF
+QImage, QPainter, QPainterPath, QPen, QPolygonF = (
+    Gui.QImage, Gui.QPainter, Gui.QPainterPath, Gui.QPen, Gui.QPolygonF
+)
+
+
+def tab_painter_path(tab_paths, index):
+    """
+    Return the `QPainterPath` of the path `index` of `tab_paths`.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+        Paths of the masculine borders.
+
+    index: int
+        Index of the path.
+    """
+    x, y = tab_paths.start[index].tolist()
+    path = QPainterPath(QPointF(x, y))
+
+    for kind, points in tab_paths.commands(index):
+        points = [QPointF(*point.tolist()) for point in points]
+        if kind == LINE:
+            path.lineTo(*points)
+        elif kind == QUAD:
+            path.quadTo(*points)
+        else:
+            path.cubicTo(*points)
+
+    return path
+
+
+def draw_tab_paths(tab_paths, painter, tolerance=None, scale=1.0):
+    """
+    Draw all the paths of `tab_paths` using the given painter.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+        Paths of the masculine borders.
+
+    painter: QPainter
+        Element of the QPainter class used to paint the borders.
+
+    tolerance: float
+        If given, the curves are flattened into lines with this maximum error
+         (see `TabPaths.flatten`) instead of drawn as curves.
+
+    scale: float
+        Scale of the painter, the tolerance is in pixels of the device.
+    """
+    if tolerance is None:
+        for index in range(len(tab_paths)):
+            painter.drawPath(tab_painter_path(tab_paths, index))
+        return painter
+
+    vertices, offsets = tab_paths.flatten(tolerance, scale)
+    points = [QPointF(x, y) for x, y in vertices.tolist()]
+    for first, last in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        painter.drawPolyline(QPolygonF(points[first:last]))
+    return painter
+
+
+def render_jigsaw(base_image, tab_paths, pen_color, backend="Qt", profile=FINAL, size=None):
+    """
+    Return a new `QImage` with the frame and the borders drawn over `base_image`.
+
+    `base_image` is only read, so the same image can be shared by many threads.
+     The result has the size of the jigsaw times `profile.scale`.
+
+    Parameters
+    ----------
+    base_image: QImage
+
+    tab_paths: TabPaths
+        Paths of the masculine borders, on the coordinates of `base_image`.
+
+    pen_color: QColor
+
+    backend: str
+        "Qt" draws with `QPainter`, "NumPy" with the module `numpy_raster`.
+
+    profile: RenderProfile
+
+    size: Tuple[int, int]
+        Size of the jigsaw, the one of `base_image` if `None`. A base image of
+         another resolution, e.g. a SVG rendered at the resolution of the
+         output, is only scaled when it does not match.
+    """
+    scale = profile.scale
+    width, height = size or (base_image.width(), base_image.height())
+    width, height = max(int(round(width*scale)), 1), max(int(round(height*scale)), 1)
+    if (base_image.width(), base_image.height()) != (width, height):
+        base_image = base_image.scaled(
+            width, height, Qt.IgnoreAspectRatio,
+            Qt.SmoothTransformation if profile.smooth_transform else Qt.FastTransformation
+        )
+
+    if backend == "NumPy":
+        image = qimage_to_array(base_image)
+        numpy_raster.draw_jigsaw(image, tab_paths, pen_color.getRgb(),
+                                 antialias=profile.antialias, tolerance=profile.tolerance, scale=scale)
+        return array_to_qimage(image)
+
+    return paint_jigsaw(base_image.convertToFormat(QImage.Format_ARGB32_Premultiplied),
+                        tab_paths, pen_color, profile)
+
+
+def jigsaw_overlay(width, height, tab_paths, pen_color, profile=FINAL):
+    """
+    Return a transparent `QImage` with only the frame and the borders of the jigsaw.
+
+    Drawn once, the overlay is composed over any number of images of the size
+     `width`x`height` with `QPainter.drawImage`, without drawing the paths again.
+     Its size is the given size times `profile.scale`.
+
+    Parameters
+    ----------
+    width: int
+    height: int
+    tab_paths: TabPaths
+        Paths of the masculine borders, on the coordinates of the images.
+    pen_color: QColor
+    profile: RenderProfile
+    """
+    image = QImage(max(int(round(width*profile.scale)), 1), max(int(round(height*profile.scale)), 1),
+                   QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    return paint_jigsaw(image, tab_paths, pen_color, profile)
+
+
+def paint_jigsaw(image, tab_paths, pen_color, profile=FINAL):
+    """
+    Draw the frame and the borders over `image`, with `QPainter`, and return it.
+
+    Parameters
+    ----------
+    image: QImage
+        Image already scaled by `profile.scale`, changed in place.
+    tab_paths: TabPaths
+    pen_color: QColor
+    profile: RenderProfile
+    """
+    scale = profile.scale
+    width, height = image.width() - 1, image.height() - 1
+    pen = QPen(pen_color)
+    pen.setCosmetic(True)
+    painter = QPainter(image)
+    painter.setPen(pen)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform, profile.smooth_transform)
+    painter.setRenderHint(QPainter.Antialiasing, profile.antialias)
+
+    painter.drawLine(0, 0, 0, height)
+    painter.drawLine(0, 0, width, 0)
+    painter.drawLine(0, height, width, height)
+    painter.drawLine(width, 0, width, height)
+    painter.scale(scale, scale)
+    draw_tab_paths(tab_paths, painter, None if profile.native_curves else profile.tolerance, scale)
+
+    painter.end()
+    return image
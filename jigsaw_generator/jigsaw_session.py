@@ -0,0 +1,466 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module jigsaw_session.
+
+Library API of the generator, for programs that do not use the window.
+
+A `JigsawSession` holds an image and the last jigsaw generated over it. Every
+ stage has a blocking method (`generate`, `render_raster`, `save_raster`,
+ `export_svg`, `export_dxf`, `stats`) and a coroutine with the same name prefixed by "a"
+ (`agenerate`, ...), that runs the stage on the executor of the session, so the
+ asyncio event loop is never blocked, and accepts a `timeout`. A coroutine that
+ is cancelled, or times out, stops its stage at the next check between steps and
+ leaves the session as it was.
+
+Example:
+```
+cd jigsaw_generator
+python jigsaw_session.py image.jpg output.png output.svg --grid 40x30 --seed 7 --timeout 10
+python jigsaw_session.py image.jpg --grid 40x30 --seed 7 --stats json
+```
+"""
+import argparse
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jigsaw_generator_info import Gui
+
+from cut_stats import cut_stats, print_stats
+from image_loader import image_size, read_image
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+from jigsaw_painter import render_jigsaw
+from output_writer import write_dxf, write_image, write_svg
+from render_profile import get_profile
+from tab_validator import validate_and_reroll
+
+QColor = Gui.QColor
+
+DEFAULT_PATTERNS = ("Square Rounded", "Triangle Rounded")
+
+
+class Cancelled(Exception):
+    """
+    Raised inside a stage when the coroutine that started it was cancelled.
+    """
+
+
+def check(cancel):
+    """
+    Raise `Cancelled` if the event `cancel` is set.
+
+    Parameters
+    ----------
+    cancel: threading.Event
+        May be `None`, for the blocking methods.
+    """
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
+
+class JigsawSession:
+    """
+    An image and the jigsaw generated over it.
+
+    The blocking methods and the coroutines can be mixed, but a session keeps
+     one jigsaw: use one session for each jigsaw generated at the same time.
+
+    Attributes
+    ----------
+    image_path: str
+        Path of the base image, `None` for sessions that only export vectors.
+
+    width: int
+
+    height: int
+        Size of the jigsaw, the size of the image by default.
+
+    core: JigsawGeneratorCore
+        The last jigsaw generated, `None` before `generate`.
+
+    tab_paths: TabPaths
+        Paths of the masculine borders of `core`.
+
+    executor: concurrent.futures.Executor
+        Runs the stages of the coroutines.
+    """
+
+    def __init__(self, image_path=None, size=None, executor=None):
+        if size is None:
+            if image_path is None:
+                raise ValueError("Either an image or a size is needed")
+            size = image_size(image_path)
+            if not size.isValid() or size.isEmpty():
+                raise IOError("It was not possible to load the file {}".format(image_path))
+            size = (size.width(), size.height())
+
+        self.image_path = image_path
+        self.width, self.height = int(size[0]), int(size[1])
+        self.core = None
+        self.tab_paths = None
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(thread_name_prefix="JigsawSession")
+        self._base_image = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        """
+        Release the executor, if it was created by the session.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        """
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exception):
+        self.close()
+
+    def _require_jigsaw(self):
+        if self.tab_paths is None:
+            raise RuntimeError("No jigsaw was generated on this session")
+        return self.tab_paths
+
+    def _base(self, cancel=None):
+        with self._lock:
+            if self._base_image is None:
+                if self.image_path is None:
+                    raise RuntimeError("The session has no image to render")
+                check(cancel)
+                self._base_image = read_image(self.image_path)
+                if self._base_image.isNull():
+                    raise IOError("It was not possible to load the file {}".format(self.image_path))
+            return self._base_image
+
+    def _generate(self, grid, seed, patterns, smooth_factor, validate, cancel=None):
+        check(cancel)
+        core = JigsawGeneratorCore(list(grid))
+        core.generate_random(seed)
+        check(cancel)
+        cell_width, cell_height = float(self.width)/grid[0], float(self.height)/grid[1]
+        if validate:
+            tab_paths, _ = validate_and_reroll(core, cell_width, cell_height, list(patterns), smooth_factor)
+        else:
+            tab_paths = generate_tab_paths(core, cell_width, cell_height, list(patterns), smooth_factor)
+        check(cancel)
+        return core, tab_paths
+
+    def _render(self, tab_paths, pen_color, backend, profile, cancel=None):
+        base = self._base(cancel)
+        check(cancel)
+        if base.width() != self.width or base.height() != self.height:
+            base = base.scaled(self.width, self.height)
+        return render_jigsaw(base, tab_paths, QColor(pen_color), backend, get_profile(profile))
+
+    def _save(self, path, tab_paths, pen_color, backend, profile, options, cancel=None):
+        image = self._render(tab_paths, pen_color, backend, profile, cancel)
+        check(cancel)
+        write_image(image, path, options)
+        return path
+
+    def _export(self, writer, path, tab_paths, *arguments, cancel=None):
+        check(cancel)
+        writer(path, self.width, self.height, tab_paths, *arguments)
+        return path
+
+    def _stats(self, tab_paths, radius, cancel=None):
+        check(cancel)
+        return cut_stats(tab_paths, self.core.shape, self.width, self.height, radius)
+
+    def generate(self, grid, seed=None, patterns=DEFAULT_PATTERNS, smooth_factor=.1, validate=True):
+        """
+        Generate a new jigsaw and return its `TabPaths`.
+
+        As on the window, the borders that overlap each other are re-rolled, see
+         `tab_validator.validate_and_reroll`.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        grid: Tuple[int, int]
+            Number of columns and rows.
+        seed: int
+            The same seed always gives the same jigsaw, a random one if `None`.
+        patterns: List[str]
+            Names of the patterns of the borders, see `patterns.PATTERNS`.
+        smooth_factor: float
+        validate: bool
+            Whether the borders that overlap are re-rolled.
+        """
+        self.core, self.tab_paths = self._generate(grid, seed, patterns, smooth_factor, validate)
+        return self.tab_paths
+
+    def render_raster(self, pen_color="white", backend="Qt", profile="Final"):
+        """
+        Return a `QImage` with the jigsaw drawn over the image.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        pen_color: str
+            Name of the color, see `QColor`.
+        backend: str
+            "Qt" or "NumPy".
+        profile: str
+            Name of the `RenderProfile`.
+        """
+        return self._render(self._require_jigsaw(), pen_color, backend, profile)
+
+    def save_raster(self, path, pen_color="white", backend="Qt", profile="Final", options=None):
+        """
+        Render the jigsaw over the image and save it, with the format given by the extension.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        path: str
+        pen_color: str
+        backend: str
+        profile: str
+        options: OutputOptions
+        """
+        return self._save(path, self._require_jigsaw(), pen_color, backend, profile, options)
+
+    def export_svg(self, path, pen_color="black", profile="Final", workers=1):
+        """
+        Write the jigsaw on a SVG file.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        path: str
+        pen_color: str
+        profile: str
+        workers: int
+            Number of processes, see `vector_export.write_sharded`; by default
+             the file is written on the calling thread only.
+        """
+        return self._export(write_svg, path, self._require_jigsaw(), QColor(pen_color),
+                            get_profile(profile), workers)
+
+    def export_dxf(self, path, profile="Final", workers=1):
+        """
+        Write the jigsaw on a DXF file.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        path: str
+        profile: str
+        workers: int
+            See `export_svg`.
+        """
+        return self._export(write_dxf, path, self._require_jigsaw(), get_profile(profile), workers)
+
+    def stats(self, radius=False):
+        """
+        Return the `cut_stats.CutStats` of the jigsaw: cut length, area and perimeter of the pieces.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        radius: bool
+            Whether the smallest radius of the curves is measured too.
+        """
+        return self._stats(self._require_jigsaw(), radius)
+
+    async def _run(self, function, timeout, *arguments):
+        cancel = threading.Event()
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(function, *arguments, cancel=cancel)
+        )
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except BaseException:
+            # Cancelled or timed out: the stage stops at its next check
+            cancel.set()
+            raise
+
+    async def agenerate(self, grid, seed=None, patterns=DEFAULT_PATTERNS, smooth_factor=.1, validate=True,
+                        timeout=None):
+        """
+        Coroutine of `generate`.
+
+        Raises `asyncio.TimeoutError` after `timeout` seconds, without changing the session.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        grid: Tuple[int, int]
+        seed: int
+        patterns: List[str]
+        smooth_factor: float
+        validate: bool
+        timeout: float
+        """
+        self.core, self.tab_paths = await self._run(self._generate, timeout, grid, seed, patterns,
+                                                    smooth_factor, validate)
+        return self.tab_paths
+
+    async def arender_raster(self, pen_color="white", backend="Qt", profile="Final", timeout=None):
+        """
+        Coroutine of `render_raster`.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        pen_color: str
+        backend: str
+        profile: str
+        timeout: float
+        """
+        return await self._run(self._render, timeout, self._require_jigsaw(), pen_color, backend, profile)
+
+    async def asave_raster(self, path, pen_color="white", backend="Qt", profile="Final", options=None,
+                           timeout=None):
+        """
+        Coroutine of `save_raster`.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        path: str
+        pen_color: str
+        backend: str
+        profile: str
+        options: OutputOptions
+        timeout: float
+        """
+        return await self._run(self._save, timeout, path, self._require_jigsaw(), pen_color, backend,
+                               profile, options)
+
+    async def aexport_svg(self, path, pen_color="black", profile="Final", workers=1, timeout=None):
+        """
+        Coroutine of `export_svg`.
+
+        The file is written in one step, so a cancelled export finishes its file
+         on the executor.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        path: str
+        pen_color: str
+        profile: str
+        workers: int
+        timeout: float
+        """
+        return await self._run(self._export, timeout, write_svg, path, self._require_jigsaw(),
+                               QColor(pen_color), get_profile(profile), workers)
+
+    async def aexport_dxf(self, path, profile="Final", workers=1, timeout=None):
+        """
+        Coroutine of `export_dxf`, see `aexport_svg`.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        path: str
+        profile: str
+        workers: int
+        timeout: float
+        """
+        return await self._run(self._export, timeout, write_dxf, path, self._require_jigsaw(),
+                               get_profile(profile), workers)
+
+    async def astats(self, radius=False, timeout=None):
+        """
+        Coroutine of `stats`.
+
+        Parameters
+        ----------
+        self: JigsawSession
+            Instance of this class.
+        radius: bool
+        timeout: float
+        """
+        return await self._run(self._stats, timeout, self._require_jigsaw(), radius)
+
+
+if __name__ == "__main__":
+    import os
+
+    from cli_utils import parse_size
+
+    parser = argparse.ArgumentParser(description="Generate a jigsaw with the asynchronous API.")
+    parser.add_argument("image", help="path of the base image")
+    parser.add_argument("outputs", nargs="*", help="paths of the outputs, e.g. out.png out.svg out.dxf")
+    parser.add_argument("--grid", type=parse_size, default=(10, 10), help="number of pieces, e.g. 40x30")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--patterns", default=",".join(DEFAULT_PATTERNS), help="comma separated list of patterns")
+    parser.add_argument("--color", default="white")
+    parser.add_argument("--profile", default="Final")
+    parser.add_argument("--no-validate", action="store_true", help="keep the borders that overlap")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds allowed to each stage")
+    parser.add_argument("--stats", choices=["text", "json"], default=None,
+                        help="print the cut length, areas and perimeters of the pieces")
+    parser.add_argument("--radius", action="store_true", help="also print the smallest radius of the curves")
+    arguments = parser.parse_args()
+
+    async def main():
+        async with JigsawSession(arguments.image) as session:
+            begin = time.perf_counter()
+            await session.agenerate(arguments.grid, arguments.seed, arguments.patterns.split(","),
+                                    validate=not arguments.no_validate, timeout=arguments.timeout)
+            stages = list()
+            for path in arguments.outputs:
+                extension = os.path.splitext(path)[1].lower()
+                if extension == ".svg":
+                    stages.append(session.aexport_svg(path, arguments.color, arguments.profile,
+                                                      timeout=arguments.timeout))
+                elif extension == ".dxf":
+                    stages.append(session.aexport_dxf(path, arguments.profile, timeout=arguments.timeout))
+                else:
+                    stages.append(session.asave_raster(path, arguments.color, profile=arguments.profile,
+                                                       timeout=arguments.timeout))
+            for path in await asyncio.gather(*stages):
+                print(path)
+            if arguments.stats:
+                print_stats(await session.astats(arguments.radius, timeout=arguments.timeout), arguments.stats)
+                if arguments.stats == "json":
+                    return
+            print("done in {:.3f} s".format(time.perf_counter() - begin))
+
+    asyncio.run(main())
@@ -0,0 +1,682 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module jigsaw_view.
+
+Contains the classes JigsawView and TiledImageItem, a zoomable view of the jigsaw
+ that only paints the tiles that are visible, at the resolution of the current zoom.
+ The tiles are decoded and rendered by `TileTask` on a `QThreadPool`; until a tile
+ is ready, a tile of a lower level, or the preview, is painted scaled in its place.
+"""
+import itertools
+import math
+
+import numpy
+from jigsaw_generator_info import Widgets, Core, Gui
+
+from grid_index import GridIndex
+from image_loader import read_image, supports_region
+from render_profile import FINAL
+from jigsaw_generator_geometry import TabPaths
+from tile_pyramid import TilePyramid, render_tile
+
+QGraphicsView, QGraphicsScene, QGraphicsItem, QGraphicsObject = (
+    Widgets.QGraphicsView, Widgets.QGraphicsScene, Widgets.QGraphicsItem, Widgets.QGraphicsObject
+)
+QGraphicsRectItem = Widgets.QGraphicsRectItem
+QStyleOptionGraphicsItem = Widgets.QStyleOptionGraphicsItem
+Qt, QRectF, QSize, Signal = Core.Qt, Core.QRectF, Core.QSize, Core.Signal
+QObject, QRunnable, QThreadPool = Core.QObject, Core.QRunnable, Core.QThreadPool
+QImage, QPixmap, QPixmapCache, QColor, QPainter, QPen = (
+    Gui.QImage, Gui.QPixmap, Gui.QPixmapCache, Gui.QColor, Gui.QPainter, Gui.QPen
+)
+
+# Size, in pixels of its level, of each tile painted by `TiledImageItem`
+TILE_SIZE = 256
+
+# Limit of the `QPixmapCache` used by the tiles, in kilobytes
+CACHE_LIMIT = 256*1024
+
+
+class TileSignals(QObject):
+    """
+    Signals emitted by `TileTask`.
+
+    `finished` carries the key of the task and the `QImage` of the tile, `None`
+     if the tile was no longer wanted.
+    """
+
+    finished = Signal(object, object)
+
+
+class TileTask(QRunnable):
+    """
+    Decode and render a tile of `TiledImageItem` on a `QThreadPool`.
+
+    The region of the tile is decoded from `image_path` when it is given, and
+     `base` is scaled otherwise, or if the decoding fails. The task renders
+     nothing when `is_current(key)` returns `False` before it starts.
+
+    Attributes
+    ----------
+    key: Tuple[int, int, int, int, int]
+        Generation and revision of the item, level, column and row of the tile.
+
+    is_current: Callable[[tuple], bool]
+
+    base: QImage
+
+    image_path: str
+
+    pyramid: TilePyramid
+
+    rect: Tuple[int, int, int, int]
+        Rectangle of the tile on its level, see `TilePyramid.tile_rect`.
+
+    tab_paths: TabPaths
+        Paths that cross the tile.
+
+    pen_color: QColor
+
+    backend: str
+
+    profile: RenderProfile
+
+    signals: TileSignals
+    """
+
+    def __init__(self, key, is_current, base, image_path, pyramid, rect, tab_paths, pen_color,
+                 backend, profile):
+        super(TileTask, self).__init__()
+        self.key = key
+        self.is_current = is_current
+        self.base = base
+        self.image_path = image_path
+        self.pyramid = pyramid
+        self.rect = rect
+        self.tab_paths = tab_paths
+        self.pen_color = QColor(pen_color)
+        self.backend = backend
+        self.profile = profile
+        self.signals = TileSignals()
+
+    def run(self):
+        if not self.is_current(self.key):
+            self.signals.finished.emit(self.key, None)
+            return
+
+        level = self.key[2]
+        image = None
+        if self.image_path is not None:
+            scale = self.pyramid.level_scale(level)
+            source = self.pyramid.source_rect(level, self.rect)
+            size = (max(int(round(source[2]*scale)), 1), max(int(round(source[3]*scale)), 1))
+            try:
+                image = render_tile(read_image(self.image_path, size, source), self.pyramid, level,
+                                    self.rect, self.tab_paths, self.pen_color, self.backend,
+                                    self.profile, source)
+            except IOError as error:
+                print(error)
+        if image is None:
+            image = render_tile(self.base, self.pyramid, level, self.rect, self.tab_paths,
+                                self.pen_color, self.backend, self.profile)
+        self.signals.finished.emit(self.key, image)
+
+
+class TiledImageItem(QGraphicsObject):
+    """
+    Item that paints an image with the jigsaw drawn over it, tile by tile.
+
+    The item has the size of the base image. When painted, it chooses the level of
+     a `TilePyramid` closest to the current zoom and paints the cached tiles of
+     that level that are exposed. The missing ones are rendered by a `TileTask`
+     on `pool`, and a lower level tile, or `base`, is painted scaled in their
+     place until `tile_ready` caches them and repaints their area.
+
+    `base` may be a preview of lower resolution of the image. The tiles of the levels
+     of higher resolution than it decode their region from `image_path`, when the
+     format of the image supports it.
+
+    Attributes
+    ----------
+    base: QImage
+        The base image, or a preview of it.
+
+    size: QSize
+        Size of the full resolution image.
+
+    image_path: str
+        Path of the full resolution image, `None` if `base` is the full image.
+
+    tab_paths: TabPaths
+        Paths of the borders, on the coordinates of `base`.
+
+    index: GridIndex
+        Spatial index of `tab_paths`, `None` after `update_region`.
+
+    piece_index: PieceIndex
+        Pieces of the jigsaw, used to find the paths of the tiles after `update_region`.
+
+    pen_color: QColor
+
+    backend: str
+        "Qt" or "NumPy".
+
+    profile: RenderProfile
+        Quality of the tiles, their resolution is `profile.scale` times the zoom.
+
+    pyramid: TilePyramid
+        Levels and tiles of `base`.
+
+    revision: int
+        Counter of the changes of `update_region`, the tiles rendered before the
+         last change are discarded.
+
+    tasks: Dict[tuple, TileTask]
+        Tasks started and not finished, by their key.
+
+    pool: QThreadPool
+        Renders the tiles, so the painting never waits for them.
+    """
+
+    _generations = itertools.count()
+
+    def __init__(self, parent=None):
+        super(TiledImageItem, self).__init__(parent)
+        self.base = QImage()
+        self.size = QSize(0, 0)
+        self.image_path = None
+        self.tab_paths = TabPaths.empty()
+        self.index = GridIndex(numpy.zeros((0, 4)), 1, 1)
+        self.piece_index = None
+        self.pen_color = QColor(Qt.white)
+        self.backend = "Qt"
+        self.profile = FINAL
+        self.pyramid = TilePyramid(1, 1, TILE_SIZE, 0, "dzi")
+        self.generation = next(TiledImageItem._generations)
+        self.revision = 0
+        self.tasks = dict()
+        self.pool = QThreadPool(self)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+
+    def set_image(self, image, size=None, image_path=None):
+        """
+        Set the base image and discard the cached tiles.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        image: QImage
+            The image, or a preview of it.
+        size: QSize
+            Size of the full resolution image, the size of `image` if `None`.
+        image_path: str
+            Path of the full resolution image, used when `image` is a preview.
+        """
+        self.prepareGeometryChange()
+        self.base = image
+        self.size = QSize(image.size() if size is None else size)
+        self.image_path = image_path if image_path and supports_region(image_path) else None
+        self.pyramid = TilePyramid(self.size.width(), self.size.height(), TILE_SIZE, 0, "dzi")
+        self.invalidate()
+
+    def set_overlay(self, tab_paths, pen_color, backend="Qt", profile=FINAL):
+        """
+        Set the jigsaw drawn over the image and discard the cached tiles.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        tab_paths: TabPaths
+        pen_color: QColor
+        backend: str
+        profile: RenderProfile
+        """
+        boxes = tab_paths.bounding_boxes()
+        bucket = numpy.maximum(boxes[:, 2:] - boxes[:, :2], 1.).mean(axis=0) if len(boxes) else (1, 1)
+        self.tab_paths = tab_paths
+        self.index = GridIndex(boxes, bucket[0], bucket[1])
+        self.pen_color = QColor(pen_color)
+        self.backend = backend
+        self.profile = profile
+        self.invalidate()
+
+    def update_region(self, tab_paths, boxes, piece_index):
+        """
+        Replace the paths of the jigsaw and discard only the cached tiles that cover the boxes.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        tab_paths: TabPaths
+            The new paths, only the ones inside `boxes` changed.
+        boxes: numpy.ndarray
+            Boxes `[x0, y0, x1, y1]` that changed.
+        piece_index: PieceIndex
+            Index of `tab_paths`, it replaces `index`.
+        """
+        self.tab_paths = tab_paths
+        self.index = None
+        self.piece_index = piece_index
+        self.revision += 1
+
+        for box in boxes:
+            for level in range(self.pyramid.max_level + 1):
+                scale = self.pyramid.level_scale(level)
+                columns, rows = self.pyramid.tile_count(level)
+                first_column = max(int(math.floor(box[0]*scale - 2))//TILE_SIZE, 0)
+                last_column = min(int(math.ceil(box[2]*scale + 2))//TILE_SIZE, columns - 1)
+                first_row = max(int(math.floor(box[1]*scale - 2))//TILE_SIZE, 0)
+                last_row = min(int(math.ceil(box[3]*scale + 2))//TILE_SIZE, rows - 1)
+                for column in range(first_column, last_column + 1):
+                    for row in range(first_row, last_row + 1):
+                        QPixmapCache.remove(self.tile_key(level, column, row))
+            self.update(QRectF(box[0] - 2, box[1] - 2, box[2] - box[0] + 4, box[3] - box[1] + 4))
+
+    def invalidate(self):
+        """
+        Discard the cached tiles and schedule a repaint.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        """
+        self.generation = next(TiledImageItem._generations)
+        self.update()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.size.width(), self.size.height())
+
+    def tile_key(self, level, column, row):
+        """
+        Return the key of a tile on the `QPixmapCache`.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        level: int
+        column: int
+        row: int
+        """
+        return "jigsaw_view:{}:{}:{}:{}".format(self.generation, level, column, row)
+
+    def is_current(self, key):
+        """
+        Return whether a tile of the given `TileTask` key is still wanted.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        key: tuple
+        """
+        return key[0] == self.generation and key[1] == self.revision
+
+    def tile_pixmap(self, level, column, row):
+        """
+        Return the cached `QPixmap` of a tile, or `None` after starting a `TileTask` to render it.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        level: int
+        column: int
+        row: int
+        """
+        pixmap = QPixmapCache.find(self.tile_key(level, column, row))
+        if pixmap is not None and not pixmap.isNull():
+            return pixmap
+
+        key = (self.generation, self.revision, level, column, row)
+        if key in self.tasks:
+            return None
+
+        rect = self.pyramid.tile_rect(level, column, row)
+        scale = self.pyramid.level_scale(level)
+        margin = 2.0/scale
+        region = (rect[0]/scale - margin, rect[1]/scale - margin,
+                  (rect[0] + rect[2])/scale + margin, (rect[1] + rect[3])/scale + margin)
+        if self.index is None:
+            tile_paths = self.tab_paths.select(self.piece_index.path_query(region))
+        else:
+            tile_paths = self.tab_paths.select(self.index.query(region))
+
+        decoded = self.image_path is not None and scale*self.size.width() > self.base.width()
+        task = TileTask(key, self.is_current, self.base, self.image_path if decoded else None,
+                        self.pyramid, rect, tile_paths, self.pen_color, self.backend, self.profile)
+        task.signals.finished.connect(self.tile_ready)
+        self.tasks[key] = task
+        self.pool.start(task)
+        return None
+
+    def tile_ready(self, key, image):
+        """
+        Function called when a `TileTask` finishes: cache the tile and repaint its area.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        key: tuple
+        image: QImage
+            The tile, `None` if the task was skipped.
+        """
+        self.tasks.pop(key, None)
+        if key[0] != self.generation:
+            return
+
+        level, column, row = key[2:]
+        if image is not None and key[1] == self.revision:
+            QPixmapCache.insert(self.tile_key(level, column, row), QPixmap.fromImage(image))
+        self.update(self.tile_target(level, column, row))
+
+    def tile_target(self, level, column, row):
+        """
+        Return the `QRectF` of a tile on the coordinates of the item.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        level: int
+        column: int
+        row: int
+        """
+        scale = self.pyramid.level_scale(level)
+        x, y, width, height = self.pyramid.tile_rect(level, column, row)
+        return QRectF(x/scale, y/scale, width/scale, height/scale)
+
+    def paint_placeholder(self, painter, level, column, row):
+        """
+        Paint, in the place of a tile not rendered yet, the cached tile of the closest lower level.
+
+        The preview `base` is painted if no lower level tile is cached.
+
+        Parameters
+        ----------
+        self: TiledImageItem
+            Instance of this class.
+        painter: QPainter
+        level: int
+        column: int
+        row: int
+        """
+        target = self.tile_target(level, column, row)
+        x, y, width, height = self.pyramid.tile_rect(level, column, row)
+        for lower in range(level - 1, -1, -1):
+            factor = 2**(level - lower)
+            pixmap = QPixmapCache.find(self.tile_key(lower, column//factor, row//factor))
+            if pixmap is not None and not pixmap.isNull():
+                left, top, _, _ = self.pyramid.tile_rect(lower, column//factor, row//factor)
+                painter.drawPixmap(target, pixmap, QRectF(x/factor - left, y/factor - top,
+                                                          width/factor, height/factor))
+                return
+
+        scale = self.base.width()/max(self.size.width(), 1)
+        painter.drawImage(target, self.base, QRectF(target.x()*scale, target.y()*scale,
+                                                    target.width()*scale, target.height()*scale))
+
+    def paint(self, painter, option, widget=None):
+        if self.base.isNull():
+            return
+
+        zoom = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        zoom *= self.profile.scale
+        level = self.pyramid.max_level + int(math.ceil(math.log2(max(zoom, 1e-9))))
+        level = min(max(level, 0), self.pyramid.max_level)
+        scale = self.pyramid.level_scale(level)
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        columns, rows = self.pyramid.tile_count(level)
+        first_column = max(int(exposed.left()*scale)//TILE_SIZE, 0)
+        last_column = min(int(math.ceil(exposed.right()*scale))//TILE_SIZE, columns - 1)
+        first_row = max(int(exposed.top()*scale)//TILE_SIZE, 0)
+        last_row = min(int(math.ceil(exposed.bottom()*scale))//TILE_SIZE, rows - 1)
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self.profile.smooth_transform)
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                pixmap = self.tile_pixmap(level, column, row)
+                if pixmap is None:
+                    self.paint_placeholder(painter, level, column, row)
+                    continue
+                _, _, width, height = self.pyramid.tile_rect(level, column, row)
+                painter.drawPixmap(self.tile_target(level, column, row), pixmap,
+                                   QRectF(0, 0, width, height))
+
+
+class JigsawView(QGraphicsView):
+    """
+    Zoomable and pannable view of the jigsaw.
+
+    Use the mouse wheel to zoom and drag with the mouse to pan. The piece under
+     the mouse is highlighted and `pieceHovered` is emitted with its identifier
+     when it changes. Ctrl+click selects and deselects pieces, and
+     `selectionChanged` is emitted with the identifiers of the selected pieces.
+
+    Attributes
+    ----------
+    item: TiledImageItem
+        The item that paints the image and the jigsaw.
+
+    piece_index: PieceIndex
+        The pieces of the jigsaw, `None` if unknown.
+
+    highlight: QGraphicsRectItem
+        Bounds of the piece under the mouse.
+
+    hovered: int
+        Identifier of the piece under the mouse, or -1.
+
+    selected: Dict[int, QGraphicsRectItem]
+        Bounds shown for each selected piece.
+    """
+
+    pieceHovered = Signal(int)
+    selectionChanged = Signal(object)
+
+    def __init__(self, parent=None):
+        super(JigsawView, self).__init__(parent)
+        QPixmapCache.setCacheLimit(max(QPixmapCache.cacheLimit(), CACHE_LIMIT))
+
+        self.setScene(QGraphicsScene(self))
+        self.item = TiledImageItem()
+        self.scene().addItem(self.item)
+
+        self.piece_index = None
+        self.hovered = -1
+        highlight_pen = QPen(QColor(255, 200, 0))
+        highlight_pen.setCosmetic(True)
+        self.highlight = QGraphicsRectItem()
+        self.highlight.setPen(highlight_pen)
+        self.highlight.setBrush(QColor(255, 200, 0, 48))
+        self.highlight.setVisible(False)
+        self.scene().addItem(self.highlight)
+        self.selected = dict()
+
+        self.setMouseTracking(True)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+
+    def set_image(self, image, size=None, image_path=None):
+        """
+        Show a new base image, see `TiledImageItem.set_image`.
+
+        Parameters
+        ----------
+        self: JigsawView
+            Instance of this class.
+        image: QImage
+        size: QSize
+        image_path: str
+        """
+        self.item.set_image(image, size, image_path)
+        self.scene().setSceneRect(self.item.boundingRect())
+
+    def set_overlay(self, tab_paths, pen_color, backend="Qt", profile=FINAL):
+        """
+        Show a new jigsaw over the image, see `TiledImageItem.set_overlay`.
+
+        Parameters
+        ----------
+        self: JigsawView
+            Instance of this class.
+        tab_paths: TabPaths
+        pen_color: QColor
+        backend: str
+        profile: RenderProfile
+        """
+        self.item.set_overlay(tab_paths, pen_color, backend, profile)
+
+    def update_region(self, tab_paths, boxes, piece_index):
+        """
+        Show the paths changed inside the boxes, see `TiledImageItem.update_region`.
+
+        Parameters
+        ----------
+        self: JigsawView
+            Instance of this class.
+        tab_paths: TabPaths
+        boxes: numpy.ndarray
+        piece_index: PieceIndex
+            Index of `tab_paths`, updated for the pieces inside the boxes.
+        """
+        self.piece_index = piece_index
+        self.item.update_region(tab_paths, boxes, piece_index)
+        for piece, rect_item in self.selected.items():
+            rect_item.setRect(self.piece_rect(piece))
+
+    def set_piece_index(self, piece_index):
+        """
+        Set the pieces used to find the piece under the mouse, clearing the selection.
+
+        Parameters
+        ----------
+        self: JigsawView
+            Instance of this class.
+        piece_index: PieceIndex
+        """
+        self.piece_index = piece_index
+        self.set_hovered(-1)
+        self.set_selected([])
+
+    def piece_rect(self, piece):
+        """
+        Return the `QRectF` of the bounds of a piece.
+
+        Parameters
+        ----------
+        self: JigsawView
+            Instance of this class.
+        piece: int
+        """
+        x0, y0, x1, y1 = self.piece_index.bounds[piece].tolist()
+        return QRectF(x0, y0, x1 - x0, y1 - y0)
+
+    def selected_pieces(self):
+        """
+        Return the sorted identifiers of the selected pieces.
+
+        Parameters
+        ----------
+        self: JigsawView
+            Instance of this class.
+        """
+        return sorted(self.selected)
+
+    def set_selected(self, pieces):
+        """
+        Select the given pieces, and only them.
+
+        Parameters
+        ----------
+        self: JigsawView
+            Instance of this class.
+        pieces: List[int]
+        """
+        pieces = set(pieces)
+        for piece in set(self.selected) - pieces:
+            self.scene().removeItem(self.selected.pop(piece))
+
+        pen = QPen(QColor(0, 160, 255))
+        pen.setCosmetic(True)
+        for piece in pieces - set(self.selected):
+            rect_item = QGraphicsRectItem(self.piece_rect(piece))
+            rect_item.setPen(pen)
+            rect_item.setBrush(QColor(0, 160, 255, 64))
+            self.scene().addItem(rect_item)
+            self.selected[piece] = rect_item
+
+        self.selectionChanged.emit(self.selected_pieces())
+
+    def mousePressEvent(self, event):
+        if event.modifiers() & Qt.ControlModifier and self.piece_index is not None:
+            point = self.mapToScene(event.position().toPoint() if hasattr(event, "position") else event.pos())
+            piece = self.piece_index.piece_at((point.x(), point.y()))
+            if piece >= 0:
+                self.set_selected(set(self.selected) ^ {piece})
+            event.accept()
+            return
+        super(JigsawView, self).mousePressEvent(event)
+
+    def set_hovered(self, piece):
+        """
+        Highlight the given piece, or nothing if it is -1.
+
+        Parameters
+        ----------
+        self: JigsawView
+            Instance of this class.
+        piece: int
+        """
+        if piece == self.hovered:
+            return
+
+        self.hovered = piece
+        if piece >= 0:
+            x0, y0, x1, y1 = self.piece_index.bounds[piece].tolist()
+            self.highlight.setRect(QRectF(x0, y0, x1 - x0, y1 - y0))
+        self.highlight.setVisible(piece >= 0)
+        self.pieceHovered.emit(piece)
+
+    def mouseMoveEvent(self, event):
+        super(JigsawView, self).mouseMoveEvent(event)
+        if self.piece_index is None:
+            return
+
+        point = self.mapToScene(event.position().toPoint() if hasattr(event, "position") else event.pos())
+        self.set_hovered(self.piece_index.piece_at((point.x(), point.y())))
+
+    def leaveEvent(self, event):
+        super(JigsawView, self).leaveEvent(event)
+        self.set_hovered(-1)
+
+    def wheelEvent(self, event):
+        factor = 1.25**(event.angleDelta().y()/120.0)
+        zoom = self.transform().m11()*factor
+        if 1e-3 < zoom < 64:
+            self.scale(factor, factor)
+        event.accept()
@@ -0,0 +1,474 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Resumable queue of batch jobs, stored on a SQLite database.
+
+Each job is one jigsaw (image, grid, seed, patterns, ...) written to one or more
+ outputs. The database keeps the specification of every job and the state and
+ the SHA-256 of every output, so a run that stops halfway is resumed by running
+ the queue again: the outputs whose files still have the recorded hash are
+ skipped and only the missing work is done. The jobs that fail are retried,
+ waiting longer after each attempt.
+
+Example:
+```
+cd jigsaw_generator
+python job_queue.py jobs.db add image.jpg output --grid 40x30 --seeds 1000 --formats png,svg
+python job_queue.py jobs.db run --workers 4
+python job_queue.py jobs.db status
+```
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from jigsaw_generator_info import Gui
+
+from image_loader import image_size, read_image
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+from jigsaw_painter import render_jigsaw
+from output_writer import VECTOR_FORMATS, OutputOptions, output_format, write_image, write_vector
+from render_profile import get_profile
+
+QColor = Gui.QColor
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    spec TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    job_id INTEGER NOT NULL REFERENCES jobs (id),
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    sha256 TEXT,
+    PRIMARY KEY (job_id, path)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, next_attempt);
+"""
+
+
+def job_spec(image, outputs, grid, seed, patterns, smooth_factor=.1, color="white", backend="Qt",
+             profile="Final", options=None):
+    """
+    Return the specification of a job, a dictionary that can be written as JSON.
+
+    Parameters
+    ----------
+    image: str
+        Path of the base image.
+    outputs: List[str]
+        Paths of the outputs, their format is given by the extension.
+    grid: Tuple[int, int]
+    seed: int
+    patterns: List[str]
+    smooth_factor: float
+    color: str
+        Name of the color of the borders, see `QColor`.
+    backend: str
+        "Qt" or "NumPy".
+    profile: str
+        Name of the `RenderProfile`.
+    options: OutputOptions
+    """
+    options = options or OutputOptions()
+    return {
+        "image": os.path.abspath(image), "outputs": [os.path.abspath(path) for path in outputs],
+        "grid": [int(grid[0]), int(grid[1])], "seed": int(seed), "patterns": list(patterns),
+        "smooth_factor": smooth_factor, "color": color, "backend": backend, "profile": profile,
+        "options": vars(options),
+    }
+
+
+def file_hash(path):
+    """
+    Return the hexadecimal SHA-256 of a file, or `None` if it does not exist.
+
+    Parameters
+    ----------
+    path: str
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def partial_path(path):
+    """
+    Return the temporary path where an output is written before it is complete.
+
+    The extension is kept, since it gives the format of the output.
+
+    Parameters
+    ----------
+    path: str
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, ".partial-" + name)
+
+
+def run_job(spec, paths):
+    """
+    Write the given outputs of a job and return the SHA-256 of each one.
+
+    Every output is written on `partial_path` and renamed when complete, so an
+     interrupted job never leaves a truncated output on its path.
+
+    Parameters
+    ----------
+    spec: dict
+        See `job_spec`.
+    paths: List[str]
+        Outputs of the job that are written, the others are not touched.
+    """
+    if not paths:
+        return []
+    profile = get_profile(spec["profile"])
+    options = OutputOptions(**spec["options"])
+    grid = spec["grid"]
+    color = QColor(spec["color"])
+
+    raster = [path for path in paths if output_format(path) not in VECTOR_FORMATS]
+    if raster:
+        base = read_image(spec["image"])
+        size = base.size()
+    else:
+        # The vector outputs only need the size of the image
+        size = image_size(spec["image"])
+        if not size.isValid():
+            size = read_image(spec["image"]).size()
+
+    core = JigsawGeneratorCore(list(grid), spec["seed"])
+    tab_paths = generate_tab_paths(core, float(size.width())/grid[0], float(size.height())/grid[1],
+                                   spec["patterns"], spec["smooth_factor"])
+    image = render_jigsaw(base, tab_paths, color, spec["backend"], profile) if raster else None
+
+    hashes = list()
+    for path in paths:
+        temporary = partial_path(path)
+        os.makedirs(os.path.dirname(temporary) or ".", exist_ok=True)
+        if output_format(path) in VECTOR_FORMATS:
+            write_vector(temporary, size.width(), size.height(), tab_paths, color, profile)
+        else:
+            write_image(image, temporary, options)
+        hashes.append(file_hash(temporary))
+        os.replace(temporary, path)
+    return hashes
+
+
+class JobQueue:
+    """
+    Batch jobs stored on a SQLite database.
+
+    Only the thread that created the queue uses the database; the jobs run on a
+     pool of threads and their results are recorded as they finish, so every
+     completed output is checkpointed at once.
+
+    Attributes
+    ----------
+    path: str
+        Path of the database.
+
+    connection: sqlite3.Connection
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+
+    def close(self):
+        """
+        Close the database.
+
+        Parameters
+        ----------
+        self: JobQueue
+            Instance of this class.
+        """
+        self.connection.close()
+
+    def add(self, spec):
+        """
+        Add a job and return its id; a job with the same specification is added only once.
+
+        Parameters
+        ----------
+        self: JobQueue
+            Instance of this class.
+        spec: dict
+            See `job_spec`.
+        """
+        text = json.dumps(spec, sort_keys=True)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO jobs (spec, status) VALUES (?, ?)", (text, PENDING)
+            )
+            job_id = self.connection.execute("SELECT id FROM jobs WHERE spec = ?", (text,)).fetchone()[0]
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO outputs (job_id, path, status) VALUES (?, ?, ?)",
+                [(job_id, path, PENDING) for path in spec["outputs"]]
+            )
+        return job_id
+
+    def counts(self):
+        """
+        Return a dictionary with the number of jobs of each status.
+
+        Parameters
+        ----------
+        self: JobQueue
+            Instance of this class.
+        """
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def verify(self):
+        """
+        Mark as pending the completed outputs whose files are missing or were changed.
+
+        Return the number of outputs marked.
+
+        Parameters
+        ----------
+        self: JobQueue
+            Instance of this class.
+        """
+        changed = [
+            (job_id, path) for job_id, path, sha256 in self.connection.execute(
+                "SELECT job_id, path, sha256 FROM outputs WHERE status = ?", (DONE,)
+            ) if file_hash(path) != sha256
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE outputs SET status = ?, sha256 = NULL WHERE job_id = ? AND path = ?",
+                [(PENDING, job_id, path) for job_id, path in changed]
+            )
+            self.connection.executemany(
+                "UPDATE jobs SET status = ?, attempts = 0, next_attempt = 0 WHERE id = ?",
+                [(PENDING, job_id) for job_id in set(job_id for job_id, _ in changed)]
+            )
+        return len(changed)
+
+    def reset_failed(self):
+        """
+        Give the failed jobs new attempts.
+
+        Parameters
+        ----------
+        self: JobQueue
+            Instance of this class.
+        """
+        with self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, next_attempt = 0 WHERE status = ?",
+                (PENDING, FAILED)
+            )
+
+    def _ready(self, limit, now):
+        return self.connection.execute(
+            "SELECT id, spec FROM jobs WHERE status = ? AND next_attempt <= ? ORDER BY id LIMIT ?",
+            (PENDING, now, limit)
+        ).fetchall()
+
+    def _missing_outputs(self, job_id):
+        return [path for path, in self.connection.execute(
+            "SELECT path FROM outputs WHERE job_id = ? AND status != ? ORDER BY path", (job_id, DONE)
+        )]
+
+    def _next_attempt(self):
+        row = self.connection.execute(
+            "SELECT MIN(next_attempt) FROM jobs WHERE status = ?", (PENDING,)
+        ).fetchone()
+        return row[0]
+
+    def run(self, workers=None, max_attempts=3, backoff=1.0, verify=True, log=print, cache=None):
+        """
+        Run the pending jobs until every one is done or failed and return `counts()`.
+
+        A job that raises an error is retried after `backoff*2**(attempts - 1)`
+         seconds, up to `max_attempts` attempts, and then marked as failed.
+
+        Parameters
+        ----------
+        self: JobQueue
+            Instance of this class.
+        workers: int
+            Number of threads, the default of `concurrent.futures.ThreadPoolExecutor` if `None`.
+        max_attempts: int
+        backoff: float
+            Delay, in seconds, before the first retry.
+        verify: bool
+            Whether the completed outputs are checked with `verify` first.
+        log: Callable[[str], None]
+            Receives a message for each job finished, `None` to be quiet.
+        cache: OutputCache
+            If given, the outputs are written with `OutputCache.write`, so the
+             jobs already rendered by any queue are only copied.
+        """
+        log = log or (lambda message: None)
+        write = cache.write if cache is not None else run_job
+
+        # The jobs that were running when a previous run stopped are pending again
+        with self.connection:
+            self.connection.execute("UPDATE jobs SET status = ? WHERE status = ?", (PENDING, RUNNING))
+        if verify:
+            changed = self.verify()
+            if changed:
+                log("{} completed outputs are missing or were changed".format(changed))
+
+        capacity = workers or min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=capacity) as executor:
+            running = dict()
+
+            while True:
+                for job_id, text in self._ready(capacity - len(running), time.time()):
+                    paths = self._missing_outputs(job_id)
+                    with self.connection:
+                        self.connection.execute("UPDATE jobs SET status = ? WHERE id = ?",
+                                                (RUNNING, job_id))
+                    running[executor.submit(write, json.loads(text), paths)] = (job_id, paths)
+
+                if not running:
+                    next_attempt = self._next_attempt()
+                    if next_attempt is None:
+                        break
+                    time.sleep(max(next_attempt - time.time(), 0.0))
+                    continue
+
+                # At capacity nothing new can start before a job finishes; otherwise
+                # every due job is running, so wake up for the next one to be due
+                timeout = None if len(running) >= capacity else self._wait_time()
+                finished, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job_id, paths = running.pop(future)
+                    self._record(job_id, paths, future, max_attempts, backoff, log)
+
+        return self.counts()
+
+    def _wait_time(self):
+        now = time.time()
+        next_attempt = self.connection.execute(
+            "SELECT MIN(next_attempt) FROM jobs WHERE status = ? AND next_attempt > ?", (PENDING, now)
+        ).fetchone()[0]
+        return None if next_attempt is None else max(next_attempt - now, 0.0)
+
+    def _record(self, job_id, paths, future, max_attempts, backoff, log):
+        error = future.exception()
+        with self.connection:
+            if error is None:
+                self.connection.executemany(
+                    "UPDATE outputs SET status = ?, sha256 = ? WHERE job_id = ? AND path = ?",
+                    [(DONE, sha256, job_id, path) for path, sha256 in zip(paths, future.result())]
+                )
+                self.connection.execute("UPDATE jobs SET status = ?, error = NULL WHERE id = ?",
+                                        (DONE, job_id))
+                log("job {} done: {}".format(job_id, ", ".join(paths)))
+                return
+
+            attempts = self.connection.execute(
+                "SELECT attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()[0] + 1
+            status = FAILED if attempts >= max_attempts else PENDING
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, next_attempt = ?, error = ? WHERE id = ?",
+                (status, attempts, time.time() + backoff*2**(attempts - 1), str(error), job_id)
+            )
+            log("job {} {} (attempt {}): {}".format(
+                job_id, "failed" if status == FAILED else "will be retried", attempts, error
+            ))
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+
+    parser = argparse.ArgumentParser(description="Resumable queue of batch jobs.")
+    parser.add_argument("database", help="path of the SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add the jobs of an image")
+    add.add_argument("image", help="path of the base image")
+    add.add_argument("output", help="directory of the outputs")
+    add.add_argument("--grid", type=parse_size, action="append",
+                     help="number of pieces, e.g. 40x30, can be repeated")
+    add.add_argument("--seed", type=int, default=0, help="first seed")
+    add.add_argument("--seeds", type=int, default=1, help="number of seeds of each grid")
+    add.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                     help="comma separated list of patterns")
+    add.add_argument("--smooth-factor", type=float, default=.1)
+    add.add_argument("--color", default="white")
+    add.add_argument("--formats", default="png", help="comma separated list, e.g. png,jpg,svg,dxf")
+    add.add_argument("--backend", choices=["Qt", "NumPy"], default="Qt")
+    add.add_argument("--profile", default="Final")
+
+    run = commands.add_parser("run", help="run the pending jobs")
+    run.add_argument("--workers", type=int, default=None)
+    run.add_argument("--max-attempts", type=int, default=3)
+    run.add_argument("--backoff", type=float, default=1.0, help="seconds before the first retry")
+    run.add_argument("--retry-failed", action="store_true", help="give the failed jobs new attempts")
+    run.add_argument("--no-verify", action="store_true", help="do not hash the completed outputs")
+    run.add_argument("--cache", default=None, help="directory of the cache of outputs")
+    run.add_argument("--cache-size", type=int, default=2048, help="limit of the cache in MB")
+
+    commands.add_parser("status", help="print the number of jobs of each status")
+    arguments = parser.parse_args()
+
+    queue = JobQueue(arguments.database)
+    if arguments.command == "add":
+        name = os.path.splitext(os.path.basename(arguments.image))[0]
+        for grid in arguments.grid or [(10, 10)]:
+            for seed in range(arguments.seed, arguments.seed + arguments.seeds):
+                stem = os.path.join(arguments.output, "{}_{}x{}_{}".format(name, grid[0], grid[1], seed))
+                queue.add(job_spec(
+                    arguments.image, [stem + "." + extension for extension in arguments.formats.split(",")],
+                    grid, seed, arguments.patterns.split(","), arguments.smooth_factor,
+                    arguments.color, arguments.backend, arguments.profile
+                ))
+    elif arguments.command == "run":
+        if arguments.retry_failed:
+            queue.reset_failed()
+        cache = None
+        if arguments.cache:
+            from output_cache import OutputCache
+            cache = OutputCache(arguments.cache, arguments.cache_size << 20)
+        begin = time.perf_counter()
+        queue.run(arguments.workers, arguments.max_attempts, arguments.backoff,
+                  not arguments.no_verify, cache=cache)
+        print("run in {:.3f} s".format(time.perf_counter() - begin))
+    print(", ".join("{} {}".format(count, status) for status, count in sorted(queue.counts().items())))
+    queue.close()
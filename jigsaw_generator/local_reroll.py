@@ -0,0 +1,280 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module local_reroll.
+
+Re-randomizes the borders of some pieces of a jigsaw and re-renders only the
+ rectangles that changed, so an edit costs in proportion to the pieces touched and
+ not to the size of the jigsaw.
+
+Example:
+```
+cd jigsaw_generator
+python local_reroll.py image.png output.png --grid 80x60 --region 100,100,400,300
+```
+"""
+import argparse
+import math
+import time
+
+import numpy
+from jigsaw_generator_info import Core, Gui
+
+from jigsaw_generator_geometry import generate_tab_paths
+from render_profile import FINAL
+from tab_validator import validate_and_reroll
+from tile_pyramid import render_rect
+
+QRect = Core.QRect
+QPainter = Gui.QPainter
+
+
+def piece_edges(piece_index, pieces):
+    """
+    Return the sorted indices of the inner borders of the given pieces.
+
+    Parameters
+    ----------
+    piece_index: PieceIndex
+
+    pieces: numpy.ndarray
+        Identifiers of the pieces.
+    """
+    edges = piece_index.edges[numpy.asarray(pieces, dtype=numpy.int64)].ravel()
+    return numpy.unique(edges[edges >= 0])
+
+
+def region_pieces(piece_index, box):
+    """
+    Return the identifiers of the pieces that intersect the box `[x0, y0, x1, y1]`.
+
+    Parameters
+    ----------
+    piece_index: PieceIndex
+
+    box: Tuple[float, float, float, float]
+    """
+    return piece_index.query(box)
+
+
+def merge_boxes(boxes):
+    """
+    Return the boxes merged only where they overlap, as an array of shape `(M, 4)`.
+
+    The boxes that overlap are replaced by the box that covers them, until no
+     two boxes overlap, so the pieces far apart stay on separate boxes.
+
+    Parameters
+    ----------
+    boxes: numpy.ndarray
+        Array of shape `(N, 4)` with the boxes `[x0, y0, x1, y1]`.
+    """
+    merged = [list(box) for box in numpy.asarray(boxes, dtype=float).tolist()]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(len(merged) - 1, i, -1):
+                a, b = merged[i], merged[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    merged[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del merged[j]
+                    changed = True
+    return numpy.array(merged, dtype=float).reshape((-1, 4))
+
+
+def reroll_edges(core, tab_paths, edges, cell_width, cell_height, patterns, smooth_factor,
+                 validate=False, **kwargs):
+    """
+    Give new designs to the given borders and return `(tab_paths, dirty)`.
+
+    The borders get new revisions with `JigsawGeneratorCore.reroll_edges`, so
+     their polarities change consistently on both cells, and only their paths are
+     computed again. The other paths keep their positions on the result. `dirty`
+     is an array of shape `(M, 4)` with the boxes `[x0, y0, x1, y1]` that cover the
+     old and the new paths, see `merge_boxes`, empty if no path changed.
+
+    Parameters
+    ----------
+    core: JigsawGeneratorCore
+        The jigsaw, its `revisions` and `matrix` are updated.
+
+    tab_paths: TabPaths
+        Paths of all the masculine borders of `core`.
+
+    edges: numpy.ndarray
+        Indices of the borders.
+
+    cell_width: float
+
+    cell_height: float
+
+    patterns: List[str]
+
+    smooth_factor: float
+
+    validate: bool
+        Whether the new borders that overlap their neighbours are re-rolled again,
+         with `tab_validator.validate_and_reroll`.
+
+    kwargs:
+        Arguments passed to `tab_validator.validate_and_reroll`.
+    """
+    positions = numpy.flatnonzero(numpy.isin(tab_paths.edge, numpy.asarray(edges, dtype=numpy.int64)))
+    if len(positions) == 0:
+        return tab_paths, numpy.zeros((0, 4))
+
+    rerolled_edges = tab_paths.edge[positions]
+    old_boxes = tab_paths.select(positions).bounding_boxes()
+    core.reroll_edges(rerolled_edges)
+    result = tab_paths.replaced(positions, generate_tab_paths(
+        core, cell_width, cell_height, patterns, smooth_factor, rerolled_edges
+    ))
+    if validate:
+        result, _ = validate_and_reroll(core, cell_width, cell_height, patterns, smooth_factor,
+                                        tab_paths=result, edges=rerolled_edges, **kwargs)
+
+    new_boxes = result.select(positions).bounding_boxes()
+    boxes = numpy.concatenate([numpy.minimum(old_boxes[:, :2], new_boxes[:, :2]),
+                               numpy.maximum(old_boxes[:, 2:], new_boxes[:, 2:])], axis=1)
+    return result, merge_boxes(boxes)
+
+
+def dirty_rect(image, box, scale, margin=2):
+    """
+    Return the `QRect` of `image` covered by the box, grown by `margin` pixels.
+
+    Parameters
+    ----------
+    image: QImage
+        The jigsaw rendered at `scale`.
+    box: Tuple[float, float, float, float]
+        Box `[x0, y0, x1, y1]` on the coordinates of the full resolution image.
+    scale: float
+    margin: int
+        Pixels around the box, for the antialiasing and the width of the pen.
+    """
+    x0 = int(math.floor(box[0]*scale)) - margin
+    y0 = int(math.floor(box[1]*scale)) - margin
+    x1 = int(math.ceil(box[2]*scale)) + margin
+    y1 = int(math.ceil(box[3]*scale)) + margin
+    return QRect(x0, y0, x1 - x0 + 1, y1 - y0 + 1).intersected(image.rect())
+
+
+def render_dirty(image, base_image, tab_paths, boxes, pen_color, backend="Qt", profile=FINAL,
+                 piece_index=None):
+    """
+    Draw again, over `image`, the rectangles of the jigsaw covered by `boxes`, and return their `QRect`.
+
+    Each rectangle is rendered from `base_image` with `tile_pyramid.render_rect`
+     and copied over `image`, the rest of `image` is not touched.
+
+    Parameters
+    ----------
+    image: QImage
+        The jigsaw rendered by `jigsaw_painter.render_jigsaw` with `profile`,
+         changed in place.
+    base_image: QImage
+        The full resolution base image.
+    tab_paths: TabPaths
+        Paths of all the masculine borders.
+    boxes: numpy.ndarray
+        Boxes `[x0, y0, x1, y1]` that changed, see `reroll_edges`.
+    pen_color: QColor
+    backend: str
+        "Qt" or "NumPy".
+    profile: RenderProfile
+    piece_index: PieceIndex
+        Index of `tab_paths`, used to find the paths near each rectangle without
+         testing every path.
+    """
+    scale = profile.scale
+    rects = [dirty_rect(image, box, scale) for box in boxes]
+    rects = [rect for rect in rects if not rect.isEmpty()]
+    if not rects:
+        return rects
+
+    path_boxes = tab_paths.bounding_boxes() if piece_index is None else None
+    painter = QPainter(image)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    for rect in rects:
+        region = (rect.left()/scale, rect.top()/scale, (rect.right() + 1)/scale, (rect.bottom() + 1)/scale)
+        if piece_index is not None:
+            paths = piece_index.path_query(region)
+        else:
+            paths = numpy.flatnonzero((path_boxes[:, 0] <= region[2]) & (path_boxes[:, 2] >= region[0])
+                                      & (path_boxes[:, 1] <= region[3]) & (path_boxes[:, 3] >= region[1]))
+
+        tile = render_rect(base_image, base_image.width(), base_image.height(), scale,
+                           (rect.left(), rect.top(), rect.width(), rect.height()),
+                           tab_paths.select(paths), pen_color, backend, profile)
+        painter.drawImage(rect.topLeft(), tile)
+    painter.end()
+    return rects
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+    from image_loader import read_image
+    from jigsaw_generator_core import JigsawGeneratorCore
+    from jigsaw_painter import render_jigsaw
+    from piece_index import PieceIndex
+
+    parser = argparse.ArgumentParser(description="Re-roll the pieces of a region of a jigsaw.")
+    parser.add_argument("image", help="path of the base image")
+    parser.add_argument("output", help="path of the image written")
+    parser.add_argument("--grid", type=parse_size, default=(10, 10), help="number of pieces, e.g. 40x30")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--region", default="0,0,1,1", help="box x0,y0,x1,y1 of the pieces re-rolled")
+    parser.add_argument("--color", default="white")
+    parser.add_argument("--validate", action="store_true", help="re-roll again the borders that overlap")
+    arguments = parser.parse_args()
+
+    base = read_image(arguments.image)
+    grid = arguments.grid
+    cell_width, cell_height = float(base.width())/grid[0], float(base.height())/grid[1]
+    patterns = arguments.patterns.split(",")
+    color = Gui.QColor(arguments.color)
+
+    core = JigsawGeneratorCore(list(grid))
+    core.generate_random(arguments.seed)
+    paths = generate_tab_paths(core, cell_width, cell_height, patterns, arguments.smooth_factor)
+    index = PieceIndex.build(core, paths, cell_width, cell_height)
+
+    begin = time.perf_counter()
+    rendered = render_jigsaw(base, paths, color)
+    full_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    pieces = region_pieces(index, [float(value) for value in arguments.region.split(",")])
+    edges = piece_edges(index, pieces)
+    paths, dirty = reroll_edges(core, paths, edges, cell_width, cell_height, patterns,
+                                arguments.smooth_factor, arguments.validate)
+    index.update_edges(paths, edges)
+    changed = render_dirty(rendered, base, paths, dirty, color, piece_index=index)
+    local_time = time.perf_counter() - begin
+
+    rendered.save(arguments.output)
+    print("full render {:.4f} s, re-roll of {} pieces ({} borders, {} rects, {} pixels) {:.4f} s".format(
+        full_time, len(pieces), len(edges), len(changed),
+        sum(rect.width()*rect.height() for rect in changed), local_time
+    ))
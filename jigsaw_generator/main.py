@@ -17,12 +17,14 @@
 ############################################################################
 
 import sys
-from jigsaw_generator_info import PySide
-from jigsaw_generator import JigsawGenerator
-
-QApplication = PySide.QtWidgets.QApplication
 
 if __name__ == "__main__":
+    # Imported only here: the processes of `vector_export` import this module again
+    from jigsaw_generator_info import PySide
+    from jigsaw_generator import JigsawGenerator
+
+    QApplication = PySide.QtWidgets.QApplication
+
     app = QApplication(sys.argv)
 
     widget = JigsawGenerator()
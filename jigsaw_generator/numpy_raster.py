@@ -0,0 +1,243 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Auxiliar module that draws the jigsaw directly on a NumPy RGBA array.
+
+It is an alternative to the `QPainter` used by `JigsawGenerator.draw_on_pixmap`
+ that does not depend on Qt, so it can be used on any thread or process. The
+ coordinates follow the convention of `QPainter`: the center of the pixel
+ `[row, column]` is the point `(column + .5, row + .5)`.
+"""
+import numpy
+
+# Longest piece of segment rasterized at once, in pixels
+MAX_PIECE_LENGTH = 8.0
+
+# Segments rasterized at once, to bound the memory of their candidate pixels
+CHUNK_SEGMENTS = 1 << 12
+
+
+def split_segments(a, b, max_length=MAX_PIECE_LENGTH):
+    """
+    Split the segments `ab` in pieces not longer than `max_length`.
+
+    Parameters
+    ----------
+    a: numpy.ndarray
+        Array of shape `(M, 2)` with the first point of each segment.
+    b: numpy.ndarray
+        Array of shape `(M, 2)` with the last point of each segment.
+    max_length: float
+    """
+    pieces = numpy.maximum(numpy.ceil(numpy.hypot(*(b - a).T)/max_length), 1).astype(numpy.int64)
+    segment = numpy.repeat(numpy.arange(len(a)), pieces)
+    k = numpy.arange(len(segment)) - numpy.repeat(numpy.cumsum(pieces) - pieces, pieces)
+    n = pieces[segment][:, None]
+    direction = (b - a)[segment]
+    return a[segment] + direction*(k[:, None]/n), a[segment] + direction*((k[:, None] + 1)/n)
+
+
+def candidate_coverage(a, b, shape, width=1.0, antialias=True):
+    """
+    Return the pixels covered by the segments `ab` as `(indices, coverage)`, with repetitions.
+
+    A pixel covered by more than one piece of segment appears once for each,
+     see `segment_coverage`.
+
+    Parameters
+    ----------
+    a: numpy.ndarray
+        Array of shape `(M, 2)` with the first point of each segment.
+    b: numpy.ndarray
+        Array of shape `(M, 2)` with the last point of each segment.
+    shape: Tuple[int, int]
+        Height and width of the image.
+    width: float
+        Width of the stroke.
+    antialias: bool
+    """
+    height, image_width = shape[0], shape[1]
+    a, b = split_segments(a, b)
+    radius = width/2.0 + (.5 if antialias else 0.)
+
+    # Boxes of candidate pixels around each piece, clipped to the image
+    x0 = numpy.maximum(numpy.floor(numpy.minimum(a[:, 0], b[:, 0]) - radius), 0).astype(numpy.int64)
+    y0 = numpy.maximum(numpy.floor(numpy.minimum(a[:, 1], b[:, 1]) - radius), 0).astype(numpy.int64)
+    x1 = numpy.minimum(numpy.floor(numpy.maximum(a[:, 0], b[:, 0]) + radius), image_width - 1).astype(numpy.int64)
+    y1 = numpy.minimum(numpy.floor(numpy.maximum(a[:, 1], b[:, 1]) + radius), height - 1).astype(numpy.int64)
+
+    columns = numpy.maximum(x1 - x0 + 1, 0)
+    counts = columns*numpy.maximum(y1 - y0 + 1, 0)
+
+    piece = numpy.repeat(numpy.arange(len(a)), counts)
+    local = numpy.arange(len(piece)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    dy, dx = numpy.divmod(local, columns[piece])
+    x, y = x0[piece] + dx, y0[piece] + dy
+
+    # Distance from the center of each pixel to its piece
+    direction = b - a
+    length = numpy.einsum("ij,ij->i", direction, direction)
+    inverse = 1.0/numpy.where(length == 0, 1., length)
+    px, py = x + (.5 - a[piece, 0]), y + (.5 - a[piece, 1])
+    ux, uy = direction[piece, 0], direction[piece, 1]
+    t = numpy.clip((px*ux + py*uy)*inverse[piece], 0., 1.)
+    distance = numpy.hypot(px - t*ux, py - t*uy)
+
+    if antialias:
+        coverage = numpy.clip(width/2.0 + .5 - distance, 0., 1.)
+    else:
+        coverage = (distance <= max(width/2.0, .5)).astype(numpy.float64)
+
+    keep = coverage > 0
+    return (y*image_width + x)[keep], coverage[keep]
+
+
+def segment_coverage(a, b, shape, width=1.0, antialias=True):
+    """
+    Return the pixels covered by the segments `ab` as `(indices, coverage)`.
+
+    `indices` are the flat indices of the pixels on an image of the given shape,
+     without repetitions, and `coverage` the fraction in [0, 1] of each pixel
+     covered by the strokes.
+
+    Parameters
+    ----------
+    a: numpy.ndarray
+        Array of shape `(M, 2)` with the first point of each segment.
+    b: numpy.ndarray
+        Array of shape `(M, 2)` with the last point of each segment.
+    shape: Tuple[int, int]
+        Height and width of the image.
+    width: float
+        Width of the stroke.
+    antialias: bool
+    """
+    indices, coverage = candidate_coverage(a, b, shape, width, antialias)
+    if len(indices) == 0:
+        return indices, coverage
+
+    # Where the strokes overlap, keep the highest coverage of each pixel
+    order = numpy.argsort(indices, kind="stable")
+    indices, coverage = indices[order], coverage[order]
+    starts = numpy.flatnonzero(numpy.concatenate([[True], indices[1:] != indices[:-1]]))
+    return indices[starts], numpy.maximum.reduceat(coverage, starts)
+
+
+def composite(image, indices, coverage, color):
+    """
+    Blend `color` over the given pixels of `image` with the alpha of `coverage`.
+
+    Parameters
+    ----------
+    image: numpy.ndarray
+        Array of shape `(height, width, 4)` and type `numpy.uint8`, in RGBA order.
+    indices: numpy.ndarray
+        Flat indices of the pixels.
+    coverage: numpy.ndarray
+        Fraction of each pixel covered.
+    color: Tuple[int, int, int, int]
+        RGBA of the pen.
+    """
+    pixels = image.reshape((-1, 4))
+    alpha = (coverage*(color[3]/255.0))[:, None]
+    source = numpy.asarray(color, dtype=numpy.float64)
+    source[3] = 255.0
+    blended = pixels[indices].astype(numpy.float64)*(1.0 - alpha) + source*alpha
+    pixels[indices] = numpy.round(blended).astype(numpy.uint8)
+    return image
+
+
+def draw_polylines(image, vertices, offsets, color, width=1.0, antialias=True):
+    """
+    Stroke the polylines `(vertices, offsets)` on `image`.
+
+    The vertices of the polyline `k` are `vertices[offsets[k]:offsets[k + 1]]`.
+
+    Parameters
+    ----------
+    image: numpy.ndarray
+        Array of shape `(height, width, 4)` and type `numpy.uint8`, in RGBA order.
+    vertices: numpy.ndarray
+        Array of shape `(V, 2)`.
+    offsets: numpy.ndarray
+        Array of shape `(N + 1,)`.
+    color: Tuple[int, int, int, int]
+        RGBA of the pen.
+    width: float
+        Width of the pen.
+    antialias: bool
+    """
+    owner = numpy.repeat(numpy.arange(len(offsets) - 1), numpy.diff(offsets))
+    first = numpy.flatnonzero(owner[:-1] == owner[1:])
+
+    # The coverage of the chunks of segments is gathered on one buffer, keeping
+    # the highest of each pixel, so the memory does not grow with the segments
+    covered = numpy.zeros(image.shape[0]*image.shape[1], dtype=numpy.float32)
+    for begin in range(0, len(first), CHUNK_SEGMENTS):
+        chunk = first[begin:begin + CHUNK_SEGMENTS]
+        indices, coverage = candidate_coverage(
+            vertices[chunk], vertices[chunk + 1], image.shape, width, antialias
+        )
+        numpy.maximum.at(covered, indices, coverage.astype(numpy.float32))
+
+    indices = numpy.flatnonzero(covered)
+    return composite(image, indices, covered[indices].astype(numpy.float64), color)
+
+
+def frame_polyline(width, height):
+    """
+    Return the polyline of the frame drawn by `JigsawGenerator.draw_borders`.
+
+    Parameters
+    ----------
+    width: int
+    height: int
+    """
+    vertices = numpy.array([[0, 0], [width, 0], [width, height], [0, height], [0, 0]],
+                           dtype=numpy.float64)
+    return vertices, numpy.array([0, len(vertices)], dtype=numpy.int64)
+
+
+def draw_jigsaw(image, tab_paths, color, width=1.0, antialias=True, tolerance=.25, scale=1.0):
+    """
+    Draw the frame and all the paths of `tab_paths` on `image`.
+
+    Parameters
+    ----------
+    image: numpy.ndarray
+        Array of shape `(height, width, 4)` and type `numpy.uint8`, in RGBA order.
+    tab_paths: TabPaths
+        Paths of the masculine borders.
+    color: Tuple[int, int, int, int]
+        RGBA of the pen.
+    width: float
+        Width of the pen.
+    antialias: bool
+    tolerance: float
+        Maximum error, in pixels, of the approximation of the curves by lines.
+    scale: float
+        Scale from the coordinates of `tab_paths` to the pixels of `image`.
+    """
+    frame_vertices, frame_offsets = frame_polyline(image.shape[1] - 1, image.shape[0] - 1)
+    vertices, offsets = tab_paths.flatten(tolerance, scale)
+    vertices = vertices*scale
+
+    vertices = numpy.concatenate([frame_vertices, vertices])
+    offsets = numpy.concatenate([frame_offsets, offsets[1:] + len(frame_vertices)])
+    return draw_polylines(image, vertices, offsets, color, width, antialias)
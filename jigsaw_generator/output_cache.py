@@ -0,0 +1,395 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Content-addressed cache of the outputs of the jobs.
+
+Each output is stored under the SHA-256 of its canonical render parameters
+ (grid, seed, patterns, smooth factor, color, profile, format, ...) and of the
+ content of the base image, so a job already rendered, by any path, is served by
+ copying a file. The cache has a limit of size, the least recently used outputs
+ are discarded, and the outputs are renamed into it only when complete. The
+ threads that ask at once for the same output wait for a single render.
+
+Example:
+```
+cd jigsaw_generator
+python output_cache.py cache image.jpg output.png output.svg --grid 40x30 --seed 7
+```
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from jigsaw_generator_info import Gui
+
+from job_queue import file_hash, job_spec, partial_path, run_job
+from output_writer import VECTOR_FORMATS, OutputOptions, output_format
+
+QColor = Gui.QColor
+
+# Changed when the same parameters start to give different outputs
+CACHE_VERSION = 2
+
+# Default limit, in bytes, of the sum of the sizes of the outputs kept
+DEFAULT_MAX_BYTES = 2 << 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_access ON entries (last_access);
+"""
+
+
+def canonical_parameters(spec, image_sha256, format_name):
+    """
+    Return the dictionary of the parameters that the output of a job depends on.
+
+    The paths are replaced by the content of the image, the color by its
+     hexadecimal name and the options that the format ignores are left out, so
+     equivalent jobs give the same dictionary.
+
+    Parameters
+    ----------
+    spec: dict
+        See `job_queue.job_spec`.
+    image_sha256: str
+        SHA-256 of the base image.
+    format_name: str
+        Format of the output, see `output_writer.output_format`.
+    """
+    parameters = {
+        "version": CACHE_VERSION, "image": image_sha256, "format": format_name,
+        "grid": [int(value) for value in spec["grid"]], "seed": int(spec["seed"]),
+        "patterns": list(spec["patterns"]), "smooth_factor": float(spec["smooth_factor"]),
+        "color": QColor(spec["color"]).name(QColor.HexArgb), "profile": spec["profile"],
+    }
+    if format_name not in VECTOR_FORMATS:
+        options = vars(OutputOptions(**spec["options"]))
+        parameters["backend"] = spec["backend"]
+        if format_name == "png":
+            parameters["png_compression"] = options["png_compression"]
+        elif format_name == "jpg":
+            parameters.update((name, options[name]) for name in ("jpeg_quality", "progressive", "optimized"))
+    return parameters
+
+
+def cache_key(parameters):
+    """
+    Return the hexadecimal SHA-256 of the canonical JSON of the parameters.
+
+    Parameters
+    ----------
+    parameters: dict
+        See `canonical_parameters`.
+    """
+    text = json.dumps(parameters, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class OutputCache:
+    """
+    Outputs stored on a directory under the hash of their parameters.
+
+    The entries are indexed on a SQLite database on the directory, with the size
+     and the time of the last access of each one. Several processes can share the
+     directory: an entry is only visible once renamed into place, but they do not
+     wait for the renders of each other.
+
+    Attributes
+    ----------
+    directory: str
+
+    max_bytes: int
+        Limit of the sum of the sizes of the entries.
+
+    connection: sqlite3.Connection
+        Index of the entries, used under `_lock`.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, "tmp"), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+        self._lock = threading.Lock()
+        self._renders = dict()
+        self._image_hashes = dict()
+
+    def close(self):
+        """
+        Close the index.
+
+        Parameters
+        ----------
+        self: OutputCache
+            Instance of this class.
+        """
+        self.connection.close()
+
+    def image_hash(self, path):
+        """
+        Return the SHA-256 of an image, hashing each version of the file only once.
+
+        Parameters
+        ----------
+        self: OutputCache
+            Instance of this class.
+        path: str
+        """
+        status = os.stat(path)
+        version = (os.path.abspath(path), status.st_mtime_ns, status.st_size)
+        sha256 = self._image_hashes.get(version)
+        if sha256 is None:
+            sha256 = self._image_hashes[version] = file_hash(path)
+        return sha256
+
+    def entry_path(self, key, format_name):
+        """
+        Return the path of the entry of a key.
+
+        Parameters
+        ----------
+        self: OutputCache
+            Instance of this class.
+        key: str
+        format_name: str
+        """
+        return os.path.join(self.directory, key[:2], key + "." + format_name)
+
+    def lookup(self, key):
+        """
+        Return the path of the entry of `key`, or `None` if it is not cached.
+
+        Parameters
+        ----------
+        self: OutputCache
+            Instance of this class.
+        key: str
+        """
+        with self._lock, self.connection:
+            row = self.connection.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self.connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def _store(self, key, path, format_name):
+        entry = self.entry_path(key, format_name)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        os.replace(path, entry)
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, path, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, entry, os.path.getsize(entry), time.time())
+            )
+            self._evict(key)
+        return entry
+
+    def _evict(self, kept):
+        # The entry just stored is kept even alone over the limit, its caller reads it next
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        discarded = list()
+        for key, path, size in self.connection.execute(
+            "SELECT key, path, size FROM entries WHERE key != ? ORDER BY last_access", (kept,)
+        ):
+            if total <= self.max_bytes:
+                break
+            discarded.append((key, path))
+            total -= size
+        self.connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in discarded])
+        for _, path in discarded:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def keys(self, spec, format_names):
+        """
+        Return the key of the output of a job on each format.
+
+        Parameters
+        ----------
+        self: OutputCache
+            Instance of this class.
+        spec: dict
+            See `job_queue.job_spec`.
+        format_names: List[str]
+            Formats of the outputs, see `output_writer.output_format`.
+        """
+        sha256 = self.image_hash(spec["image"])
+        return [cache_key(canonical_parameters(spec, sha256, name)) for name in format_names]
+
+    def get(self, spec, output_formats):
+        """
+        Return the paths of the entries of the outputs of a job, rendering the missing ones.
+
+        The missing outputs are rendered together by `job_queue.run_job`. An output
+         that another thread is already rendering is not rendered again: this
+         thread waits for it.
+
+        Parameters
+        ----------
+        self: OutputCache
+            Instance of this class.
+        spec: dict
+            See `job_queue.job_spec`, its outputs are ignored.
+        output_formats: List[str]
+            Formats of the outputs, e.g. ["png", "svg"].
+        """
+        keys = self.keys(spec, output_formats)
+        entries = [self.lookup(key) for key in keys]
+
+        owned, waited = list(), list()
+        with self._lock:
+            for index, key in enumerate(keys):
+                if entries[index] is not None:
+                    continue
+                if key in self._renders:
+                    waited.append((index, self._renders[key]))
+                else:
+                    self._renders[key] = threading.Event()
+                    owned.append(index)
+
+        try:
+            if owned:
+                suffix = "{}-{}".format(os.getpid(), threading.get_ident())
+                temporaries = [os.path.join(self.directory, "tmp", "{}-{}.{}".format(
+                    keys[index], suffix, output_formats[index]
+                )) for index in owned]
+                try:
+                    run_job(spec, temporaries)
+                except BaseException:
+                    for temporary in temporaries:
+                        for path in (temporary, partial_path(temporary)):
+                            if os.path.exists(path):
+                                os.remove(path)
+                    raise
+                for index, temporary in zip(owned, temporaries):
+                    entries[index] = self._store(keys[index], temporary, output_formats[index])
+        finally:
+            with self._lock:
+                for index in owned:
+                    self._renders.pop(keys[index]).set()
+
+        for index, event in waited:
+            event.wait()
+            entries[index] = self.lookup(keys[index])
+            if entries[index] is None:
+                # The render of the other thread failed or was evicted at once
+                entries[index] = self.get(spec, [output_formats[index]])[0]
+        return entries
+
+    def write(self, spec, paths):
+        """
+        Write the given outputs of a job from the cache and return the SHA-256 of each one.
+
+        A replacement of `job_queue.run_job`: each output is copied from its entry
+         on `partial_path` and renamed when complete.
+
+        Parameters
+        ----------
+        self: OutputCache
+            Instance of this class.
+        spec: dict
+            See `job_queue.job_spec`.
+        paths: List[str]
+        """
+        if not paths:
+            return []
+        entries = self.get(spec, [output_format(path) for path in paths])
+
+        hashes = list()
+        for path, entry in zip(paths, entries):
+            temporary = partial_path(path)
+            os.makedirs(os.path.dirname(temporary) or ".", exist_ok=True)
+            try:
+                shutil.copyfile(entry, temporary)
+            except FileNotFoundError:
+                # Evicted after the lookup
+                shutil.copyfile(self.get(spec, [output_format(path)])[0], temporary)
+            hashes.append(file_hash(temporary))
+            os.replace(temporary, path)
+        return hashes
+
+    def size(self):
+        """
+        Return the number of entries and the sum of their sizes, in bytes.
+
+        Parameters
+        ----------
+        self: OutputCache
+            Instance of this class.
+        """
+        with self._lock:
+            return tuple(self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone())
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+
+    parser = argparse.ArgumentParser(description="Write the outputs of a jigsaw through the cache.")
+    parser.add_argument("cache", help="directory of the cache")
+    parser.add_argument("image", help="path of the base image")
+    parser.add_argument("outputs", nargs="+", help="paths of the outputs, e.g. out.png out.svg")
+    parser.add_argument("--grid", type=parse_size, default=(10, 10), help="number of pieces, e.g. 40x30")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--color", default="white")
+    parser.add_argument("--backend", choices=["Qt", "NumPy"], default="Qt")
+    parser.add_argument("--profile", default="Final")
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_BYTES >> 20, help="limit in MB")
+    arguments = parser.parse_args()
+
+    cache = OutputCache(arguments.cache, arguments.max_size << 20)
+    spec = job_spec(arguments.image, arguments.outputs, arguments.grid, arguments.seed,
+                    arguments.patterns.split(","), arguments.smooth_factor, arguments.color,
+                    arguments.backend, arguments.profile)
+    hits = sum(cache.lookup(key) is not None for key in cache.keys(
+        spec, [output_format(path) for path in spec["outputs"]]
+    ))
+
+    begin = time.perf_counter()
+    cache.write(spec, spec["outputs"])
+    elapsed = time.perf_counter() - begin
+
+    entries, size = cache.size()
+    print("{} outputs ({} cached) in {:.4f} s, cache of {} entries and {} bytes".format(
+        len(arguments.outputs), hits, elapsed, entries, size
+    ))
+    cache.close()
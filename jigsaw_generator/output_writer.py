@@ -0,0 +1,361 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module output_writer.
+
+Encodes the outputs of a jigsaw: raster images with `QImageWriter`, with the
+ options of each format, and SVG and DXF files with the module `vector_export`.
+ Several outputs are encoded at once, on a thread pool, from the same rendered `QImage`.
+
+Contains the class WriteOutputsTask, that writes the outputs on a `QThreadPool`,
+ decoding and rendering the image first when it is not rendered yet.
+
+Example:
+```
+cd jigsaw_generator
+python output_writer.py image.jpg output.png output.jpg output.svg --grid 40x30 --jpeg-quality 85
+```
+"""
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from jigsaw_generator_info import Core, Gui
+
+from image_loader import image_size, is_vector, read_image
+from jigsaw_painter import render_jigsaw
+from render_profile import FINAL, PROFILES
+import vector_export
+
+QObject, QRunnable, Signal = Core.QObject, Core.QRunnable, Core.Signal
+QImageWriter, QColor = Gui.QImageWriter, Gui.QColor
+
+# Formats written from the paths, not from the rendered image
+VECTOR_FORMATS = ("svg", "dxf")
+
+
+class OutputOptions:
+    """
+    Options of the encoders, each one is ignored by the formats that do not use it.
+
+    Attributes
+    ----------
+    png_compression: int
+        Level of compression of the PNG images, from 0 (fastest) to 9 (smallest),
+         the default of Qt if -1.
+
+    jpeg_quality: int
+        Quality of the JPEG images, from 0 to 100, the default of Qt if -1.
+
+    progressive: bool
+        Whether the JPEG images are progressive.
+
+    optimized: bool
+        Whether the JPEG images use optimized Huffman tables.
+    """
+
+    def __init__(self, png_compression=-1, jpeg_quality=-1, progressive=False, optimized=False):
+        self.png_compression = png_compression
+        self.jpeg_quality = jpeg_quality
+        self.progressive = progressive
+        self.optimized = optimized
+
+
+def output_format(path):
+    """
+    Return the format of the output on the given path, from its extension.
+
+    Parameters
+    ----------
+    path: str
+    """
+    extension = os.path.splitext(path)[1][1:].lower()
+    return "jpg" if extension == "jpeg" else extension
+
+
+def write_image(image, path, options=None):
+    """
+    Encode a `QImage` on the given path, using the options of its format.
+
+    Parameters
+    ----------
+    image: QImage
+        The image, only read.
+    path: str
+    options: OutputOptions
+    """
+    options = options or OutputOptions()
+    image_format = output_format(path)
+
+    writer = QImageWriter(path)
+    if image_format == "png" and options.png_compression >= 0:
+        # Qt maps the ratio from 0 to 100 onto the levels of zlib as `ratio*9/91`
+        writer.setCompression(int(math.ceil(min(options.png_compression, 9)*91/9.0)))
+    if image_format == "jpg":
+        if options.jpeg_quality >= 0:
+            writer.setQuality(options.jpeg_quality)
+        writer.setProgressiveScanWrite(options.progressive)
+        writer.setOptimizedWrite(options.optimized)
+
+    if not writer.write(image):
+        raise IOError("It was not possible to save the file {}: {}".format(
+            path, writer.errorString()
+        ))
+
+
+def write_svg(path, width, height, tab_paths, pen_color, profile=FINAL, workers=None):
+    """
+    Write the frame and the borders of the jigsaw on a SVG file.
+
+    The text is written by `vector_export.write_svg`, on several processes for
+     large jigsaws. With a profile without `native_curves`, the curves are
+     written as lines flattened with its `tolerance`.
+
+    Parameters
+    ----------
+    path: str
+    width: int
+        Width of the SVG.
+    height: int
+        Height of the SVG.
+    tab_paths: TabPaths
+        Paths of the masculine borders, on the coordinates of the SVG.
+    pen_color: QColor
+    profile: RenderProfile
+    workers: int
+        Number of processes, see `vector_export.write_sharded`.
+    """
+    try:
+        vector_export.write_svg(path, width, height, tab_paths, pen_color.name(), pen_color.alphaF(),
+                                None if profile.native_curves else profile.tolerance, workers=workers)
+    except OSError as error:
+        raise IOError("It was not possible to save the file {}: {}".format(path, error))
+
+
+def write_dxf(path, width, height, tab_paths, profile=FINAL, workers=None):
+    """
+    Write the frame and the borders of the jigsaw on a DXF file, as polylines.
+
+    The curves are flattened with the `tolerance` of the profile.
+
+    Parameters
+    ----------
+    path: str
+    width: int
+    height: int
+    tab_paths: TabPaths
+        Paths of the masculine borders, on the coordinates of the image.
+    profile: RenderProfile
+    workers: int
+        Number of processes, see `vector_export.write_sharded`.
+    """
+    try:
+        vector_export.write_dxf(path, width, height, tab_paths, profile.tolerance, workers=workers)
+    except OSError as error:
+        raise IOError("It was not possible to save the file {}: {}".format(path, error))
+
+
+def write_vector(path, width, height, tab_paths, pen_color, profile=FINAL, workers=None):
+    """
+    Write the jigsaw with `write_svg` or `write_dxf`, by the extension of `path`.
+
+    Parameters
+    ----------
+    path: str
+    width: int
+    height: int
+    tab_paths: TabPaths
+    pen_color: QColor
+        Ignored by DXF.
+    profile: RenderProfile
+    workers: int
+    """
+    if output_format(path) == "dxf":
+        write_dxf(path, width, height, tab_paths, profile, workers)
+    else:
+        write_svg(path, width, height, tab_paths, pen_color, profile, workers)
+
+
+def write_outputs(paths, image, tab_paths, pen_color, options=None, workers=None, profile=FINAL):
+    """
+    Write every output at once and return the time, in seconds, of each one.
+
+    The raster outputs encode `image`, the SVG and DXF outputs draw `tab_paths` with the
+     size of `image` divided by `profile.scale`, the size of the jigsaw.
+
+    Parameters
+    ----------
+    paths: List[str]
+        Paths of the outputs, their format is given by the extension.
+    image: QImage
+        The rendered jigsaw, shared by all the raster outputs.
+    tab_paths: TabPaths
+    pen_color: QColor
+    options: OutputOptions
+    workers: int
+        Number of threads, see `concurrent.futures.ThreadPoolExecutor`.
+    profile: RenderProfile
+        Profile used to render `image`.
+    """
+    width = int(round(image.width()/profile.scale))
+    height = int(round(image.height()/profile.scale))
+
+    def process(path):
+        begin = time.perf_counter()
+        if output_format(path) in VECTOR_FORMATS:
+            write_vector(path, width, height, tab_paths, pen_color, profile)
+        else:
+            write_image(image, path, options)
+        return time.perf_counter() - begin
+
+    with ThreadPoolExecutor(max_workers=workers or len(paths) or None) as executor:
+        return list(executor.map(process, paths))
+
+
+class WriteOutputsSignals(QObject):
+    """
+    Signals emitted by `WriteOutputsTask`.
+
+    `rendered` carries the base image and the rendered image, when the task
+     rendered them, `finished` the list of paths written, `failed` the message
+     of the error.
+    """
+
+    rendered = Signal(object, object)
+    finished = Signal(object)
+    failed = Signal(str)
+
+
+class WriteOutputsTask(QRunnable):
+    """
+    Call `write_outputs` on a `QThreadPool`.
+
+    If `image` is `None`, the jigsaw is first rendered, with `render_jigsaw`, over
+     `base`, decoded with `read_image` when it is a path. A SVG base is rendered
+     straight at the resolution of the output, the size of the jigsaw times
+     `profile.scale`.
+
+    Attributes
+    ----------
+    paths: List[str]
+
+    image: QImage
+        The rendered jigsaw, `None` to render it on the task.
+
+    base: QImage or str
+        The image under the jigsaw, or its path, used when `image` is `None`.
+
+    backend: str
+        Backend of `render_jigsaw`.
+
+    tab_paths: TabPaths
+
+    pen_color: QColor
+
+    options: OutputOptions
+
+    profile: RenderProfile
+
+    signals: WriteOutputsSignals
+    """
+
+    def __init__(self, paths, image, tab_paths, pen_color, options=None, profile=FINAL, base=None,
+                 backend="Qt"):
+        super(WriteOutputsTask, self).__init__()
+        self.paths = list(paths)
+        self.image = image
+        self.base = base
+        self.backend = backend
+        self.tab_paths = tab_paths
+        self.pen_color = QColor(pen_color)
+        self.options = options
+        self.profile = profile
+        self.signals = WriteOutputsSignals()
+
+    def run(self):
+        try:
+            image = self.image
+            if image is None:
+                base, size = self.base, None
+                if isinstance(base, str) and is_vector(base):
+                    size = image_size(base)
+                    size = size.width(), size.height()
+                    base = read_image(base, (max(int(round(size[0]*self.profile.scale)), 1),
+                                             max(int(round(size[1]*self.profile.scale)), 1)))
+                elif isinstance(base, str):
+                    base = read_image(base)
+                image = render_jigsaw(base, self.tab_paths, self.pen_color, self.backend, self.profile,
+                                      size)
+                self.signals.rendered.emit(base, image)
+            write_outputs(self.paths, image, self.tab_paths, self.pen_color, self.options,
+                          profile=self.profile)
+        except Exception as error:
+            # Any error of the encoders must reach `failed`, so the task is released
+            self.signals.failed.emit(str(error) or repr(error))
+            return
+        self.signals.finished.emit(self.paths)
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+    from jigsaw_generator_core import JigsawGeneratorCore
+    from jigsaw_generator_geometry import generate_tab_paths
+
+    parser = argparse.ArgumentParser(description="Write the jigsaw on several files at once.")
+    parser.add_argument("image", help="path of the base image")
+    parser.add_argument("outputs", nargs="+", help="paths of the outputs, e.g. out.png out.jpg out.svg out.dxf")
+    parser.add_argument("--grid", type=parse_size, default=(10, 10), help="number of pieces, e.g. 40x30")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--color", default="white")
+    parser.add_argument("--backend", choices=["Qt", "NumPy"], default="Qt")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="Final")
+    parser.add_argument("--png-compression", type=int, default=-1, help="from 0 to 9")
+    parser.add_argument("--jpeg-quality", type=int, default=-1, help="from 0 to 100")
+    parser.add_argument("--progressive", action="store_true", help="write progressive JPEG images")
+    parser.add_argument("--optimized", action="store_true", help="optimize the JPEG Huffman tables")
+    parser.add_argument("--workers", type=int, default=None)
+    arguments = parser.parse_args()
+
+    base = read_image(arguments.image)
+    core = JigsawGeneratorCore(list(arguments.grid))
+    core.generate_random(arguments.seed)
+    paths = generate_tab_paths(core, float(base.width())/arguments.grid[0],
+                               float(base.height())/arguments.grid[1],
+                               arguments.patterns.split(","), arguments.smooth_factor)
+    color = QColor(arguments.color)
+    profile = PROFILES[arguments.profile]
+    rendered = render_jigsaw(base, paths, color, arguments.backend, profile)
+
+    begin = time.perf_counter()
+    times = write_outputs(
+        arguments.outputs, rendered, paths, color,
+        OutputOptions(arguments.png_compression, arguments.jpeg_quality,
+                      arguments.progressive, arguments.optimized),
+        arguments.workers, profile
+    )
+    elapsed = time.perf_counter() - begin
+
+    for path, seconds in zip(arguments.outputs, times):
+        print("{:<40} {:8.4f} s {:12d} bytes".format(path, seconds, os.path.getsize(path)))
+    print("{} outputs in {:.4f} s".format(len(arguments.outputs), elapsed))
@@ -0,0 +1,468 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module patterns.
+
+Contains the registry of the patterns of the masculine borders. Each pattern
+ designs a whole batch of borders at once: it receives the random values of each
+ border and returns the segments of their paths, on the frame of the border.
+
+The frame of a border has the coordinate `u` along the border, from its first to
+ its last point, and the coordinate `v` towards the outside of the cell, both in
+ pixels. A new shape is added by registering a `Pattern`:
+```
+register_pattern(PolygonPattern("Zigzag", [((.3, .4), (.1, .2)), ((.6, .7), (-.1, -.2))]))
+```
+"""
+import math
+
+import numpy
+
+LINE = 1
+QUAD = 2
+CUBIC = 3
+
+# Distance, in pixels, of the ends of the lines of the smoothed corners
+SMOOTH_DISTANCE = 10.0
+
+
+def line_controls(start, end):
+    """
+    Return the control points of cubic curves equivalent to lines.
+
+    Parameters
+    ----------
+    start: numpy.ndarray
+        Array of shape `(..., 2)`.
+    end: numpy.ndarray
+        Array of shape `(..., 2)`.
+    """
+    return numpy.stack([start + (end - start)/3.0, start + 2.0*(end - start)/3.0, end], axis=-2)
+
+
+def quad_controls(start, control, end):
+    """
+    Return the control points of cubic curves equivalent to quadratic curves.
+
+    Parameters
+    ----------
+    start: numpy.ndarray
+        Array of shape `(..., 2)`.
+    control: numpy.ndarray
+        Array of shape `(..., 2)`.
+    end: numpy.ndarray
+        Array of shape `(..., 2)`.
+    """
+    return numpy.stack([start + 2.0*(control - start)/3.0, end + 2.0*(control - end)/3.0, end],
+                       axis=-2)
+
+
+def polyline_segments(points):
+    """
+    Return the segments `(kinds, controls)` of the polylines through `points`.
+
+    Parameters
+    ----------
+    points: numpy.ndarray
+        Array of shape `(E, P, 2)`, the points of each polyline.
+    """
+    kinds = numpy.full(points.shape[1] - 1, LINE, dtype=numpy.int8)
+    return kinds, line_controls(points[:, :-1], points[:, 1:])
+
+
+def smoothed_segments(factor, points):
+    """
+    Return the segments `(kinds, controls)` of the smoothed paths through `points`.
+
+    It is the algorithm of `smoothed_path.smoothed_path` applied at once to paths
+     with the same number of points: each inner corner becomes a quadratic curve
+     between two lines. The points closer than `factor` to the previous one must
+     already be removed, see `smoothed_groups`.
+
+    Parameters
+    ----------
+    factor: float
+        Smooth factor.
+
+    points: numpy.ndarray
+        Array of shape `(E, P, 2)`, with `P >= 3`.
+    """
+    following = numpy.concatenate([points[:, 1:], points[:, -1:]], axis=1)
+    distance = numpy.hypot(*numpy.moveaxis(following - points, -1, 0))
+    with numpy.errstate(divide="ignore"):
+        ratio = numpy.where(distance == 0, .5, numpy.minimum(SMOOTH_DISTANCE/distance, .5))[..., None]
+    line_start = (1.0 - ratio)*points + ratio*following
+    line_end = ratio*points + (1.0 - ratio)*following
+
+    count = points.shape[1]
+    kinds = numpy.tile(numpy.array([QUAD, LINE], dtype=numpy.int8), count)
+    kinds[0] = LINE
+
+    # Each point gives a line (the first one) or a curve to `line_start`, and a
+    #  line to `line_end`
+    previous = numpy.concatenate([points[:, :1], line_end[:, :-1]], axis=1)
+    curve = numpy.where((numpy.arange(count) == 0)[None, :, None, None],
+                        line_controls(previous, line_start),
+                        quad_controls(previous, points, line_start))
+    line = line_controls(line_start, line_end)
+
+    controls = numpy.stack([curve, line], axis=2).reshape((len(points), 2*count, 3, 2))
+    return kinds, controls
+
+
+def smoothed_groups(factor, points):
+    """
+    Return the smoothed paths through `points` as a list of `(rows, kinds, controls)`.
+
+    Like `smoothed_path.smoothed_path`, the inner points closer than `factor` to
+     the last point kept are skipped, so the paths may have different numbers of
+     points; the paths that keep the same points are computed together.
+
+    Parameters
+    ----------
+    factor: float
+        Smooth factor.
+
+    points: numpy.ndarray
+        Array of shape `(E, P, 2)`.
+    """
+    count = points.shape[1]
+    keep = numpy.ones(points.shape[:2], dtype=bool)
+    last = points[:, 0]
+    kept = numpy.ones(len(points), dtype=numpy.int64)
+
+    for i in range(1, count):
+        skip = (kept > 1) & (i < count - 2) & (numpy.hypot(*(last - points[:, i]).T) < factor)
+        keep[:, i] = ~skip
+        last = numpy.where(skip[:, None], last, points[:, i])
+        kept += ~skip
+
+    groups = list()
+    masks, inverse = numpy.unique(keep, axis=0, return_inverse=True)
+    for index, mask in enumerate(masks):
+        rows = numpy.flatnonzero(inverse.ravel() == index)
+        if numpy.count_nonzero(mask) < 3:
+            # As `smoothed_path`, a path of less than three points is not drawn
+            groups.append((rows, numpy.zeros(0, dtype=numpy.int8), numpy.zeros((len(rows), 0, 3, 2))))
+            continue
+        kinds, controls = smoothed_segments(factor, points[rows][:, mask])
+        groups.append((rows, kinds, controls))
+    return groups
+
+
+class Pattern:
+    """
+    Base class of the patterns of the masculine borders.
+
+    Attributes
+    ----------
+    name: str
+        Name used to select the pattern, e.g. on `JigsawGenerator.selected_patterns`.
+
+    draws: int
+        Number of random values used to design each border.
+    """
+
+    def __init__(self, name, draws):
+        self.name = name
+        self.draws = draws
+
+    def generate(self, uniforms, length, depth, smooth_factor):
+        """
+        Return the segments of a batch of borders as a list of `(rows, kinds, controls)`.
+
+        The borders `rows` (indices on the batch) have the segments of types
+         `kinds`, an array of shape `(K,)`, with the control points `controls`, an
+         array of shape `(len(rows), K, 3, 2)` on the frame of each border. The
+         paths start at `(0, 0)` and must end at `(length, 0)`.
+
+        Parameters
+        ----------
+        self: Pattern
+            Instance of this class.
+
+        uniforms: numpy.ndarray
+            Array of shape `(E, draws)` with the random values of each border,
+             uniform on [0, 1).
+
+        length: numpy.ndarray
+            Array of shape `(E,)` with the length of each border.
+
+        depth: numpy.ndarray
+            Array of shape `(E,)` with the size of the cell towards the outside.
+
+        smooth_factor: float
+        """
+        raise NotImplementedError
+
+
+class PolygonPattern(Pattern):
+    """
+    Pattern of straight lines through random points, optionally smoothed.
+
+    Attributes
+    ----------
+    template: List[Tuple[Tuple[float, float], Tuple[float, float]]]
+        For each inner point, the ranges of `u` and of `v` relative to the size of
+         the cell.
+
+    rounded: bool
+        Whether the corners are smoothed, see `smoothed_groups`.
+    """
+
+    def __init__(self, name, template, rounded=False):
+        super(PolygonPattern, self).__init__(name, 2*len(template))
+        self.template = template
+        self.rounded = rounded
+
+    def points(self, uniforms, length, depth):
+        """
+        Return the points `(E, P, 2)` of the borders, on their frames.
+
+        Parameters
+        ----------
+        self: PolygonPattern
+            Instance of this class.
+        uniforms: numpy.ndarray
+        length: numpy.ndarray
+        depth: numpy.ndarray
+        """
+        ranges = numpy.array(self.template, dtype=numpy.float64)
+        low, high = ranges[:, :, 0], ranges[:, :, 1]
+        relative = low + (high - low)*uniforms.reshape((len(uniforms), len(self.template), 2))
+        inner = relative*numpy.stack([length, depth], axis=1)[:, None, :]
+
+        first = numpy.zeros((len(uniforms), 1, 2))
+        last = numpy.stack([length, numpy.zeros_like(length)], axis=1)[:, None, :]
+        return numpy.concatenate([first, inner, last], axis=1)
+
+    def generate(self, uniforms, length, depth, smooth_factor):
+        points = self.points(uniforms, length, depth)
+        if self.rounded:
+            return smoothed_groups(smooth_factor, points)
+        kinds, controls = polyline_segments(points)
+        return [(numpy.arange(len(points)), kinds, controls)]
+
+
+class CirclePattern(Pattern):
+    """
+    Pattern of a round knob on a neck.
+
+    The path goes straight to the neck, `B` and `C`, follows an elliptical arc
+     of more than half a turn to `D` and goes back down by `E`:
+    ```
+                .---.
+              /       \\
+              \\       /
+             C `|   |' D
+                |   |
+    ____________|   |____________
+    |           B   E           |
+    A                           F
+    ```
+
+    Attributes
+    ----------
+    neck: Tuple[Tuple[float, float], Tuple[float, float]]
+        Ranges of `u` of `B` and of `E`, relative to the length of the border.
+
+    base: Tuple[float, float]
+        Range of `v` of `B` and `E`, relative to the size of the cell.
+
+    height: Tuple[float, float]
+        Range of `v` of `C` and `D`.
+
+    radius: Tuple[Tuple[float, float], Tuple[float, float]]
+        Ranges of the radii of the ellipse, along and across the border.
+    """
+
+    def __init__(self, name, neck=((.38, .42), (.58, .62)), base=(-.03, .03), height=(.04, .08),
+                 radius=((.12, .15), (.08, .11))):
+        super(CirclePattern, self).__init__(name, 8)
+        self.neck = neck
+        self.base = base
+        self.height = height
+        self.radius = radius
+
+    def generate(self, uniforms, length, depth, smooth_factor):
+        def draw(index, value_range):
+            return value_range[0] + (value_range[1] - value_range[0])*uniforms[:, index]
+
+        b, e = draw(0, self.neck[0])*length, draw(1, self.neck[1])*length
+        vb, ve = draw(2, self.base)*depth, draw(3, self.base)*depth
+        vc, vd = draw(4, self.height)*depth, draw(5, self.height)*depth
+        rx, ry = draw(6, self.radius[0])*length, draw(7, self.radius[1])*depth
+
+        # The ends of the neck are on the ellipse, the arc goes around its far side
+        rx = numpy.maximum(rx, (e - b)/2.0)
+        beta = numpy.arccos(numpy.clip((e - b)/(2.0*rx), -1., 1.))
+        center = numpy.stack([(b + e)/2.0, (vc + vd)/2.0 + ry*numpy.sin(beta)], axis=1)
+
+        zero = numpy.zeros_like(length)
+        points = numpy.stack([
+            numpy.stack([zero, zero], axis=1), numpy.stack([b, vb], axis=1),
+            numpy.stack([b, vc], axis=1),
+        ], axis=1)
+        tail = numpy.stack([
+            numpy.stack([e, vd], axis=1), numpy.stack([e, ve], axis=1),
+            numpy.stack([length, zero], axis=1),
+        ], axis=1)
+
+        # Four cubic curves, each one of less than a quarter of turn
+        steps = 4
+        angles = (math.pi + beta)[:, None] - (math.pi + 2.0*beta)[:, None]*numpy.arange(steps + 1)/steps
+        radii = numpy.stack([rx, ry], axis=1)[:, None, :]
+        arc = center[:, None, :] + radii*numpy.stack([numpy.cos(angles), numpy.sin(angles)], axis=2)
+        tangent = radii*numpy.stack([-numpy.sin(angles), numpy.cos(angles)], axis=2)
+        delta = (angles[:, 1:] - angles[:, :-1])[..., None]
+        handle = 4.0/3.0*numpy.tan(delta/4.0)
+        arc_controls = numpy.stack([arc[:, :-1] + handle*tangent[:, :-1],
+                                    arc[:, 1:] - handle*tangent[:, 1:], arc[:, 1:]], axis=2)
+
+        # The arc starts at `C` and ends at `D`, up to rounding errors
+        arc_controls[:, -1, 2] = tail[:, 0]
+        arc_controls[:, -1, 1] += tail[:, 0] - arc[:, -1]
+        arc_controls[:, 0, 0] += points[:, -1] - arc[:, 0]
+
+        head_kinds, head_controls = polyline_segments(points)
+        tail_kinds, tail_controls = polyline_segments(tail)
+        kinds = numpy.concatenate([head_kinds, numpy.full(steps, CUBIC, dtype=numpy.int8), tail_kinds])
+        controls = numpy.concatenate([head_controls, arc_controls, tail_controls], axis=1)
+        return [(numpy.arange(len(length)), kinds, controls)]
+
+
+class KnobPattern(Pattern):
+    """
+    Pattern of the classic knob, made by three cubic Bézier curves.
+
+    The template has the control points of the curves `A -> C`, `C -> D` and
+     `D -> F` as functions of the size `t` of the knob and of the jitters `a` to
+     `e`, so a border is three `cubicTo` (or three SVG `C` commands), against the
+     twelve segments of the rounded patterns:
+    ```
+               P4 ___ P5
+                /     \\
+            C  (       )  D
+                \\_   _/
+    ______________| |______________
+    A           P2   P7            F
+    ```
+
+    Attributes
+    ----------
+    size: Tuple[float, float]
+        Range of `t`, relative to the size of the cell. The knob reaches `3*t`.
+
+    jitter: float
+        The jitters are on the interval [-jitter, jitter).
+    """
+
+    def __init__(self, name, size=(.08, .1), jitter=.03):
+        super(KnobPattern, self).__init__(name, 6)
+        self.size = size
+        self.jitter = jitter
+
+    def generate(self, uniforms, length, depth, smooth_factor):
+        t = self.size[0] + (self.size[1] - self.size[0])*uniforms[:, 0]
+        a, b, c, d, e = (self.jitter*(2.0*uniforms[:, 1:] - 1.0)).T
+
+        template = numpy.stack([
+            numpy.stack([numpy.full_like(t, .2), a], axis=1),
+            numpy.stack([.5 + b + d, c - t], axis=1),
+            numpy.stack([.5 + b - t, c + t], axis=1),
+            numpy.stack([.5 + b - d - 2.0*t, c + 3.0*t], axis=1),
+            numpy.stack([.5 + b - d + 2.0*t, c + 3.0*t], axis=1),
+            numpy.stack([.5 + b + t, c + t], axis=1),
+            numpy.stack([.5 + b + d, c - t], axis=1),
+            numpy.stack([numpy.full_like(t, .8), e], axis=1),
+            numpy.stack([numpy.ones_like(t), numpy.zeros_like(t)], axis=1),
+        ], axis=1)
+        controls = template*numpy.stack([length, depth], axis=1)[:, None, :]
+
+        kinds = numpy.full(3, CUBIC, dtype=numpy.int8)
+        return [(numpy.arange(len(length)), kinds, controls.reshape((len(length), 3, 3, 2)))]
+
+
+# Inner points of the polygon patterns, see `PolygonPattern.template`.
+#
+# Triangle:
+#          C  ---*
+#               / \
+#              /   \
+#             /     \
+# ___________/       \___________
+# |          |       |          |
+# A          B       D          E
+#
+# Square:
+#         C * ________ * D
+#            |       |
+#            |       |
+#            |       |
+# ___________|       |___________
+# |          |       |          |
+# A          B       E          F
+TRIANGLE = [
+    ((.3, .45), (-.05, .05)),
+    ((.4, .6), (.15, .25)),
+    ((.55, .7), (-.05, .05)),
+]
+SQUARE = [
+    ((.30, .40), (-.05, .05)),
+    ((.25, .35), (.15, .25)),
+    ((.65, .75), (.15, .25)),
+    ((.60, .70), (-.05, .05)),
+]
+
+PATTERNS = dict()
+
+
+def register_pattern(pattern):
+    """
+    Add a pattern to the registry, replacing any pattern of the same name.
+
+    Parameters
+    ----------
+    pattern: Pattern
+    """
+    PATTERNS[pattern.name] = pattern
+    return pattern
+
+
+def get_pattern(pattern):
+    """
+    Return the registered `Pattern` of the given name, or `pattern` itself if it is a `Pattern`.
+
+    Parameters
+    ----------
+    pattern: str or Pattern
+    """
+    if isinstance(pattern, Pattern):
+        return pattern
+    if pattern not in PATTERNS:
+        raise ValueError("Unknown pattern {}, use one of {}".format(pattern, ", ".join(PATTERNS)))
+    return PATTERNS[pattern]
+
+
+register_pattern(PolygonPattern("Triangle", TRIANGLE))
+register_pattern(PolygonPattern("Triangle Rounded", TRIANGLE, rounded=True))
+register_pattern(PolygonPattern("Square", SQUARE))
+register_pattern(PolygonPattern("Square Rounded", SQUARE, rounded=True))
+register_pattern(CirclePattern("Circle"))
+register_pattern(KnobPattern("Knob"))
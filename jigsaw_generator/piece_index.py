@@ -0,0 +1,430 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module piece_index.
+
+Contains the class PieceIndex, a columnar description of every piece of a jigsaw
+ that answers which piece is under a point and which pieces meet a rectangle.
+
+Example:
+```
+cd jigsaw_generator
+python piece_index.py pieces.npz --size 4000x3000 --grid 80x60 --seed 1
+```
+"""
+import argparse
+import json
+import math
+import os
+import time
+
+import numpy
+
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+
+DOWN = JigsawGeneratorCore.WhichBorder.DOWN.value
+UP = JigsawGeneratorCore.WhichBorder.UP.value
+LEFT = JigsawGeneratorCore.WhichBorder.LEFT.value
+RIGHT = JigsawGeneratorCore.WhichBorder.RIGHT.value
+FEMININE = JigsawGeneratorCore.BorderType.FEMININE.value
+MASCULINE = JigsawGeneratorCore.BorderType.MASCULINE.value
+
+# Columns of `PieceIndex` written by `PieceIndex.save`
+COLUMNS = ("cell", "bounds", "sides", "neighbors", "edges")
+
+
+def point_in_polygon(point, vertices):
+    """
+    Return `True` if the point is inside the closed polygon of the given vertices.
+
+    Parameters
+    ----------
+    point: Tuple[float, float]
+    vertices: numpy.ndarray
+        Array of shape `(M, 2)`, the last vertex is connected to the first one.
+    """
+    x, y = point
+    a, b = vertices, numpy.roll(vertices, -1, axis=0)
+    crossing = (a[:, 1] > y) != (b[:, 1] > y)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        at = a[:, 0] + (y - a[:, 1])*(b[:, 0] - a[:, 0])/(b[:, 1] - a[:, 1])
+    return bool(numpy.count_nonzero(crossing & (x < at)) % 2)
+
+
+class PieceIndex:
+    """
+    Per piece description of a jigsaw, stored as columns.
+
+    The piece `(i, j)` has the identifier `i*y + j`, the same order of
+     `JigsawGeneratorCore.matrix.ravel()`. The sides of each piece are indexed by
+     the values of `JigsawGeneratorCore.WhichBorder`.
+
+    Attributes
+    ----------
+    shape: Tuple[int, int]
+        Number of columns `x` and rows `y` of the jigsaw.
+
+    cell_width: float
+
+    cell_height: float
+
+    cell: numpy.ndarray
+        Array of shape `(N, 2)` with the coordinates `[i, j]` of each piece.
+
+    bounds: numpy.ndarray
+        Array of shape `(N, 4)` with the box `[x0, y0, x1, y1]` of each piece,
+         including its masculine borders. The box of a border contains all its
+         control points, so it may be a little larger than the border.
+
+    sides: numpy.ndarray
+        Array of shape `(N, 4)` with the value of the `BorderType` of each side.
+
+    neighbors: numpy.ndarray
+        Array of shape `(N, 4)` with the identifier of the neighbor on each side,
+         or -1 on the frame.
+
+    edges: numpy.ndarray
+        Array of shape `(N, 4)` with the index of the border of each side (see
+         `JigsawGeneratorCore.edge_index`), or -1 on the frame.
+
+    tab_paths: TabPaths
+        Paths of the masculine borders, used to test the points near the sides,
+         `None` if only the cells are known.
+
+    tolerance: float
+        Maximum error of the borders flattened to test the points.
+
+    margin: float
+        Largest distance that a piece reaches outside its cell.
+    """
+
+    def __init__(self, shape, cell_width, cell_height, cell, bounds, sides, neighbors, edges,
+                 tab_paths=None, tolerance=.01):
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.cell_width = float(cell_width)
+        self.cell_height = float(cell_height)
+        self.cell = cell
+        self.bounds = bounds
+        self.sides = sides
+        self.neighbors = neighbors
+        self.edges = edges
+        self.tab_paths = tab_paths
+        self.tolerance = tolerance*min(self.cell_width, self.cell_height)
+
+        x0, y0 = cell[:, 0]*self.cell_width, cell[:, 1]*self.cell_height
+        self.margin = float(max(
+            numpy.max(x0 - bounds[:, 0], initial=0.), numpy.max(y0 - bounds[:, 1], initial=0.),
+            numpy.max(bounds[:, 2] - x0 - self.cell_width, initial=0.),
+            numpy.max(bounds[:, 3] - y0 - self.cell_height, initial=0.)
+        ))
+
+        self._edge_path, self._tab_boxes = None, None
+        if tab_paths is not None:
+            edge_count = max(int(edges.max(initial=-1)), int(tab_paths.edge.max(initial=-1))) + 1
+            self._edge_path = numpy.full(edge_count, -1, dtype=numpy.int64)
+            self._edge_path[tab_paths.edge] = numpy.arange(len(tab_paths))
+            self._tab_boxes = tab_paths.bounding_boxes()
+
+    def __len__(self):
+        return len(self.cell)
+
+    @staticmethod
+    def build(core, tab_paths, cell_width, cell_height):
+        """
+        Return the `PieceIndex` of a jigsaw, computed at once for all the pieces.
+
+        Parameters
+        ----------
+        core: JigsawGeneratorCore
+            The jigsaw, only its shape, `seed` and `revisions` are used.
+
+        tab_paths: TabPaths
+            Paths of all the masculine borders of `core`.
+
+        cell_width: float
+            Indicates the width of each cell.
+
+        cell_height: float
+            Indicates the height of each cell.
+        """
+        x, y = core.shape
+        identifiers = numpy.arange(x*y, dtype=numpy.int64).reshape((x, y))
+        horizontal, vertical = core.edge_polarities()
+        edge_count = core.horizontal_edge_count()
+
+        sides = numpy.zeros((x, y, 4), dtype=numpy.int8)
+        sides[:, :-1, DOWN] = horizontal
+        sides[:, 1:, UP] = -horizontal
+        sides[:-1, :, RIGHT] = vertical
+        sides[1:, :, LEFT] = -vertical
+
+        neighbors = numpy.full((x, y, 4), -1, dtype=numpy.int64)
+        neighbors[:, :-1, DOWN] = identifiers[:, 1:]
+        neighbors[:, 1:, UP] = identifiers[:, :-1]
+        neighbors[:-1, :, RIGHT] = identifiers[1:, :]
+        neighbors[1:, :, LEFT] = identifiers[:-1, :]
+
+        edges = numpy.full((x, y, 4), -1, dtype=numpy.int64)
+        down = numpy.arange(edge_count, dtype=numpy.int64).reshape((x, max(y - 1, 0)))
+        right = edge_count + numpy.arange((x - 1)*y, dtype=numpy.int64).reshape((max(x - 1, 0), y))
+        edges[:, :-1, DOWN] = down
+        edges[:, 1:, UP] = down
+        edges[:-1, :, RIGHT] = right
+        edges[1:, :, LEFT] = right
+
+        i, j = numpy.divmod(identifiers.ravel(), y)
+        cell = numpy.stack([i, j], axis=1)
+        bounds = numpy.stack([i*cell_width, j*cell_height,
+                              (i + 1)*cell_width, (j + 1)*cell_height], axis=1).astype(numpy.float64)
+
+        if len(tab_paths):
+            owner = tab_paths.cell[:, 0]*y + tab_paths.cell[:, 1]
+            boxes = tab_paths.bounding_boxes()
+            numpy.minimum.at(bounds[:, 0], owner, boxes[:, 0])
+            numpy.minimum.at(bounds[:, 1], owner, boxes[:, 1])
+            numpy.maximum.at(bounds[:, 2], owner, boxes[:, 2])
+            numpy.maximum.at(bounds[:, 3], owner, boxes[:, 3])
+
+        return PieceIndex((x, y), cell_width, cell_height, cell, bounds, sides.reshape((-1, 4)),
+                          neighbors.reshape((-1, 4)), edges.reshape((-1, 4)), tab_paths)
+
+    def edge_pieces(self, edges):
+        """
+        Return the identifiers of the pieces that share the given borders.
+
+        Parameters
+        ----------
+        self: PieceIndex
+            Instance of this class.
+        edges: numpy.ndarray
+            Indices of the borders, see `JigsawGeneratorCore.edge_index`.
+        """
+        x, y = self.shape
+        edges = numpy.asarray(edges, dtype=numpy.int64)
+        horizontal_count = x*max(y - 1, 0)
+        horizontal = edges < horizontal_count
+
+        i, j = numpy.divmod(numpy.where(horizontal, edges, edges - horizontal_count),
+                            numpy.where(horizontal, max(y - 1, 1), y))
+        first = i*y + j
+        second = numpy.where(horizontal, first + 1, first + y)
+        return numpy.unique(numpy.concatenate([first, second]))
+
+    def update_edges(self, tab_paths, edges):
+        """
+        Update the sides and the bounds of the pieces of the given borders, after they changed.
+
+        Only the pieces that share the borders are computed again. Every other
+         path of `tab_paths` must be at the same position as on the previous
+         `tab_paths`, as `local_reroll.reroll_edges` does.
+
+        Parameters
+        ----------
+        self: PieceIndex
+            Instance of this class.
+        tab_paths: TabPaths
+            Paths of all the masculine borders.
+        edges: numpy.ndarray
+            Indices of the borders that changed.
+        """
+        x, y = self.shape
+        pieces = self.edge_pieces(edges)
+        self.tab_paths = tab_paths
+        if self._edge_path is None:
+            return
+
+        paths = self._edge_path[numpy.asarray(edges, dtype=numpy.int64)]
+        self._tab_boxes[paths] = tab_paths.select(paths).bounding_boxes()
+
+        side_paths = numpy.where(self.edges[pieces] >= 0, self._edge_path[self.edges[pieces]], -1)
+        valid = side_paths >= 0
+        owner = tab_paths.cell[side_paths, 0]*y + tab_paths.cell[side_paths, 1]
+        owned = valid & (owner == pieces[:, None])
+        self.sides[pieces] = numpy.where(valid, numpy.where(owned, MASCULINE, FEMININE),
+                                         self.sides[pieces])
+
+        i, j = self.cell[pieces, 0], self.cell[pieces, 1]
+        bounds = numpy.stack([i*self.cell_width, j*self.cell_height,
+                              (i + 1)*self.cell_width, (j + 1)*self.cell_height], axis=1)
+        boxes = self._tab_boxes[side_paths]
+        for column, function in enumerate((numpy.min, numpy.min, numpy.max, numpy.max)):
+            candidates = numpy.where(owned, boxes[..., column], bounds[:, column, None])
+            bounds[:, column] = function(numpy.concatenate([candidates, bounds[:, column, None]], axis=1),
+                                         axis=1)
+        self.bounds[pieces] = bounds
+
+        self.margin = float(max(
+            self.margin, numpy.max(i*self.cell_width - bounds[:, 0], initial=0.),
+            numpy.max(j*self.cell_height - bounds[:, 1], initial=0.),
+            numpy.max(bounds[:, 2] - (i + 1)*self.cell_width, initial=0.),
+            numpy.max(bounds[:, 3] - (j + 1)*self.cell_height, initial=0.)
+        ))
+
+    def piece_at(self, point):
+        """
+        Return the identifier of the piece under the point, or -1 if it is outside the jigsaw.
+
+        The point is on the cell given by its coordinates, unless it is between a
+         side of that cell and the straight border: a feminine side is the
+         masculine border of the neighbor that enters the cell, and a masculine
+         side may also bend into the cell, leaving that area to the neighbor. So
+         the four sides of the cell are tested, with an even-odd test of each path
+         closed by its straight border.
+
+        Parameters
+        ----------
+        self: PieceIndex
+            Instance of this class.
+        point: Tuple[float, float]
+        """
+        x, y = self.shape
+        i = int(math.floor(point[0]/self.cell_width))
+        j = int(math.floor(point[1]/self.cell_height))
+        if not (0 <= i < x and 0 <= j < y):
+            return -1
+
+        identifier = i*y + j
+        if self.tab_paths is None:
+            return identifier
+
+        for side in numpy.flatnonzero(self.edges[identifier] >= 0):
+            path = self._edge_path[self.edges[identifier, side]]
+            if path < 0:
+                continue
+            box = self._tab_boxes[path]
+            if not (box[0] <= point[0] <= box[2] and box[1] <= point[1] <= box[3]):
+                continue
+            vertices, offsets = self.tab_paths.select([path]).flatten(self.tolerance)
+            if point_in_polygon(point, vertices):
+                return int(self.neighbors[identifier, side])
+
+        return identifier
+
+    def query(self, box):
+        """
+        Return the identifiers of the pieces whose bounds intersect the box `[x0, y0, x1, y1]`.
+
+        Only the cells that the box, grown by `margin`, covers are tested.
+
+        Parameters
+        ----------
+        self: PieceIndex
+            Instance of this class.
+        box: Tuple[float, float, float, float]
+        """
+        x, y = self.shape
+        i0 = max(int(math.floor((box[0] - self.margin)/self.cell_width)), 0)
+        j0 = max(int(math.floor((box[1] - self.margin)/self.cell_height)), 0)
+        i1 = min(int(math.floor((box[2] + self.margin)/self.cell_width)), x - 1)
+        j1 = min(int(math.floor((box[3] + self.margin)/self.cell_height)), y - 1)
+        if i0 > i1 or j0 > j1:
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        i, j = numpy.meshgrid(numpy.arange(i0, i1 + 1), numpy.arange(j0, j1 + 1), indexing="ij")
+        candidates = (i*y + j).ravel()
+        bounds = self.bounds[candidates]
+        keep = ((bounds[:, 0] <= box[2]) & (bounds[:, 2] >= box[0])
+                & (bounds[:, 1] <= box[3]) & (bounds[:, 3] >= box[1]))
+        return candidates[keep]
+
+    def path_query(self, box):
+        """
+        Return the indices on `tab_paths` of the paths of the pieces that intersect the box.
+
+        Every path that intersects the box is on the result, since the bounds of
+         a piece contain its masculine borders.
+
+        Parameters
+        ----------
+        self: PieceIndex
+            Instance of this class.
+        box: Tuple[float, float, float, float]
+        """
+        edges = self.edges[self.query(box)].ravel()
+        paths = self._edge_path[edges[edges >= 0]]
+        return numpy.unique(paths[paths >= 0])
+
+    def save(self, path):
+        """
+        Write the columns of the index on a ".json" or on a ".npz" file.
+
+        Parameters
+        ----------
+        self: PieceIndex
+            Instance of this class.
+        path: str
+        """
+        header = {"shape": list(self.shape), "cell_width": self.cell_width,
+                  "cell_height": self.cell_height}
+
+        if os.path.splitext(path)[1].lower() == ".npz":
+            numpy.savez_compressed(path, header=json.dumps(header),
+                                   **{name: getattr(self, name) for name in COLUMNS})
+            return
+
+        header.update({name: getattr(self, name).tolist() for name in COLUMNS})
+        with open(path, "w") as index_file:
+            json.dump(header, index_file)
+
+    @staticmethod
+    def load(path):
+        """
+        Read an index written by `save`, without its `tab_paths`.
+
+        Parameters
+        ----------
+        path: str
+        """
+        if os.path.splitext(path)[1].lower() == ".npz":
+            with numpy.load(path) as data:
+                header = json.loads(str(data["header"]))
+                columns = {name: data[name] for name in COLUMNS}
+        else:
+            with open(path) as index_file:
+                header = json.load(index_file)
+            columns = {name: numpy.asarray(header[name]) for name in COLUMNS}
+
+        return PieceIndex(header["shape"], header["cell_width"], header["cell_height"], **columns)
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+
+    parser = argparse.ArgumentParser(description="Write the piece index of a jigsaw.")
+    parser.add_argument("output", help="path of the .json or .npz file")
+    parser.add_argument("--size", type=parse_size, default=(4000, 3000),
+                        help="size of the image in pixels, e.g. 4000x3000")
+    parser.add_argument("--grid", type=parse_size, default=(10, 10), help="number of pieces, e.g. 40x30")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    arguments = parser.parse_args()
+
+    core = JigsawGeneratorCore(list(arguments.grid))
+    core.generate_random(arguments.seed)
+    width, height = float(arguments.size[0])/arguments.grid[0], float(arguments.size[1])/arguments.grid[1]
+    paths = generate_tab_paths(core, width, height, arguments.patterns.split(","), arguments.smooth_factor)
+
+    begin = time.perf_counter()
+    index = PieceIndex.build(core, paths, width, height)
+    elapsed = time.perf_counter() - begin
+    index.save(arguments.output)
+    print("seed {}: {} pieces indexed in {:.4f} s".format(core.seed, len(index), elapsed))
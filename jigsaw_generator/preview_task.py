@@ -0,0 +1,126 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module preview_task.
+
+Contains the class PreviewTask, that computes the borders of the jigsaw on a
+ `QThreadPool` for the live preview of `JigsawGenerator`.
+"""
+from jigsaw_generator_info import Core
+
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+from tab_validator import validate_and_reroll
+
+QObject, QRunnable, Signal = Core.QObject, Core.QRunnable, Core.Signal
+
+
+class PreviewSignals(QObject):
+    """
+    Signals emitted by `PreviewTask`.
+
+    `finished` carries the generation of the task and a tuple
+     `(core, tab_paths, conflicts)`.
+    """
+
+    finished = Signal(int, object)
+
+
+class PreviewTask(QRunnable):
+    """
+    Compute the paths of the borders of a snapshot of the jigsaw.
+
+    The stages are the generation of a new jigsaw, when `shape` is given, the
+     paths of its borders and their validation. The task is cancelled as soon as
+     `is_current(generation)` returns `False`: it stops between stages and does
+     not emit its result.
+
+    Attributes
+    ----------
+    generation: int
+        Identifier of the request of this preview.
+
+    is_current: Callable[[int], bool]
+
+    core: JigsawGeneratorCore
+        Snapshot of the jigsaw, see `JigsawGeneratorCore.snapshot`, `None` when
+         `shape` is given.
+
+    cell_width: float
+
+    cell_height: float
+
+    patterns: List[str]
+
+    smooth_factor: float
+
+    validate_tabs: bool
+        Whether the overlapping borders are re-rolled.
+
+    shape: Tuple[int, int]
+        If given, the task generates a new jigsaw of this shape with a new seed:
+         creating its `matrix` loops over every cell, which is too slow for the
+         GUI thread on large grids.
+
+    signals: PreviewSignals
+    """
+
+    def __init__(self, generation, is_current, core, cell_width, cell_height, patterns,
+                 smooth_factor, validate_tabs, shape=None):
+        super(PreviewTask, self).__init__()
+        self.generation = generation
+        self.is_current = is_current
+        self.core = core
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.patterns = patterns
+        self.smooth_factor = smooth_factor
+        self.validate_tabs = validate_tabs
+        self.shape = shape
+        self.signals = PreviewSignals()
+
+    def run(self):
+        if not self.is_current(self.generation):
+            return
+
+        core = self.core
+        if self.shape is not None:
+            core = JigsawGeneratorCore(list(self.shape))
+            core.generate_random()
+            if not self.is_current(self.generation):
+                return
+
+        tab_paths = generate_tab_paths(
+            core, self.cell_width, self.cell_height, self.patterns, self.smooth_factor
+        )
+        conflicts = None
+        if self.validate_tabs:
+            if not self.is_current(self.generation):
+                return
+            # The matrix of a snapshot is shared with the GUI, the re-rolled
+            # borders are updated on it by `JigsawGenerator.SLOT_preview_finished`
+            tab_paths, conflicts = validate_and_reroll(
+                core, self.cell_width, self.cell_height, self.patterns,
+                self.smooth_factor, update_matrix=False, tab_paths=tab_paths
+            )
+            if self.shape is not None:
+                core.update_edges(list(core.revisions))
+
+        if self.is_current(self.generation):
+            self.signals.finished.emit(self.generation, (core, tab_paths, conflicts))
@@ -0,0 +1,55 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Auxiliar module that converts images between `QImage` and NumPy RGBA arrays.
+"""
+import numpy
+from jigsaw_generator_info import Gui
+
+QImage = Gui.QImage
+
+
+def qimage_to_array(image):
+    """
+    Return a copy of `image` as an array of shape `(height, width, 4)` in RGBA order.
+
+    Parameters
+    ----------
+    image: QImage
+    """
+    image = image.convertToFormat(QImage.Format_RGBA8888)
+    height, width = image.height(), image.width()
+    buffer = numpy.frombuffer(image.constBits(), dtype=numpy.uint8,
+                              count=image.bytesPerLine()*height)
+    return buffer.reshape((height, image.bytesPerLine()))[:, :4*width].reshape(
+        (height, width, 4)
+    ).copy()
+
+
+def array_to_qimage(array):
+    """
+    Return a `QImage` with a copy of the RGBA array of shape `(height, width, 4)`.
+
+    Parameters
+    ----------
+    array: numpy.ndarray
+    """
+    array = numpy.ascontiguousarray(array, dtype=numpy.uint8)
+    height, width = array.shape[0], array.shape[1]
+    return QImage(array.data, width, height, 4*width, QImage.Format_RGBA8888).copy()
@@ -0,0 +1,80 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module render_profile.
+
+Contains the class RenderProfile and the profiles "Draft", fast enough for the
+ interactive iteration, and "Final", with the full quality of the outputs.
+"""
+
+
+class RenderProfile:
+    """
+    Quality settings shared by the raster and the vector backends.
+
+    Attributes
+    ----------
+    name: str
+
+    antialias: bool
+        Whether the borders are antialiased.
+
+    smooth_transform: bool
+        Whether the image is scaled with a smooth filter.
+
+    tolerance: float
+        Maximum error, in pixels of the output, of the curves flattened into lines.
+
+    scale: float
+        Resolution of the raster outputs relative to the image.
+
+    native_curves: bool
+        Whether `QPainter` and the SVG draw the curves as curves; otherwise they
+         draw the lines flattened with `tolerance`, like the NumPy backend.
+    """
+
+    def __init__(self, name, antialias, smooth_transform, tolerance, scale, native_curves):
+        self.name = name
+        self.antialias = antialias
+        self.smooth_transform = smooth_transform
+        self.tolerance = tolerance
+        self.scale = scale
+        self.native_curves = native_curves
+
+
+DRAFT = RenderProfile("Draft", False, False, 2.0, .5, False)
+FINAL = RenderProfile("Final", True, True, .25, 1.0, True)
+
+PROFILES = {profile.name: profile for profile in (DRAFT, FINAL)}
+
+
+def get_profile(name):
+    """
+    Return the `RenderProfile` of the given name.
+
+    Parameters
+    ----------
+    name: str
+        "Draft" or "Final".
+    """
+    if name not in PROFILES:
+        raise ValueError("Unknown render profile {}, use one of {}".format(
+            name, ", ".join(PROFILES)
+        ))
+    return PROFILES[name]
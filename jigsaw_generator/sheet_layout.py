@@ -0,0 +1,381 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Lays out many small jigsaws on cutting sheets of a fixed size.
+
+The jigsaws are packed on shelves, from the tallest to the shortest, turned
+ when only that way fits or when that makes them lower (first fit decreasing
+ height). Each sheet is written as one SVG. The frames of the jigsaws that touch, when the spacing is zero, are
+ merged, so the cutter goes only once over each shared side.
+
+Example:
+```
+cd jigsaw_generator
+python sheet_layout.py output image.jpg --size 600x400 --grid 6x4 --copies 200 --sheet 3000x2000
+```
+"""
+import argparse
+import os
+import time
+
+import numpy
+from jigsaw_generator_info import Core, Gui, Svg
+
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import TabPaths, generate_tab_paths
+from jigsaw_painter import draw_tab_paths
+from render_profile import FINAL, PROFILES
+
+QSize, QRect, QLineF = Core.QSize, Core.QRect, Core.QLineF
+QPainter, QColor = Gui.QPainter, Gui.QColor
+QSvgGenerator = Svg.QSvgGenerator
+
+# Rotation of a quarter of turn, that keeps the jigsaw on positive coordinates
+# once moved by its height
+TURN = numpy.array([[0.0, -1.0], [1.0, 0.0]])
+
+# Distance below which the coordinates of two sides of frames are the same
+MERGE_TOLERANCE = 1e-6
+
+
+class Placement:
+    """
+    Position of a jigsaw on a sheet.
+
+    Attributes
+    ----------
+    index: int
+        Index of the jigsaw on the list given to `pack_sheets`.
+
+    x: float
+
+    y: float
+        Top left corner on the sheet.
+
+    width: float
+
+    height: float
+        Size on the sheet, swapped if `turned`.
+
+    turned: bool
+        Whether the jigsaw is turned a quarter of turn clockwise.
+    """
+
+    def __init__(self, index, x, y, width, height, turned):
+        self.index = index
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.turned = turned
+
+
+class Sheet:
+    """
+    Sheet with the jigsaws placed on it.
+
+    Attributes
+    ----------
+    width: float
+
+    height: float
+
+    placements: List[Placement]
+
+    shelves: List[List[float]]
+        `[y, height, next_x]` of each shelf, used while packing.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.placements = list()
+        self.shelves = list()
+
+    def used_area(self):
+        """
+        Return the sum of the areas of the jigsaws on the sheet.
+
+        Parameters
+        ----------
+        self: Sheet
+            Instance of this class.
+        """
+        return sum(placement.width*placement.height for placement in self.placements)
+
+
+def pack_sheets(sizes, sheet_width, sheet_height, spacing=0.0, turn=True):
+    """
+    Place jigsaws of the given sizes on as few sheets as possible and return the sheets.
+
+    Raises `ValueError` if a jigsaw does not fit on the sheet either way.
+
+    Parameters
+    ----------
+    sizes: List[Tuple[float, float]]
+        Width and height of each jigsaw.
+    sheet_width: float
+    sheet_height: float
+    spacing: float
+        Distance between the jigsaws; with 0 their frames touch.
+    turn: bool
+        Whether the jigsaws can be turned, to fit on the sheet or to lie on
+         their longest side.
+    """
+    items = list()
+    for index, (width, height) in enumerate(sizes):
+        fits = width <= sheet_width and height <= sheet_height
+        fits_turned = turn and height <= sheet_width and width <= sheet_height
+        if not (fits or fits_turned):
+            raise ValueError("The jigsaw {} of {}x{} does not fit on the sheet of {}x{}".format(
+                index, width, height, sheet_width, sheet_height
+            ))
+        # Turned when only that way fits, or when both fit and it lies flatter
+        turned = fits_turned and (not fits or height > width)
+        if turned:
+            width, height = height, width
+        items.append((height, width, index, turned))
+    items.sort(key=lambda item: (-item[0], -item[1], item[2]))
+
+    sheets = list()
+    for height, width, index, turned in items:
+        placed = False
+        for sheet in sheets:
+            for shelf in sheet.shelves:
+                if height <= shelf[1] and shelf[2] + width <= sheet.width:
+                    sheet.placements.append(Placement(index, shelf[2], shelf[0], width, height, turned))
+                    shelf[2] += width + spacing
+                    placed = True
+                    break
+            if placed:
+                break
+
+            top = sheet.shelves[-1][0] + sheet.shelves[-1][1] + spacing
+            if top + height <= sheet.height:
+                sheet.shelves.append([top, height, width + spacing])
+                sheet.placements.append(Placement(index, 0.0, top, width, height, turned))
+                placed = True
+                break
+
+        if not placed:
+            sheet = Sheet(sheet_width, sheet_height)
+            sheet.shelves.append([0.0, height, width + spacing])
+            sheet.placements.append(Placement(index, 0.0, 0.0, width, height, turned))
+            sheets.append(sheet)
+    return sheets
+
+
+def merge_segments(lines):
+    """
+    Return the union of collinear segments, as an array of shape `(M, 3)`.
+
+    Parameters
+    ----------
+    lines: numpy.ndarray
+        Array of shape `(N, 3)` with `[coordinate, begin, end]` of each segment,
+         all horizontal or all vertical.
+    """
+    lines = numpy.asarray(lines, dtype=float).reshape((-1, 3))
+    if len(lines) == 0:
+        return lines
+    coordinate = numpy.round(lines[:, 0]/MERGE_TOLERANCE)
+    order = numpy.lexsort((lines[:, 1], coordinate))
+    lines, coordinate = lines[order], coordinate[order]
+
+    # The running maximum of the ends restarts on each line: the ends of each
+    # line are raised above every end of the lines before it
+    low = lines[:, 1].min()
+    begin, end = lines[:, 1] - low, lines[:, 2] - low
+    line = numpy.concatenate([[0], numpy.cumsum(coordinate[1:] != coordinate[:-1])])
+    span = end.max() + 1.0
+    reach = numpy.maximum.accumulate(end + line*span) - line*span
+
+    first = numpy.ones(len(lines), dtype=bool)
+    first[1:] = (line[1:] != line[:-1]) | (begin[1:] > reach[:-1] + MERGE_TOLERANCE)
+    starts = numpy.flatnonzero(first)
+    ends = numpy.concatenate([starts[1:], [len(lines)]]) - 1
+    return numpy.stack([lines[starts, 0], lines[starts, 1], reach[ends] + low], axis=1)
+
+
+def frame_lines(sheet, merge=True):
+    """
+    Return the horizontal and the vertical sides of the frames of a sheet.
+
+    Each one is an array of shape `(N, 3)`, see `merge_segments`.
+
+    Parameters
+    ----------
+    sheet: Sheet
+    merge: bool
+        Whether the sides that overlap are merged.
+    """
+    boxes = numpy.array([[placement.x, placement.y, placement.x + placement.width,
+                          placement.y + placement.height] for placement in sheet.placements]).reshape((-1, 4))
+    horizontal = numpy.concatenate([boxes[:, [1, 0, 2]], boxes[:, [3, 0, 2]]])
+    vertical = numpy.concatenate([boxes[:, [0, 1, 3]], boxes[:, [2, 1, 3]]])
+    if merge:
+        return merge_segments(horizontal), merge_segments(vertical)
+    return horizontal, vertical
+
+
+def cut_length(horizontal, vertical):
+    """
+    Return the sum of the lengths of the sides given by `frame_lines`.
+
+    Parameters
+    ----------
+    horizontal: numpy.ndarray
+    vertical: numpy.ndarray
+    """
+    return float((horizontal[:, 2] - horizontal[:, 1]).sum() + (vertical[:, 2] - vertical[:, 1]).sum())
+
+
+def puzzle_tab_paths(spec, width, height):
+    """
+    Return the `TabPaths` of a jigsaw of the given size.
+
+    Parameters
+    ----------
+    spec: dict
+        See `job_queue.job_spec`, only the grid, the seed, the patterns and the
+         smooth factor are used.
+    width: float
+    height: float
+    """
+    grid = spec["grid"]
+    core = JigsawGeneratorCore(list(grid), spec["seed"])
+    return generate_tab_paths(core, float(width)/grid[0], float(height)/grid[1],
+                              spec["patterns"], spec["smooth_factor"])
+
+
+def sheet_tab_paths(sheet, tab_paths):
+    """
+    Return the paths of all the jigsaws of a sheet, on the coordinates of the sheet.
+
+    Parameters
+    ----------
+    sheet: Sheet
+    tab_paths: List[TabPaths]
+        Paths of each jigsaw given to `pack_sheets`, on its own coordinates.
+    """
+    placed = list()
+    for placement in sheet.placements:
+        if placement.turned:
+            placed.append(tab_paths[placement.index].transformed(
+                TURN, (placement.x + placement.width, placement.y)
+            ))
+        else:
+            placed.append(tab_paths[placement.index].transformed(numpy.eye(2), (placement.x, placement.y)))
+    return TabPaths.concatenate(placed)
+
+
+def write_sheet_svg(path, sheet, tab_paths, pen_color, profile=FINAL, merge=True):
+    """
+    Write the frames and the borders of all the jigsaws of a sheet on one SVG file.
+
+    Parameters
+    ----------
+    path: str
+    sheet: Sheet
+    tab_paths: List[TabPaths]
+        Paths of each jigsaw given to `pack_sheets`, on its own coordinates.
+    pen_color: QColor
+    profile: RenderProfile
+    merge: bool
+        Whether the sides shared by the frames are drawn once.
+    """
+    width, height = int(round(sheet.width)), int(round(sheet.height))
+    generator = QSvgGenerator()
+    generator.setFileName(path)
+    generator.setSize(QSize(width, height))
+    generator.setViewBox(QRect(0, 0, width, height))
+
+    painter = QPainter(generator)
+    painter.setPen(pen_color)
+    painter.setRenderHint(QPainter.Antialiasing, profile.antialias)
+
+    horizontal, vertical = frame_lines(sheet, merge)
+    painter.drawLines([QLineF(x0, y, x1, y) for y, x0, x1 in horizontal.tolist()]
+                      + [QLineF(x, y0, x, y1) for x, y0, y1 in vertical.tolist()])
+    draw_tab_paths(sheet_tab_paths(sheet, tab_paths), painter,
+                   None if profile.native_curves else profile.tolerance)
+
+    if not painter.end():
+        raise IOError("It was not possible to save the file {}".format(path))
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+    from image_loader import image_size
+    from job_queue import job_spec
+
+    parser = argparse.ArgumentParser(description="Lay out many jigsaws on cutting sheets.")
+    parser.add_argument("output", help="directory of the sheets")
+    parser.add_argument("images", nargs="+", help="paths of the images, one jigsaw of each")
+    parser.add_argument("--size", type=parse_size, default=None,
+                        help="size of every jigsaw, e.g. 600x400, the size of its image by default")
+    parser.add_argument("--grid", type=parse_size, default=(6, 4), help="number of pieces, e.g. 6x4")
+    parser.add_argument("--copies", type=int, default=1, help="jigsaws of each image, with successive seeds")
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--color", default="black")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="Final")
+    parser.add_argument("--sheet", type=parse_size, default=(3000, 2000), help="size of the sheets")
+    parser.add_argument("--spacing", type=float, default=0.0, help="distance between the jigsaws")
+    parser.add_argument("--no-turn", action="store_true", help="do not turn the jigsaws")
+    arguments = parser.parse_args()
+
+    begin = time.perf_counter()
+    specs, sizes = list(), list()
+    for image in arguments.images:
+        size = arguments.size
+        if size is None:
+            size = image_size(image)
+            size = (size.width(), size.height())
+        for seed in range(arguments.seed, arguments.seed + arguments.copies):
+            specs.append(job_spec(image, [], arguments.grid, seed, arguments.patterns.split(","),
+                                  arguments.smooth_factor, arguments.color, profile=arguments.profile))
+            sizes.append(size)
+    paths = [puzzle_tab_paths(spec, width, height) for spec, (width, height) in zip(specs, sizes)]
+    geometry_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    sheets = pack_sheets(sizes, arguments.sheet[0], arguments.sheet[1], arguments.spacing,
+                         not arguments.no_turn)
+    packing_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    os.makedirs(arguments.output, exist_ok=True)
+    color, profile = QColor(arguments.color), PROFILES[arguments.profile]
+    separate, merged = 0.0, 0.0
+    for number, sheet in enumerate(sheets):
+        write_sheet_svg(os.path.join(arguments.output, "sheet_{:03d}.svg".format(number)),
+                        sheet, paths, color, profile)
+        separate += cut_length(*frame_lines(sheet, False))
+        merged += cut_length(*frame_lines(sheet))
+    export_time = time.perf_counter() - begin
+
+    area = float(arguments.sheet[0])*arguments.sheet[1]
+    print("{} jigsaws on {} sheets, {:.1%} of the area used".format(
+        len(sizes), len(sheets), sum(sheet.used_area() for sheet in sheets)/(area*len(sheets))
+    ))
+    print("frames cut length {:.0f}, {:.0f} without merging the shared sides".format(merged, separate))
+    print("geometry {:.3f} s, packing {:.3f} s, export {:.3f} s".format(geometry_time, packing_time, export_time))
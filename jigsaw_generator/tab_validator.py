@@ -0,0 +1,276 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Auxiliar module that checks that the borders of a jigsaw do not overlap.
+
+The paths of the borders are flattened into segments, which are registered on a
+ `GridIndex`, so only the segments that are near each other are compared.
+"""
+import numpy
+
+from grid_index import GridIndex
+from jigsaw_generator_geometry import generate_tab_paths
+
+
+def point_segment_distances(p, a, b):
+    """
+    Return the distances between the points `p` and the segments `ab`.
+
+    Parameters
+    ----------
+    p: numpy.ndarray
+        Array of shape `(M, 2)`.
+    a: numpy.ndarray
+        Array of shape `(M, 2)`.
+    b: numpy.ndarray
+        Array of shape `(M, 2)`.
+    """
+    ab = b - a
+    length = numpy.einsum("ij,ij->i", ab, ab)
+    t = numpy.einsum("ij,ij->i", p - a, ab)/numpy.where(length == 0, 1., length)
+    t = numpy.clip(t, 0., 1.)[:, None]
+    return numpy.hypot(*(a + t*ab - p).T)
+
+
+def segment_distances(a0, a1, b0, b1):
+    """
+    Return the distances between the segments `a0a1` and `b0b1`, zero when they cross.
+
+    Parameters
+    ----------
+    a0: numpy.ndarray
+        Array of shape `(M, 2)`.
+    a1: numpy.ndarray
+        Array of shape `(M, 2)`.
+    b0: numpy.ndarray
+        Array of shape `(M, 2)`.
+    b1: numpy.ndarray
+        Array of shape `(M, 2)`.
+    """
+    def cross(o, p, q):
+        return (p[:, 0] - o[:, 0])*(q[:, 1] - o[:, 1]) - (p[:, 1] - o[:, 1])*(q[:, 0] - o[:, 0])
+
+    distances = numpy.minimum.reduce([
+        point_segment_distances(a0, b0, b1), point_segment_distances(a1, b0, b1),
+        point_segment_distances(b0, a0, a1), point_segment_distances(b1, a0, a1),
+    ])
+    crossing = ((cross(a0, a1, b0)*cross(a0, a1, b1) < 0)
+                & (cross(b0, b1, a0)*cross(b0, b1, a1) < 0))
+    distances[crossing] = 0.
+    return distances
+
+
+def validate_tab_paths(tab_paths, cell_width, cell_height, min_clearance=.02,
+                       corner_radius=.1, tolerance=.005):
+    """
+    Return the pairs of paths that intersect or are closer than `min_clearance`.
+
+    The result is a tuple `(pairs, distances)`: `pairs` is an array of shape
+     `(M, 2)` with the indices on `tab_paths` of each pair of paths, and `distances`
+     the smallest distance between them. Near the corners of the cells the borders
+     always meet, so the segments closer than `corner_radius` to a corner shared by
+     both paths are not compared.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+        Paths of the masculine borders.
+
+    cell_width: float
+        Indicates the width of each cell.
+
+    cell_height: float
+        Indicates the height of each cell.
+
+    min_clearance: float
+        Minimum distance between two borders, relative to the size of the cell.
+
+    corner_radius: float
+        Radius around the corners, relative to the size of the cell.
+
+    tolerance: float
+        Maximum error of the approximation of the curves by lines, relative to
+         the size of the cell.
+    """
+    scale = min(cell_width, cell_height)
+    clearance, radius = min_clearance*scale, corner_radius*scale
+
+    vertices, offsets = tab_paths.flatten(tolerance*scale)
+    owner = numpy.repeat(numpy.arange(len(tab_paths)), numpy.diff(offsets))
+
+    first = numpy.flatnonzero(owner[:-1] == owner[1:])
+    a, b, owner = vertices[first], vertices[first + 1], owner[first]
+
+    # The corner of the cell near each segment, or -1
+    start, end = tab_paths.start[owner], tab_paths.end()[owner]
+    near_start = numpy.minimum(numpy.hypot(*(a - start).T), numpy.hypot(*(b - start).T)) < radius
+    near_end = numpy.minimum(numpy.hypot(*(a - end).T), numpy.hypot(*(b - end).T)) < radius
+    corner = numpy.where(near_start, 0, numpy.where(near_end, 1, -1))
+    node = numpy.where(corner[:, None] == 0, start, end)
+    node = numpy.round(node/numpy.array([cell_width, cell_height])).astype(numpy.int64)
+    node = numpy.where(corner >= 0, node[:, 0]*(1 << 32) + node[:, 1], -1)
+
+    boxes = numpy.stack([numpy.minimum(a[:, 0], b[:, 0]), numpy.minimum(a[:, 1], b[:, 1]),
+                         numpy.maximum(a[:, 0], b[:, 0]), numpy.maximum(a[:, 1], b[:, 1])], axis=1)
+    boxes += numpy.array([-clearance, -clearance, clearance, clearance])/2.0
+
+    extent = numpy.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    bucket = max(float(numpy.median(extent)) if len(extent) else scale, 1e-9)
+
+    pairs = GridIndex(boxes, bucket, bucket).pairs()
+    i, j = pairs[:, 0], pairs[:, 1]
+    keep = (owner[i] != owner[j]) & ((node[i] < 0) | (node[i] != node[j]))
+    i, j = i[keep], j[keep]
+
+    distances = segment_distances(a[i], b[i], a[j], b[j])
+    close = distances < clearance
+
+    tabs = numpy.stack([owner[i][close], owner[j][close]], axis=1)
+    tabs.sort(axis=1)
+    distances = distances[close]
+
+    if len(tabs) == 0:
+        return numpy.zeros((0, 2), dtype=numpy.int64), distances
+
+    key = tabs[:, 0]*len(tab_paths) + tabs[:, 1]
+    order = numpy.lexsort((distances, key))
+    key, distances = key[order], distances[order]
+    first = numpy.concatenate([[True], key[1:] != key[:-1]])
+    return numpy.stack(numpy.divmod(key[first], len(tab_paths)), axis=1), distances[first]
+
+
+def near_conflicts(tab_paths, edges, cell_width, cell_height, **kwargs):
+    """
+    Return the conflicts of `validate_tab_paths` that involve at least one of the given borders.
+
+    Only the paths whose boxes are near the ones of the borders are validated,
+     so the cost follows the number of borders and not the size of the jigsaw.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+        Paths of the masculine borders.
+
+    edges: numpy.ndarray
+        Indices of the borders.
+
+    cell_width: float
+
+    cell_height: float
+
+    kwargs:
+        Arguments passed to `validate_tab_paths`.
+    """
+    is_edge = numpy.isin(tab_paths.edge, edges)
+    boxes = tab_paths.bounding_boxes()
+    margin = kwargs.get("min_clearance", .02)*min(cell_width, cell_height)
+
+    near = is_edge.copy()
+    for x0, y0, x1, y1 in boxes[is_edge].tolist():
+        near |= ((boxes[:, 0] <= x1 + margin) & (boxes[:, 2] >= x0 - margin)
+                 & (boxes[:, 1] <= y1 + margin) & (boxes[:, 3] >= y0 - margin))
+    subset = numpy.flatnonzero(near)
+
+    pairs, distances = validate_tab_paths(tab_paths.select(subset), cell_width, cell_height, **kwargs)
+    pairs = subset[pairs]
+    keep = is_edge[pairs].any(axis=1)
+    return pairs[keep], distances[keep]
+
+
+def validate_and_reroll(core, cell_width, cell_height, patterns, smooth_factor,
+                        max_rounds=8, update_matrix=True, tab_paths=None, edges=None, **kwargs):
+    """
+    Compute the paths of the borders, re-rolling the ones that overlap.
+
+    On each round, one border of each conflicting pair gets a new revision on
+     `core.revisions` and only those borders are computed again. Returns the
+     tuple `(tab_paths, pairs)`, where `pairs` are the conflicts that remain after
+     `max_rounds` rounds.
+
+    With `edges`, as after a local re-roll, only the conflicts of those borders
+     are searched, with `near_conflicts`, and only those borders are re-rolled;
+     the other paths keep their positions on the result.
+
+    Parameters
+    ----------
+    core: JigsawGeneratorCore
+        The jigsaw, its `revisions` (and `matrix`) are updated.
+
+    cell_width: float
+        Indicates the width of each cell.
+
+    cell_height: float
+        Indicates the height of each cell.
+
+    patterns: List[str]
+        The patterns considered to paint the borders.
+
+    smooth_factor: float
+
+    max_rounds: int
+        Maximum number of re-rolls of the conflicting borders.
+
+    update_matrix: bool
+        Whether `core.matrix` is updated after the re-rolls. Pass `False` when
+         `core` is a `JigsawGeneratorCore.snapshot` used on another thread.
+
+    tab_paths: TabPaths
+        Paths of all the borders of `core`, computed when `None`.
+
+    edges: numpy.ndarray
+        Indices of the only borders validated and re-rolled, all of them when `None`.
+
+    kwargs:
+        Arguments passed to `validate_tab_paths`.
+    """
+    if tab_paths is None:
+        tab_paths = generate_tab_paths(core, cell_width, cell_height, patterns, smooth_factor)
+    if edges is not None:
+        edges = numpy.asarray(edges, dtype=numpy.int64)
+    rerolled = numpy.zeros(0, dtype=numpy.int64)
+
+    for round_index in range(max_rounds + 1):
+        if edges is None:
+            pairs, distances = validate_tab_paths(tab_paths, cell_width, cell_height, **kwargs)
+        else:
+            pairs, distances = near_conflicts(tab_paths, edges, cell_width, cell_height, **kwargs)
+
+        if len(pairs) == 0 or round_index == max_rounds:
+            break
+
+        chosen = pairs[:, 1]
+        if edges is not None:
+            chosen = numpy.where(numpy.isin(tab_paths.edge[chosen], edges), chosen, pairs[:, 0])
+        round_edges = numpy.unique(tab_paths.edge[chosen])
+        for edge_index in round_edges:
+            core.revisions[int(edge_index)] = core.revisions.get(int(edge_index), 0) + 1
+        rerolled = numpy.union1d(rerolled, round_edges)
+
+        positions = numpy.flatnonzero(numpy.isin(tab_paths.edge, round_edges))
+        tab_paths = tab_paths.replaced(positions, generate_tab_paths(
+            core, cell_width, cell_height, patterns, smooth_factor, tab_paths.edge[positions]
+        ))
+
+    if len(rerolled) and update_matrix:
+        if edges is None:
+            core.update_matrix()
+        else:
+            core.update_edges(rerolled)
+
+    return tab_paths, pairs
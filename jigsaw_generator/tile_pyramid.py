@@ -0,0 +1,586 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module tile_pyramid.
+
+Writes the jigsaw as a multi-level pyramid of tiles for web viewers, in the Deep
+ Zoom (DZI) or in the XYZ layout.
+
+Each tile is rendered from the base image at the resolution of its level and
+ from the borders that cross it, found with a `GridIndex`. The tiles are rendered
+ in parallel and a manifest keeps a hash of what was drawn on each one, so running
+ it again only rewrites the tiles that changed.
+
+Example:
+```
+cd jigsaw_generator
+python tile_pyramid.py image.png output.dzi --grid 40x30 --seed 1
+```
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+from jigsaw_generator_info import Core, Gui
+
+from grid_index import GridIndex
+from image_loader import image_size, read_image, supports_region
+from jigsaw_painter import draw_tab_paths
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+import numpy_raster
+from qimage_array import array_to_qimage, qimage_to_array
+from render_profile import FINAL, PROFILES
+
+Qt, QRect, QRectF, QPointF = Core.Qt, Core.QRect, Core.QRectF, Core.QPointF
+QImage, QPainter, QPen, QColor = Gui.QImage, Gui.QPainter, Gui.QPen, Gui.QColor
+QPainterPath, QTransform = Gui.QPainterPath, Gui.QTransform
+
+MANIFEST_NAME = "manifest.json"
+
+# Size of the tiles of the XYZ layout, the one of the slippy map viewers
+XYZ_TILE_SIZE = 256
+
+
+class TilePyramid:
+    """
+    Description of the levels and tiles of a pyramid.
+
+    The level `max_level` has the size of the base image and each level below it
+     has half of the size of the next one. On the "dzi" layout the level `0` has
+     one pixel; on the "xyz" layout it is the first level that fits on a single
+     tile, the tiles have `XYZ_TILE_SIZE` pixels and the tiles on the right and
+     bottom edges are padded to that size, see `pad_tile`.
+
+    Attributes
+    ----------
+    width: int
+        Width of the base image.
+
+    height: int
+        Height of the base image.
+
+    tile_size: int
+        Size of the tiles, without the overlap, always `XYZ_TILE_SIZE` on the
+         "xyz" layout.
+
+    overlap: int
+        Number of pixels that each tile shares with its neighbors.
+
+    layout: str
+        "dzi" or "xyz".
+
+    image_format: str
+        Format of the tiles, e.g. "png" or "jpg".
+
+    max_level: int
+        Index of the level of full resolution.
+    """
+
+    def __init__(self, width, height, tile_size=254, overlap=1, layout="dzi", image_format="png"):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size if layout == "dzi" else XYZ_TILE_SIZE
+        self.overlap = overlap if layout == "dzi" else 0
+        self.layout = layout
+        self.image_format = image_format
+        if layout == "dzi":
+            self.max_level = int(math.ceil(math.log2(max(width, height, 1))))
+        else:
+            self.max_level = max(int(math.ceil(math.log2(max(width, height, 1)/float(self.tile_size)))), 0)
+
+    def level_scale(self, level):
+        """
+        Return the scale of the given level relative to the base image.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        level: int
+        """
+        return 2.0**(level - self.max_level)
+
+    def level_size(self, level):
+        """
+        Return the size `(width, height)` of the given level.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        level: int
+        """
+        scale = self.level_scale(level)
+        return max(int(math.ceil(self.width*scale)), 1), max(int(math.ceil(self.height*scale)), 1)
+
+    def tile_count(self, level):
+        """
+        Return the number of `(columns, rows)` of tiles of the given level.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        level: int
+        """
+        width, height = self.level_size(level)
+        return int(math.ceil(width/self.tile_size)), int(math.ceil(height/self.tile_size))
+
+    def tile_rect(self, level, column, row):
+        """
+        Return the rectangle `(x, y, width, height)` of a tile, on the pixels of its level.
+
+        The rectangle is inside the level, so the tiles on the edges may be smaller
+         than `tile_size`.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        level: int
+        column: int
+        row: int
+        """
+        width, height = self.level_size(level)
+        x0 = max(column*self.tile_size - self.overlap, 0)
+        y0 = max(row*self.tile_size - self.overlap, 0)
+        x1 = min((column + 1)*self.tile_size + self.overlap, width)
+        y1 = min((row + 1)*self.tile_size + self.overlap, height)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def source_rect(self, level, rect):
+        """
+        Return the rectangle `(x, y, width, height)` of the base image covered by a tile.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        level: int
+        rect: Tuple[int, int, int, int]
+            Rectangle of the tile on its level.
+        """
+        x, y, width, height = rect
+        scale = self.level_scale(level)
+        x0, y0 = max(int(math.floor(x/scale)), 0), max(int(math.floor(y/scale)), 0)
+        x1 = min(int(math.ceil((x + width)/scale)), self.width)
+        y1 = min(int(math.ceil((y + height)/scale)), self.height)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def tiles(self):
+        """
+        Return the list of all the tiles `(level, column, row)` of the pyramid.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        """
+        tiles = list()
+        for level in range(self.max_level + 1):
+            columns, rows = self.tile_count(level)
+            tiles.extend((level, column, row) for column in range(columns) for row in range(rows))
+        return tiles
+
+    def tile_path(self, output_path, level, column, row):
+        """
+        Return the path of the file of a tile.
+
+        For the "dzi" layout, `output_path` is the path of the `.dzi` file and the
+         tiles are on the directory `<name>_files/<level>/<column>_<row>.<format>`.
+         For the "xyz" layout, `output_path` is a directory and the tiles are on
+         `<level>/<column>/<row>.<format>`.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        output_path: str
+        level: int
+        column: int
+        row: int
+        """
+        if self.layout == "dzi":
+            return os.path.join(self.tiles_directory(output_path), str(level),
+                                "{}_{}.{}".format(column, row, self.image_format))
+        return os.path.join(output_path, str(level), str(column),
+                            "{}.{}".format(row, self.image_format))
+
+    def tiles_directory(self, output_path):
+        """
+        Return the directory where the tiles and the manifest are stored.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        output_path: str
+        """
+        if self.layout == "dzi":
+            return os.path.splitext(output_path)[0] + "_files"
+        return output_path
+
+    def descriptor(self):
+        """
+        Return the content of the `.dzi` file.
+
+        Parameters
+        ----------
+        self: TilePyramid
+            Instance of this class.
+        """
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{}" '
+            'Overlap="{}" TileSize="{}">\n'
+            '  <Size Width="{}" Height="{}"/>\n'
+            '</Image>\n'
+        ).format(self.image_format, self.overlap, self.tile_size, self.width, self.height)
+
+
+def source_key(image_path):
+    """
+    Return a text that changes whenever the file of the base image changes.
+
+    Parameters
+    ----------
+    image_path: str
+    """
+    status = os.stat(image_path)
+    return "{}:{}:{}".format(os.path.realpath(image_path), status.st_size, status.st_mtime_ns)
+
+
+def tile_hash(render_key, rect, tab_paths):
+    """
+    Return a hash of everything drawn on one tile.
+
+    Parameters
+    ----------
+    render_key: str
+        Description of the source image and of the settings of the render.
+    rect: Tuple[int, int, int, int]
+        Rectangle of the tile on its level.
+    tab_paths: TabPaths
+        Paths of the borders that cross the tile.
+    """
+    digest = hashlib.sha1(render_key.encode())
+    digest.update(numpy.asarray(rect, dtype=numpy.int64).tobytes())
+    for array in (tab_paths.start, tab_paths.kind, tab_paths.control, tab_paths.offsets):
+        digest.update(numpy.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def render_tile(base, pyramid, level, rect, tab_paths, pen_color, backend="Qt", profile=FINAL,
+                base_rect=None):
+    """
+    Return the `QImage` of one tile.
+
+    Parameters
+    ----------
+    base: QImage
+        The base image, or the part of it given by `base_rect`, at any resolution.
+    pyramid: TilePyramid
+    level: int
+    rect: Tuple[int, int, int, int]
+        Rectangle of the tile on its level.
+    tab_paths: TabPaths
+        Paths of the borders that cross the tile, on the coordinates of the base image.
+    pen_color: QColor
+    backend: str
+        "Qt" or "NumPy".
+    profile: RenderProfile
+        Only its antialiasing and flattening are used, the resolution is the one
+         of the level.
+    base_rect: Tuple[int, int, int, int]
+        Rectangle of the full resolution base image covered by `base`, the whole
+         image if `None`.
+    """
+    return render_rect(base, pyramid.width, pyramid.height, pyramid.level_scale(level), rect,
+                       tab_paths, pen_color, backend, profile, base_rect)
+
+
+def render_rect(base, width, height, scale, rect, tab_paths, pen_color, backend="Qt", profile=FINAL,
+                base_rect=None):
+    """
+    Return the `QImage` of a rectangle of the jigsaw drawn at the given scale.
+
+    Parameters
+    ----------
+    base: QImage
+        The base image, or the part of it given by `base_rect`, at any resolution.
+    width: int
+        Width of the full resolution base image.
+    height: int
+        Height of the full resolution base image.
+    scale: float
+        Resolution of the result relative to the full resolution image.
+    rect: Tuple[int, int, int, int]
+        Rectangle `(x, y, width, height)` of the result, on the image scaled by `scale`.
+    tab_paths: TabPaths
+        Paths of the borders that cross the rectangle, on the coordinates of the base image.
+    pen_color: QColor
+    backend: str
+        "Qt" or "NumPy".
+    profile: RenderProfile
+        Only its antialiasing, filter and flattening are used.
+    base_rect: Tuple[int, int, int, int]
+        Rectangle of the full resolution base image covered by `base`, the whole
+         image if `None`.
+    """
+    x, y, tile_width, tile_height = rect
+    base_x, base_y, base_width, base_height = base_rect or (0, 0, width, height)
+    scale_x, scale_y = base.width()/float(base_width), base.height()/float(base_height)
+
+    source = QRectF((x/scale - base_x)*scale_x, (y/scale - base_y)*scale_y,
+                    tile_width/scale*scale_x, tile_height/scale*scale_y).toAlignedRect()
+    source = source.intersected(QRect(0, 0, base.width(), base.height()))
+    tile = base.copy(source).scaled(
+        tile_width, tile_height, Qt.IgnoreAspectRatio,
+        Qt.SmoothTransformation if profile.smooth_transform else Qt.FastTransformation
+    )
+    tile = tile.convertToFormat(QImage.Format_RGBA8888)
+
+    frame = QPainterPath(QPointF(0, 0))
+    for corner in ((width - 1, 0), (width - 1, height - 1), (0, height - 1), (0, 0)):
+        frame.lineTo(QPointF(*corner))
+
+    if backend == "NumPy":
+        array = qimage_to_array(tile)
+        vertices, offsets = tab_paths.flatten(profile.tolerance, scale)
+        frame_vertices, frame_offsets = numpy_raster.frame_polyline(width - 1, height - 1)
+        vertices = numpy.concatenate([frame_vertices, vertices])*scale - numpy.array([x, y])
+        offsets = numpy.concatenate([frame_offsets, offsets[1:] + len(frame_vertices)])
+        numpy_raster.draw_polylines(array, vertices, offsets, pen_color.getRgb(),
+                                    antialias=profile.antialias)
+        return array_to_qimage(array)
+
+    pen = QPen(pen_color)
+    pen.setCosmetic(True)
+    painter = QPainter(tile)
+    painter.setRenderHint(QPainter.Antialiasing, profile.antialias)
+    painter.setPen(pen)
+    painter.setTransform(QTransform(scale, 0, 0, scale, -x, -y))
+    painter.drawPath(frame)
+    draw_tab_paths(tab_paths, painter, None if profile.native_curves else profile.tolerance, scale)
+    painter.end()
+    return tile
+
+
+def pad_tile(image, tile_size):
+    """
+    Return the tile placed on the top left corner of a transparent square of `tile_size` pixels.
+
+    Parameters
+    ----------
+    image: QImage
+        A tile of the right or bottom edge, smaller than `tile_size`.
+    tile_size: int
+    """
+    if image.width() == tile_size and image.height() == tile_size:
+        return image
+    padded = QImage(tile_size, tile_size, QImage.Format_RGBA8888)
+    padded.fill(Qt.transparent)
+    painter = QPainter(padded)
+    painter.setCompositionMode(QPainter.CompositionMode_Source)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    return padded
+
+
+def write_tile_pyramid(output_path, image_path, tab_paths, pen_color, cell_width, cell_height,
+                       tile_size=254, overlap=1, layout="dzi", image_format="png",
+                       backend="Qt", workers=None, force=False, region_decode=None,
+                       profile=FINAL):
+    """
+    Write the tile pyramid of the jigsaw and return `(written, skipped)`.
+
+    The tiles whose file exists and whose hash on the manifest matches what would
+     be drawn on them are skipped, unless `force` is set.
+
+    Parameters
+    ----------
+    output_path: str
+        Path of the `.dzi` file, or the directory of the "xyz" layout.
+    image_path: str
+        Path of the base image.
+    tab_paths: TabPaths
+        Paths of the borders, on the coordinates of the base image.
+    pen_color: QColor
+    cell_width: float
+        Width of each cell on the base image.
+    cell_height: float
+        Height of each cell on the base image.
+    tile_size: int
+        Only used by the "dzi" layout, see `TilePyramid`.
+    overlap: int
+        Only used by the "dzi" layout.
+    layout: str
+        "dzi" or "xyz".
+    image_format: str
+    backend: str
+        "Qt" or "NumPy".
+    workers: int
+        Number of threads, see `concurrent.futures.ThreadPoolExecutor`.
+    force: bool
+        Rewrite all the tiles.
+    region_decode: bool
+        Whether each row of tiles decodes only its region of the image, at the
+         resolution of its level, which keeps the memory near the size of a row of
+         tiles. Otherwise the image is decoded once for the level of full resolution
+         and each level below it is rendered from the image of the level above
+         scaled by half, so the full resolution image is released after its level.
+         By default it is used whenever the format supports it, see
+         `image_loader.supports_region`.
+    profile: RenderProfile
+        See `render_tile`.
+    """
+    if region_decode is None or region_decode:
+        region_decode = supports_region(image_path)
+
+    if region_decode:
+        base, size = None, image_size(image_path)
+        if not size.isValid():
+            raise IOError("It was not possible to load the file {}".format(image_path))
+    else:
+        base = read_image(image_path)
+        size = base.size()
+
+    pyramid = TilePyramid(size.width(), size.height(), tile_size, overlap, layout, image_format)
+    directory = pyramid.tiles_directory(output_path)
+    os.makedirs(directory, exist_ok=True)
+
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    manifest = dict()
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+    render_key = "{}|{}|{}|{}|{}|{}|{}".format(
+        source_key(image_path), pen_color.name(QColor.HexArgb), layout, pyramid.tile_size,
+        pyramid.overlap, backend, profile.name
+    )
+    index = GridIndex(tab_paths.bounding_boxes(), cell_width, cell_height)
+
+    def process(level_row):
+        level, row = level_row
+        scale = pyramid.level_scale(level)
+        level_width = pyramid.level_size(level)[0]
+        results, strip, strip_source = list(), None, None
+        for column in range(pyramid.tile_count(level)[0]):
+            rect = pyramid.tile_rect(level, column, row)
+            # Region of the tile on the base image, with a margin for the pen
+            margin = 2.0/scale
+            region = (rect[0]/scale - margin, rect[1]/scale - margin,
+                      (rect[0] + rect[2])/scale + margin, (rect[1] + rect[3])/scale + margin)
+            tile_paths = tab_paths.select(index.query(region))
+
+            key = "{}/{}_{}".format(level, column, row)
+            digest = tile_hash(render_key, rect, tile_paths)
+            path = pyramid.tile_path(output_path, level, column, row)
+
+            if manifest.get(key) == digest and os.path.exists(path):
+                results.append((key, digest, False))
+                continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if region_decode:
+                if strip is None:
+                    # The whole row of tiles is decoded at once, since a decoder
+                    # parses the file up to the region on each call
+                    strip_source = pyramid.source_rect(level, (0, rect[1], level_width, rect[3]))
+                    decode_size = (max(int(round(strip_source[2]*scale)), 1),
+                                   max(int(round(strip_source[3]*scale)), 1))
+                    strip = read_image(image_path, decode_size, strip_source)
+                image = render_tile(strip, pyramid, level, rect, tile_paths, pen_color, backend,
+                                    profile, strip_source)
+            else:
+                image = render_tile(base, pyramid, level, rect, tile_paths, pen_color, backend, profile)
+            if layout == "xyz":
+                image = pad_tile(image, pyramid.tile_size)
+            if not image.save(path):
+                raise IOError("It was not possible to save the file {}".format(path))
+            results.append((key, digest, True))
+        return results
+
+    written, skipped = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # From the level of full resolution down, `base` being replaced by the
+        # image of each level once the tiles of the level above are written
+        for level in range(pyramid.max_level, -1, -1):
+            if base is not None and level < pyramid.max_level:
+                base = base.scaled(*pyramid.level_size(level), Qt.IgnoreAspectRatio,
+                                   Qt.SmoothTransformation)
+            rows = pyramid.tile_count(level)[1]
+            for results in executor.map(process, [(level, row) for row in range(rows)]):
+                for key, digest, rendered in results:
+                    manifest[key] = digest
+                    written, skipped = written + rendered, skipped + (not rendered)
+
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+
+    if layout == "dzi":
+        with open(output_path, "w") as descriptor:
+            descriptor.write(pyramid.descriptor())
+
+    return written, skipped
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+
+    parser = argparse.ArgumentParser(description="Write the tile pyramid of a jigsaw.")
+    parser.add_argument("image", help="path of the base image")
+    parser.add_argument("output", help="path of the .dzi file, or directory of the xyz layout")
+    parser.add_argument("--grid", type=parse_size, default=(10, 10), help="number of pieces, e.g. 40x30")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--color", default="white")
+    parser.add_argument("--layout", choices=["dzi", "xyz"], default="dzi")
+    parser.add_argument("--format", default="png")
+    parser.add_argument("--tile-size", type=int, default=254, help="ignored by the xyz layout, of 256 pixels")
+    parser.add_argument("--backend", choices=["Qt", "NumPy"], default="Qt")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="Final")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="rewrite all the tiles")
+    parser.add_argument("--no-region-decode", dest="region_decode", action="store_false", default=None,
+                        help="decode the whole image even if its format can decode only the region of each tile")
+    arguments = parser.parse_args()
+
+    size = image_size(arguments.image)
+    core = JigsawGeneratorCore(list(arguments.grid))
+    core.generate_random(arguments.seed)
+    cell_width = float(size.width())/arguments.grid[0]
+    cell_height = float(size.height())/arguments.grid[1]
+    paths = generate_tab_paths(core, cell_width, cell_height,
+                               arguments.patterns.split(","), arguments.smooth_factor)
+
+    written, skipped = write_tile_pyramid(
+        arguments.output, arguments.image, paths, QColor(arguments.color), cell_width, cell_height,
+        arguments.tile_size, 1, arguments.layout, arguments.format, arguments.backend,
+        arguments.workers, arguments.force, arguments.region_decode, PROFILES[arguments.profile]
+    )
+    print("seed {}: {} tiles written, {} skipped".format(core.seed, written, skipped))
@@ -0,0 +1,397 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Module vector_export.
+
+Writes the jigsaw as SVG or DXF text, split in shards of rows of pieces.
+
+The paths are ordered by the row of their masculine cell and each shard is a
+ band of whole rows, whose text does not depend on the other shards. The shards
+ are formatted on a pool of processes and written in order as they are ready, so
+ the file is the same, byte by byte, for any number of processes. The module
+ does not use Qt, but the processes also import the `__main__` module of the
+ caller again, see `worker_context`.
+
+Example:
+```
+cd jigsaw_generator
+python vector_export.py output.svg --size 100000x100000 --grid 1000x1000 --workers 8
+```
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from jigsaw_generator_geometry import LINE, QUAD
+
+# Digits after the point of the coordinates written
+PRECISION = 3
+
+# Below this number of segments the text is formatted on the calling process
+PARALLEL_SEGMENTS = 1 << 18
+
+# Shards formatted for each process, to balance the rows of different lengths
+SHARDS_PER_WORKER = 4
+
+# Commands of the SVG paths: move, line, quadratic and cubic curve
+MOVE, SVG_LINE, SVG_QUAD, SVG_CUBIC = 0, 1, 2, 3
+SVG_COMMANDS = ("M{0} {0}", "L{0} {0}", "Q{0} {0} {0} {0}", "C{0} {0} {0} {0} {0} {0}")
+SVG_NUMBERS = numpy.array([2, 2, 4, 6])
+
+DXF_HEADER = "0\nSECTION\n2\nENTITIES\n"
+DXF_FOOTER = "0\nENDSEC\n0\nEOF\n"
+DXF_POLYLINE = "0\nPOLYLINE\n8\n0\n66\n1\n70\n{}\n10\n0.0\n20\n0.0\n30\n0.0\n"
+DXF_VERTEX = "0\nVERTEX\n8\n0\n10\n{0}\n20\n{0}\n30\n0.0\n"
+DXF_SEQEND = "0\nSEQEND\n8\n0\n"
+
+
+def path_rows(tab_paths):
+    """
+    Return the row of the masculine cell of each path.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+    """
+    return tab_paths.cell[:, 1]
+
+
+def row_order(tab_paths):
+    """
+    Return the order of the paths on the document: by row, and as given inside each row.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+    """
+    return numpy.argsort(path_rows(tab_paths), kind="stable")
+
+
+def shard_bounds(rows, counts, shards):
+    """
+    Return the first path of each shard, and the end, splitting only between rows.
+
+    The shards get about the same number of segments.
+
+    Parameters
+    ----------
+    rows: numpy.ndarray
+        Row of each path, sorted.
+    counts: numpy.ndarray
+        Number of segments of each path.
+    shards: int
+    """
+    if len(rows) == 0:
+        return numpy.zeros(1, dtype=numpy.int64)
+    row_starts = numpy.flatnonzero(numpy.concatenate([[True], rows[1:] != rows[:-1]]))
+    total = numpy.concatenate([[0], numpy.cumsum(counts)])
+    targets = total[-1]*numpy.arange(1, shards)/float(shards)
+    cuts = row_starts[numpy.clip(numpy.searchsorted(total[row_starts], targets), 0, len(row_starts) - 1)]
+    return numpy.unique(numpy.concatenate([[0], cuts, [len(rows)]])).astype(numpy.int64)
+
+
+def svg_commands(tab_paths, tolerance=None):
+    """
+    Return the commands of the paths as `(codes, numbers, first)`.
+
+    `codes` has the command of each point of the paths, `numbers` the coordinates
+     that they take, in order, and `first` the first command of each path.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+    tolerance: float
+        If given, the curves are flattened into lines with this maximum error.
+    """
+    if tolerance is not None:
+        vertices, offsets = tab_paths.flatten(tolerance)
+        codes = numpy.full(len(vertices), SVG_LINE, dtype=numpy.int8)
+        codes[offsets[:-1]] = MOVE
+        return codes, vertices.ravel(), offsets
+
+    n, s = len(tab_paths), len(tab_paths.kind)
+    first = tab_paths.offsets + numpy.arange(n + 1)
+    segments = numpy.ones(n + s, dtype=bool)
+    segments[first[:-1]] = False
+
+    values = numpy.zeros((n + s, 6))
+    codes = numpy.full(n + s, MOVE, dtype=numpy.int8)
+    values[first[:-1], :2] = tab_paths.start
+
+    control = tab_paths.control.reshape((-1, 6)).copy()
+    quad = tab_paths.kind == QUAD
+    control[quad, :2] = (3.0*tab_paths.control[quad, 0] - tab_paths.segment_starts()[quad])/2.0
+    control[quad, 2:4] = tab_paths.control[quad, 2]
+    control[tab_paths.kind == LINE, :2] = tab_paths.control[tab_paths.kind == LINE, 2]
+    values[segments] = control
+    codes[segments] = numpy.where(tab_paths.kind == LINE, SVG_LINE,
+                                  numpy.where(quad, SVG_QUAD, SVG_CUBIC))
+
+    used = numpy.arange(6) < SVG_NUMBERS[codes][:, None]
+    return codes, values[used], first
+
+
+def svg_text(tab_paths, rows, precision=PRECISION, tolerance=None):
+    """
+    Return the `<path>` elements of the given paths, one for each row.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+        Paths sorted by row.
+    rows: numpy.ndarray
+        Row of each path.
+    precision: int
+    tolerance: float
+        See `svg_commands`.
+    """
+    if len(tab_paths) == 0:
+        return ""
+    number = "%.{}f".format(precision)
+    templates = [command.format(number) for command in SVG_COMMANDS]
+    codes, numbers, first = svg_commands(tab_paths, tolerance)
+    number_offsets = numpy.concatenate([[0], numpy.cumsum(SVG_NUMBERS[codes])])
+
+    row_starts = numpy.flatnonzero(numpy.concatenate([[True], rows[1:] != rows[:-1], [True]]))
+    text = list()
+    for begin, end in zip(first[row_starts[:-1]].tolist(), first[row_starts[1:]].tolist()):
+        template = '<path d="' + "".join([templates[code] for code in codes[begin:end].tolist()]) + '"/>\n'
+        text.append(template % tuple(numbers[number_offsets[begin]:number_offsets[end]].tolist()))
+    return "".join(text)
+
+
+def dxf_text(tab_paths, height, precision=PRECISION, tolerance=.25):
+    """
+    Return the `POLYLINE` entities of the given paths, flattened with `tolerance`.
+
+    The axis y of DXF points up, so the points are flipped inside `height`.
+
+    Parameters
+    ----------
+    tab_paths: TabPaths
+    height: float
+        Height of the jigsaw.
+    precision: int
+    tolerance: float
+    """
+    if len(tab_paths) == 0:
+        return ""
+    vertex = DXF_VERTEX.format("%.{}f".format(precision))
+    head = DXF_POLYLINE.format(0)
+    vertices, offsets = tab_paths.flatten(tolerance)
+    vertices = numpy.stack([vertices[:, 0], height - vertices[:, 1]], axis=1)
+    template = "".join([head + vertex*count + DXF_SEQEND for count in numpy.diff(offsets).tolist()])
+    return template % tuple(vertices.ravel().tolist())
+
+
+def shard_text(format_name, tab_paths, rows, height, precision, tolerance):
+    """
+    Return the text of a shard, see `svg_text` and `dxf_text`.
+
+    Parameters
+    ----------
+    format_name: str
+        "svg" or "dxf".
+    tab_paths: TabPaths
+    rows: numpy.ndarray
+    height: float
+    precision: int
+    tolerance: float
+    """
+    if format_name == "dxf":
+        return dxf_text(tab_paths, height, precision, tolerance)
+    return svg_text(tab_paths, rows, precision, tolerance)
+
+
+def ordered_results(executor, function, arguments, window):
+    """
+    Yield the results of `function` on each tuple of `arguments`, in order.
+
+    At most `window` calls are submitted ahead of the result yielded, so the
+     results wait in memory only until their turn.
+
+    Parameters
+    ----------
+    executor: concurrent.futures.Executor
+    function: Callable
+    arguments: Iterable[tuple]
+    window: int
+    """
+    pending = deque()
+    for item in arguments:
+        pending.append(executor.submit(function, *item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def worker_context():
+    """
+    Return the `multiprocessing` context of the processes that format the shards.
+
+    The processes are never forked from the caller, that may be the window with
+     its threads: where it is available they are forked from a server that only
+     imported this module, otherwise they are spawned. Either way each one
+     imports the `__main__` module of the caller again, without running its
+     `if __name__ == "__main__"` block, so the entry points keep Qt and the window
+     inside that block, as `main.py` does.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def write_sharded(path, format_name, header, footer, height, tab_paths, precision=PRECISION,
+                  tolerance=None, workers=None):
+    """
+    Write `header`, the text of the paths and `footer` on a file.
+
+    Parameters
+    ----------
+    path: str
+    format_name: str
+        "svg" or "dxf".
+    header: str
+    footer: str
+    height: float
+        Height of the jigsaw.
+    tab_paths: TabPaths
+    precision: int
+    tolerance: float
+        See `svg_text` and `dxf_text`.
+    workers: int
+        Number of processes; by default the number of CPUs, or only the calling
+         process for small jigsaws.
+    """
+    order = row_order(tab_paths)
+    rows = path_rows(tab_paths)[order]
+    if workers is None:
+        workers = os.cpu_count() or 1
+        if len(tab_paths.kind) < PARALLEL_SEGMENTS:
+            workers = 1
+    bounds = shard_bounds(rows, tab_paths.segment_count()[order], workers*SHARDS_PER_WORKER)
+    shards = ((format_name, tab_paths.select(order[begin:end]), rows[begin:end], height, precision, tolerance)
+              for begin, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    with open(path, "w", encoding="utf-8", newline="\n") as file:
+        file.write(header)
+        if workers == 1:
+            for arguments in shards:
+                file.write(shard_text(*arguments))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=worker_context()) as executor:
+                for text in ordered_results(executor, shard_text, shards, 2*workers):
+                    file.write(text)
+        file.write(footer)
+
+
+def write_svg(path, width, height, tab_paths, color="#000000", opacity=1.0, tolerance=None,
+              precision=PRECISION, workers=None):
+    """
+    Write the frame and the borders of the jigsaw on a SVG file.
+
+    Parameters
+    ----------
+    path: str
+    width: int
+    height: int
+    tab_paths: TabPaths
+        Paths of the masculine borders, on the coordinates of the SVG.
+    color: str
+        Color of the borders, e.g. "#ffffff".
+    opacity: float
+    tolerance: float
+        If given, the curves are written as lines with this maximum error.
+    precision: int
+    workers: int
+        See `write_sharded`.
+    """
+    header = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+        '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{0}" height="{1}" '
+        'viewBox="0 0 {0} {1}">\n'
+        '<g fill="none" stroke="{2}" stroke-opacity="{3:g}" stroke-width="1">\n'
+        '<path d="M0 0H{0}V{1}H0Z"/>\n'
+    ).format(width, height, color, opacity)
+    write_sharded(path, "svg", header, "</g>\n</svg>\n", height, tab_paths, precision, tolerance, workers)
+
+
+def write_dxf(path, width, height, tab_paths, tolerance=.25, precision=PRECISION, workers=None):
+    """
+    Write the frame and the borders of the jigsaw on a DXF (R12) file, as polylines.
+
+    Parameters
+    ----------
+    path: str
+    width: int
+    height: int
+    tab_paths: TabPaths
+        Paths of the masculine borders, with the axis y pointing down.
+    tolerance: float
+        Maximum distance between the curves and the lines written.
+    precision: int
+    workers: int
+        See `write_sharded`.
+    """
+    vertex = DXF_VERTEX.format("%.{}f".format(precision))
+    frame = DXF_POLYLINE.format(1) + (vertex*4) % (0, 0, width, 0, width, height, 0, height) + DXF_SEQEND
+    write_sharded(path, "dxf", DXF_HEADER + frame, DXF_FOOTER, height, tab_paths, precision, tolerance,
+                  workers)
+
+
+if __name__ == "__main__":
+    from cli_utils import parse_size
+    from jigsaw_generator_core import JigsawGeneratorCore
+    from jigsaw_generator_geometry import generate_tab_paths
+
+    parser = argparse.ArgumentParser(description="Write a jigsaw as SVG or DXF on several processes.")
+    parser.add_argument("output", help="path of the output, its format is given by the extension")
+    parser.add_argument("--size", type=parse_size, default=(10000, 10000), help="e.g. 10000x10000")
+    parser.add_argument("--grid", type=parse_size, default=(100, 100), help="number of pieces, e.g. 1000x1000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patterns", default="Square Rounded,Triangle Rounded",
+                        help="comma separated list of patterns")
+    parser.add_argument("--smooth-factor", type=float, default=.1)
+    parser.add_argument("--workers", type=int, default=None)
+    arguments = parser.parse_args()
+
+    begin = time.perf_counter()
+    core = JigsawGeneratorCore(list(arguments.grid), arguments.seed)
+    width, height = arguments.size
+    paths = generate_tab_paths(core, float(width)/arguments.grid[0], float(height)/arguments.grid[1],
+                               arguments.patterns.split(","), arguments.smooth_factor)
+    geometry_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    if os.path.splitext(arguments.output)[1].lower() == ".dxf":
+        write_dxf(arguments.output, width, height, paths, workers=arguments.workers)
+    else:
+        write_svg(arguments.output, width, height, paths, workers=arguments.workers)
+    print("{} borders, {} segments: geometry {:.3f} s, export {:.3f} s, {} bytes".format(
+        len(paths), len(paths.kind), geometry_time, time.perf_counter() - begin,
+        os.path.getsize(arguments.output)
+    ))
@@ -0,0 +1,40 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Tests of the module jigsaw_generator_geometry.
+"""
+import numpy
+
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+
+PATTERNS = ["Square", "Square Rounded", "Triangle", "Triangle Rounded", "Circle", "Knob"]
+
+
+def test_subset_of_edges_is_a_slice_of_the_full_run():
+    core = JigsawGeneratorCore([15, 11], 3)
+    core.revisions[5] = 2
+    full = generate_tab_paths(core, 30., 20., PATTERNS, .1)
+
+    edges = numpy.random.default_rng(0).choice(core.edge_count(), 60, replace=False)
+    subset = generate_tab_paths(core, 30., 20., PATTERNS, .1, numpy.append(edges, 5))
+    expected = full.select(numpy.argsort(full.edge)[numpy.append(edges, 5)])
+
+    for name in ("edge", "cell", "where", "pattern", "start", "kind", "control", "offsets"):
+        numpy.testing.assert_array_equal(getattr(subset, name), getattr(expected, name), err_msg=name)
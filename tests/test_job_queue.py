@@ -0,0 +1,61 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Tests of the module job_queue.
+"""
+import job_queue
+from conftest import IMAGE
+from job_queue import DONE, JobQueue, file_hash, job_spec
+
+
+def test_run_skips_verified_outputs(tmp_path, monkeypatch):
+    written = list()
+
+    def run_job(spec, paths):
+        written.append(paths)
+        return real_run_job(spec, paths)
+
+    real_run_job = job_queue.run_job
+    monkeypatch.setattr(job_queue, "run_job", run_job)
+
+    svg, dxf = str(tmp_path / "jigsaw.svg"), str(tmp_path / "jigsaw.dxf")
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    queue.add(job_spec(IMAGE, [svg, dxf], (12, 9), 5, ["Square Rounded", "Knob"]))
+
+    assert queue.run(workers=2, log=None) == {DONE: 1}
+    assert written == [[dxf, svg]]
+    hashes = file_hash(svg), file_hash(dxf)
+
+    # Every output is verified: nothing is written again
+    assert queue.run(workers=2, log=None) == {DONE: 1}
+    assert written == [[dxf, svg]]
+
+    # Only the deleted output is written again
+    (tmp_path / "jigsaw.svg").unlink()
+    assert queue.run(workers=2, log=None) == {DONE: 1}
+    assert written[1:] == [[svg]]
+
+    # And only the changed one
+    with open(dxf, "a") as file:
+        file.write("0\n")
+    assert queue.run(workers=2, log=None) == {DONE: 1}
+    assert written[2:] == [[dxf]]
+
+    assert (file_hash(svg), file_hash(dxf)) == hashes
+    queue.close()
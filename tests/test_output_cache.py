@@ -0,0 +1,61 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Tests of the module output_cache.
+"""
+import threading
+import time
+
+import output_cache
+from conftest import IMAGE
+from job_queue import job_spec
+from output_cache import OutputCache
+
+
+def test_concurrent_gets_render_once(tmp_path, monkeypatch):
+    renders = list()
+
+    def run_job(spec, paths):
+        renders.append(paths)
+        # Long enough for every thread to ask for the output during the render
+        time.sleep(.2)
+        return real_run_job(spec, paths)
+
+    real_run_job = output_cache.run_job
+    monkeypatch.setattr(output_cache, "run_job", run_job)
+
+    cache = OutputCache(str(tmp_path / "cache"))
+    spec = job_spec(IMAGE, [], (12, 9), 5, ["Square Rounded", "Knob"])
+    barrier = threading.Barrier(8)
+    entries = [None]*8
+
+    def get(index):
+        barrier.wait()
+        entries[index] = cache.get(spec, ["svg", "dxf"])
+
+    threads = [threading.Thread(target=get, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cache.close()
+
+    assert len(renders) == 1
+    assert all(entry == entries[0] for entry in entries)
+    assert all(entry is not None for entry in entries[0])
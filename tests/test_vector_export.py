@@ -0,0 +1,42 @@
+############################################################################
+# JigsawGenerator                                                          #
+# Copyright (C) 2021  Bruno Bollos Correa                                  #
+#                                                                          #
+# This program is free software: you can redistribute it and/or modify     #
+# it under the terms of the GNU General Public License as published by     #
+# the Free Software Foundation, either version 3 of the License, or        #
+# (at your option) any later version.                                      #
+#                                                                          #
+# This program is distributed in the hope that it will be useful,          #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+# GNU General Public License for more details.                             #
+#                                                                          #
+# You should have received a copy of the GNU General Public License        #
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+############################################################################
+
+"""
+Tests of the module vector_export.
+"""
+import pytest
+
+from jigsaw_generator_core import JigsawGeneratorCore
+from jigsaw_generator_geometry import generate_tab_paths
+from vector_export import write_dxf, write_svg
+
+
+@pytest.fixture(scope="module")
+def tab_paths():
+    core = JigsawGeneratorCore([24, 18], 7)
+    return generate_tab_paths(core, 50., 40., ["Square Rounded", "Triangle", "Knob"], .1)
+
+
+@pytest.mark.parametrize("write", [write_svg, write_dxf])
+def test_workers_write_the_same_file(tmp_path, tab_paths, write):
+    texts = list()
+    for workers in (1, 3):
+        path = tmp_path / "{}.{}".format(workers, write.__name__)
+        write(str(path), 1200, 720, tab_paths, workers=workers)
+        texts.append(path.read_bytes())
+    assert texts[0] == texts[1]